@@ -0,0 +1,78 @@
+"""
+Measures how fast many small files can be written into the execution container:
+
+- docker-cp: the old write_to_file path, a host file under /tmp plus one
+  `docker cp` subprocess per file
+- put-archive: write_to_file, one in-memory tar upload per file
+- put-archive-bulk: write_files, all files in a single tar upload
+
+    python benchmarks/container_write_throughput.py --container agent-execution-container --files 200
+
+Files go to a scratch directory in the container (`--dir`), removed when done.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+
+parser = argparse.ArgumentParser(description="Benchmark writing files into a container")
+parser.add_argument("--container", default=os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container"), help="Running container name")
+parser.add_argument("--dir", default="/tmp/write-benchmark", help="Scratch directory in the container")
+parser.add_argument("--files", type=int, default=200, help="Files per run")
+parser.add_argument("--size", type=int, default=2048, help="Bytes per file")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from docker_utils.docker_executor import DockerCommandExecutor
+
+
+def docker_cp(files: dict):
+    host_dir = "/tmp/write-benchmark-host"
+    for file_path, content in files.items():
+        local_path = os.path.join(host_dir, file_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, "w") as f:
+            f.write(content)
+        subprocess.run(
+            ["docker", "cp", local_path, f"{args.container}:{os.path.join(args.dir, 'docker-cp', file_path)}"],
+            check=True, capture_output=True
+        )
+    shutil.rmtree(host_dir, ignore_errors=True)
+
+
+def main():
+    executor = DockerCommandExecutor()
+    content = "x" * (args.size - 1) + "\n"
+    files = {f"pkg{i % 10}/module_{i}.py": content for i in range(args.files)}
+
+    runs = (
+        ("docker-cp", lambda: docker_cp(files)),
+        ("put-archive", lambda: [
+            executor.write_to_file(args.container, os.path.join(args.dir, "put-archive"), path, data)
+            for path, data in files.items()
+        ]),
+        ("put-archive-bulk", lambda: executor.write_files(args.container, os.path.join(args.dir, "put-archive-bulk"), files)),
+    )
+
+    # docker cp needs the parent directories to exist; create them outside the timed run
+    parents = sorted({os.path.dirname(os.path.join(args.dir, "docker-cp", path)) for path in files})
+    executor.execute_command(args.container, "mkdir -p " + " ".join(parents))
+
+    print(f"{args.files} files x {args.size} bytes")
+    print(f"{'method':>18} {'seconds':>10} {'files/s':>10} {'MB/s':>8}")
+    try:
+        for name, run in runs:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            mb = args.files * args.size / 1e6
+            print(f"{name:>18} {elapsed:>10.3f} {args.files / elapsed:>10.1f} {mb / elapsed:>8.2f}")
+    finally:
+        executor.execute_command(args.container, f"rm -rf {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares per-turn MCP tool setup: opening a fresh SSE session and loading the
+tools every turn, against MCPClientPool's long-lived session and cached tools.
+
+    python benchmarks/mcp_tool_setup.py --url http://localhost:8080/sse --turns 10
+
+Needs the MCP server running (`make run-mcp`).
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+parser = argparse.ArgumentParser(description="Benchmark per-turn MCP tool setup")
+parser.add_argument("--url", default=os.getenv("MCP_SERVER_URL", "http://localhost:8080/sse"), help="MCP server SSE endpoint")
+parser.add_argument("--turns", type=int, default=10, help="Turns per measurement")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from agent.llm_provider import MCPClientPool
+
+
+async def fresh_session_tools():
+    async with sse_client(args.url) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            return await load_mcp_tools(session)
+
+
+async def measure(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        await fn()
+    return (time.perf_counter() - start) / args.turns * 1000
+
+
+async def main():
+    pool = MCPClientPool({"bench": {"url": args.url, "transport": "sse"}})
+    try:
+        await pool.get_tools()  # warm up: connect once
+        runs = (
+            ("fresh session", fresh_session_tools),
+            ("pooled", pool.get_tools),
+        )
+        print(f"{'setup':>14} {'ms/turn':>10}")
+        for name, fn in runs:
+            print(f"{name:>14} {await measure(fn):>10.2f}")
+    finally:
+        await pool.reset()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
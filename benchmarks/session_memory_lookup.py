@@ -0,0 +1,99 @@
+"""
+Measures SessionMemory lookup latency as the total number of documents grows,
+with and without the indexes created by `ensure_indexes()`.
+
+    python benchmarks/session_memory_lookup.py --uri mongodb://localhost:27017/
+    python benchmarks/session_memory_lookup.py --mongomock
+
+Uses its own database (`--db`) and drops it when done. mongomock always does
+collection scans, so index effects only show against a real mongod.
+
+`get_working_dir` is served from SessionMemory's environment cache, so it is
+measured twice: with the cache invalidated before every call (the indexed
+read) and cached.
+"""
+import os
+import sys
+import time
+import argparse
+
+parser = argparse.ArgumentParser(description="Benchmark SessionMemory lookups")
+parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB URI")
+parser.add_argument("--db", default="aws-agent-benchmark", help="Scratch database name")
+parser.add_argument("--mongomock", action="store_true", help="Use mongomock instead of a live server")
+parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000], help="Total documents per collection")
+parser.add_argument("--per-session", type=int, default=20, help="Documents per session")
+parser.add_argument("--repeat", type=int, default=200, help="Lookups per measurement")
+args = parser.parse_args()
+
+os.environ["MONGO_DB_NAME"] = args.db
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agent import session_memory
+from agent.session_memory import SessionMemory, ensure_indexes, set_mongo_client, get_mongo_client
+
+
+def fill(db, total: int, start: int):
+    sessions = total // args.per_session
+    for s in range(start // args.per_session, sessions):
+        session_id = f"bench-{s}"
+        db["tasks"].insert_many([
+            dict(session_id=session_id, task=f"task {i}", status="new", sort_order=float(i))
+            for i in range(args.per_session)
+        ])
+        db["notes"].insert_many([dict(session_id=session_id, note=f"note {i}") for i in range(args.per_session)])
+        db["environment"].insert_one(dict(session_id=session_id, working_dir="/container/data", goal="goal"))
+    return sessions
+
+
+def uncached_working_dir(mem: SessionMemory):
+    mem.invalidate_environment()
+    return mem.get_working_dir()
+
+
+def measure(mem: SessionMemory) -> dict:
+    result = {}
+    lookups = (
+        ("get_tasks", mem.get_tasks),
+        ("get_notes", mem.get_notes),
+        ("get_working_dir", lambda: uncached_working_dir(mem)),
+        ("cached", mem.get_working_dir),
+    )
+    for name, fn in lookups:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        result[name] = (time.perf_counter() - start) / args.repeat * 1000
+    return result
+
+
+def main():
+    if args.mongomock:
+        import mongomock
+        set_mongo_client(mongomock.MongoClient())
+    else:
+        from pymongo import MongoClient
+        set_mongo_client(MongoClient(args.uri))
+
+    db = get_mongo_client()[args.db]
+    db.client.drop_database(args.db)
+    print(f"{'docs':>8} {'indexes':>8} {'get_tasks':>12} {'get_notes':>12} {'get_working_dir':>16} {'(cached)':>10}  (ms/lookup)")
+    filled = 0
+    try:
+        for total in sorted(args.sizes):
+            sessions = fill(db, total, filled)
+            filled = total
+            mem = SessionMemory(f"bench-{sessions // 2}")
+            for indexed in (False, True):
+                for collection in session_memory.SESSION_INDEXES:
+                    db[collection].drop_indexes()
+                if indexed:
+                    ensure_indexes(force=True)
+                r = measure(mem)
+                print(f"{total:>8} {str(indexed):>8} {r['get_tasks']:>12.3f} {r['get_notes']:>12.3f} {r['get_working_dir']:>16.3f} {r['cached']:>10.4f}")
+    finally:
+        db.client.drop_database(args.db)
+
+
+if __name__ == "__main__":
+    main()
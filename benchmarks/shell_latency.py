@@ -0,0 +1,46 @@
+"""
+Compares per-command latency of a fresh exec per command (execute_command)
+with the persistent per-session shell (run_in_shell) for small commands.
+
+    python benchmarks/shell_latency.py --container agent-execution-container --repeat 50
+"""
+import os
+import sys
+import time
+import argparse
+
+parser = argparse.ArgumentParser(description="Benchmark small command latency")
+parser.add_argument("--container", default=os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container"), help="Running container name")
+parser.add_argument("--repeat", type=int, default=50, help="Commands per measurement")
+parser.add_argument("--command", default="echo ok", help="Command to run")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from docker_utils.docker_executor import DockerCommandExecutor
+
+
+def measure(fn) -> float:
+    fn()  # warm up: container lookup, shell start
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        fn()
+    return (time.perf_counter() - start) / args.repeat * 1000
+
+
+def main():
+    executor = DockerCommandExecutor()
+    try:
+        runs = (
+            ("execute_command", lambda: executor.execute_command(args.container, args.command, working_dir="/")),
+            ("run_in_shell", lambda: executor.run_in_shell("benchmark", args.container, args.command, working_dir="/")),
+        )
+        print(f"{'method':>16} {'ms/command':>12}")
+        for name, fn in runs:
+            print(f"{name:>16} {measure(fn):>12.2f}")
+    finally:
+        executor.close()
+
+
+if __name__ == "__main__":
+    main()
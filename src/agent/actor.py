@@ -3,7 +3,8 @@ import os
 from langchain_core.tools import tool
 
 from docker_utils.docker_executor import DockerCommandExecutor
-from agent.session_memory import SessionMemory, get_session_memory
+from agent.session_memory import SessionMemory, AsyncSessionMemory, get_session_memory, get_executor
+from agent.registry import Registry
 
 from logging import getLogger, INFO
 logger = getLogger(__name__)
@@ -14,14 +15,43 @@ DEFAULT_CONTAINER_NAME = "my_execution_container"
 class Actor:
     executor: DockerCommandExecutor
     memory: SessionMemory
+    async_memory: AsyncSessionMemory
 
     def __init__(self, session_memory: SessionMemory=None):
         self.executor = DockerCommandExecutor()
-        self.memory = session_memory or get_session_memory()
+        self.use_memory(session_memory or get_session_memory())
+
+    def use_memory(self, session_memory: SessionMemory):
+        self.memory = session_memory
+        self.async_memory = AsyncSessionMemory(session_memory)
+
+    def close(self):
+        # The session's pool container outlives the actor: eviction from this
+        # cache doesn't end the session, and the pool expires idle leases itself
+        self.executor.close()
+        self.memory.close()
+
+
+ACTOR_REGISTRY_SIZE = int(os.getenv("ACTOR_REGISTRY_SIZE", "64"))
+ACTOR_IDLE_TTL = float(os.getenv("ACTOR_IDLE_TTL", "1800"))
+
+_actor = Registry(
+    factory=lambda session_id: Actor(get_session_memory(session_id)),
+    max_size=ACTOR_REGISTRY_SIZE,
+    idle_ttl=ACTOR_IDLE_TTL,
+    on_evict=Actor.close,
+    name="actor",
+    executor=get_executor
+)
 
-_actor: Actor = {}
 def get_actor(session_id: str) -> Actor:
-    global _actor
-    if not _actor or session_id not in _actor:
-        _actor[session_id] = Actor(get_session_memory(session_id))
-    return _actor[session_id]
\ No newline at end of file
+    actor = _actor.get(session_id)
+    # Keeps the session's memory registered while its actor is in use, and
+    # switches to the registered instance if the memory was evicted anyway
+    memory = get_session_memory(session_id)
+    if actor.memory is not memory:
+        actor.use_memory(memory)
+    return actor
+
+def get_actor_stats() -> dict:
+    return _actor.stats()
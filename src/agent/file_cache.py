@@ -0,0 +1,51 @@
+import os
+import hashlib
+from dataclasses import dataclass
+
+
+@dataclass
+class CachedFile:
+    mtime_ns: int
+    size: int
+    sha256: str
+    content: str
+
+
+class OpenFileCache:
+    """
+    Contents of a session's open files keyed by path. A file is only re-read
+    when its mtime or size changes; its hash tells whether the content
+    actually changed.
+
+    The full content always goes into the prompt: MainAgent rebuilds the
+    system prompt every turn, so the model keeps nothing from earlier ones.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self._files: dict[str, CachedFile] = {}
+
+    def read(self, path: str) -> CachedFile:
+        stat = os.stat(path)
+        cached = self._files.get(path)
+        if cached is not None and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+
+        with open(path, "r") as file:
+            content = file.read()
+        self.reads += 1
+        sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if cached is not None and cached.sha256 == sha256:
+            # Touched but not changed
+            cached.mtime_ns, cached.size = stat.st_mtime_ns, stat.st_size
+            return cached
+        cached = self._files[path] = CachedFile(stat.st_mtime_ns, stat.st_size, sha256, content)
+        return cached
+
+    def forget(self, path: str):
+        self._files.pop(path, None)
+
+    def retain(self, paths: set):
+        """Drops every file not in `paths`, e.g. after files are closed."""
+        for path in set(self._files) - paths:
+            self.forget(path)
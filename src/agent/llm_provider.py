@@ -1,8 +1,17 @@
 from langchain_aws import ChatBedrock
 import boto3
 import os
+import asyncio
+import threading
+import hashlib
+import json
+from collections import OrderedDict
 
-from langchain_mcp_adapters.client import MultiServerMCPClient
+import anyio
+import httpx
+from mcp import ClientSession, types
+from mcp.client.sse import sse_client
+from langchain_mcp_adapters.tools import load_mcp_tools
 from langgraph.prebuilt import create_react_agent
 
 from agent.session_memory import SessionMemory
@@ -21,31 +30,315 @@ MODEL_BOOST_MAP = {
     }
 }
 
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8080/sse")
+
+MCP_CONNECTIONS = {
+    "test": {
+        "url": MCP_SERVER_URL,
+        "transport": "sse",
+    }
+}
+
+# Errors that mean the SSE session is gone and must be re-established
+MCP_CONNECTION_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+    ConnectionError,
+)
+
+
+class CancellingClientSession(ClientSession):
+    """
+    ClientSession that tells the server when a request is abandoned.
+
+    The MCP client only stops waiting when the task awaiting a request is
+    cancelled, so the server would keep running the tool, e.g. a shell
+    command in the execution container. This sends `notifications/cancelled`
+    for the request, which cancels the server's handler.
+    """
+
+    async def send_request(self, request, *args, **kwargs):
+        # send_request takes the next id before its first await
+        request_id = self._request_id
+        try:
+            return await super().send_request(request, *args, **kwargs)
+        except asyncio.CancelledError:
+            if not isinstance(request.root, types.InitializeRequest):
+                notification = types.ClientNotification(types.CancelledNotification(
+                    params=types.CancelledNotificationParams(requestId=request_id, reason="Cancelled by the client")
+                ))
+                try:
+                    # Shielded: the awaiting task is already cancelled
+                    await asyncio.shield(self.send_notification(notification))
+                except (Exception, asyncio.CancelledError) as e:
+                    logger.warning(f">>> Failed to send MCP cancellation for request {request_id}: {e!r}")
+            raise
+
+
+class MCPClientPool:
+    """
+    Long-lived MCP client sessions, one per configured server.
+
+    Each SSE session is owned by a background task so it can outlive a single
+    turn. The `get_tools()` result is cached until the server sends a
+    `notifications/tools/list_changed` message or the session drops, in which
+    case the next call reconnects.
+    """
+
+    def __init__(self, connections: dict):
+        self.connections = connections
+        self._sessions: dict[str, ClientSession] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._tools = None
+        self._loop = None
+        self._lock = None
+        self._closing = None
+
+    async def _handle_message(self, message):
+        if isinstance(message, types.ServerNotification):
+            if isinstance(message.root, types.ToolListChangedNotification):
+                logger.info(">>> MCP tool list changed, invalidating tool cache")
+                self._tools = None
+        elif isinstance(message, Exception):
+            logger.warning(f">>> MCP session error: {message}")
+            self._closing.set()
+
+    async def _run_session(self, server_name: str, connection: dict, ready: asyncio.Future):
+        try:
+            async with sse_client(connection["url"]) as (read, write):
+                async with CancellingClientSession(read, write, message_handler=self._handle_message) as session:
+                    await session.initialize()
+                    self._sessions[server_name] = session
+                    ready.set_result(session)
+                    await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning(f">>> MCP session '{server_name}' dropped: {e}")
+        finally:
+            self._sessions.pop(server_name, None)
+            self._tasks.pop(server_name, None)
+            self._tools = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions belong to the loop they were opened on
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._closing = asyncio.Event()
+            self._sessions = {}
+            self._tasks = {}
+            self._tools = None
+
+    async def _connect(self):
+        if self._closing.is_set():
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self._closing = asyncio.Event()
+        for server_name, connection in self.connections.items():
+            if server_name in self._sessions:
+                continue
+            if connection.get("transport") != "sse":
+                raise ValueError(f"Unsupported MCP transport: {connection.get('transport')}")
+            ready = self._loop.create_future()
+            self._tasks[server_name] = self._loop.create_task(
+                self._run_session(server_name, connection, ready)
+            )
+            await ready
+            logger.info(f">>> MCP session '{server_name}' connected to {connection['url']}")
+
+    async def get_tools(self) -> list:
+        self._bind_loop()
+        async with self._lock:
+            connected = not self._closing.is_set() and len(self._sessions) == len(self.connections)
+            if self._tools is not None and connected:
+                return self._tools
+            await self._connect()
+            tools = []
+            for session in self._sessions.values():
+                tools.extend(await load_mcp_tools(session))
+            self._tools = tools
+            return self._tools
+
+    async def reset(self):
+        """Close all sessions; the next `get_tools()` reconnects."""
+        self._bind_loop()
+        self._closing.set()
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._tools = None
+
+
+_mcp_pool: MCPClientPool = None
+_mcp_pool_lock = threading.Lock()
+
+def get_mcp_pool() -> MCPClientPool:
+    global _mcp_pool
+    if _mcp_pool is None:
+        with _mcp_pool_lock:
+            if _mcp_pool is None:
+                _mcp_pool = MCPClientPool(MCP_CONNECTIONS)
+    return _mcp_pool
+
+
+_loop: asyncio.AbstractEventLoop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Process-wide event loop running on a daemon thread.
+    Pooled MCP sessions are bound to this loop, so callers without their own
+    long-lived loop (e.g. Streamlit reruns) should submit coroutines here.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-provider-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def run_sync(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+LLM_HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "10"))
+LLM_HTTP_KEEPALIVE = float(os.getenv("LLM_HTTP_KEEPALIVE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BEDROCK_REGION = os.getenv("BEDROCK_REGION", "us-east-1")
+
 def get_llm_openai(model_name):
     from langchain_openai import ChatOpenAI
-    client = ChatOpenAI( model=model_name, api_key=os.getenv("OPENAI_API_KEY"))
+    limits = httpx.Limits(
+        max_connections=LLM_HTTP_POOL_SIZE,
+        max_keepalive_connections=LLM_HTTP_POOL_SIZE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE
+    )
+    client = ChatOpenAI(
+        model=model_name,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL"),
+        max_retries=LLM_MAX_RETRIES,
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits)
+    )
     # client.max_tokens = 120000
     return client
 
+_bedrock_client = None
+
+def get_bedrock_client():
+    """One bedrock-runtime client per process so TLS sessions and credential resolution are reused."""
+    global _bedrock_client
+    if _bedrock_client is None:
+        from botocore.config import Config
+        _bedrock_client = boto3.client(
+            service_name="bedrock-runtime",
+            region_name=BEDROCK_REGION,
+            config=Config(
+                max_pool_connections=LLM_HTTP_POOL_SIZE,
+                tcp_keepalive=True,
+                retries={"max_attempts": LLM_MAX_RETRIES, "mode": "adaptive"}
+            )
+        )
+    return _bedrock_client
+
 def get_llm_bedrock(model_name):
-    bedrock_client = boto3.client(
-        service_name="bedrock-runtime",
-        region_name="us-east-1"
-    )
     bedrock_llm = ChatBedrock(
         model=model_name,
-        client=bedrock_client,
+        client=get_bedrock_client(),
         model_kwargs={'temperature': 0}
     )
     return bedrock_llm
 
+# Process-wide chat model registry, one client per MODEL_BOOST_MAP entry.
+# Toggling boost switches between already-built clients.
+_llm_clients = {}
+_llm_clients_lock = threading.Lock()
+
 def get_llm(provider: str, boost: bool):
-    model_name = MODEL_BOOST_MAP[provider][boost]
-    if provider == 'bedrock':
-        return get_llm_bedrock(model_name)
-    else:
-        return get_llm_openai(model_name)
-    
+    key = (provider, boost)
+    if key not in _llm_clients:
+        with _llm_clients_lock:
+            if key not in _llm_clients:
+                model_name = MODEL_BOOST_MAP[provider][boost]
+                if provider == 'bedrock':
+                    _llm_clients[key] = get_llm_bedrock(model_name)
+                else:
+                    _llm_clients[key] = get_llm_openai(model_name)
+    return _llm_clients[key]
+
+def clear_llm_clients():
+    global _bedrock_client
+    with _llm_clients_lock:
+        _llm_clients.clear()
+        _bedrock_client = None
+
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "8"))
+
+def get_tools_hash(tools: list) -> str:
+    """Stable digest of the tool names, descriptions and argument schemas."""
+    schema = sorted(
+        (t.name, t.description, json.dumps(t.args, sort_keys=True, default=str))
+        for t in tools
+    )
+    return hashlib.sha256(json.dumps(schema).encode("utf-8")).hexdigest()
+
+
+class AgentCache:
+    """
+    Bounded LRU of compiled ReAct agents keyed by (provider, boost, tool-schema hash).
+
+    The system prompt is not part of the compiled graph; it is sent as the
+    first message at invoke time, so one graph serves every session.
+    """
+
+    def __init__(self, max_size: int = AGENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, boost: bool, tools: list):
+        key = (provider, boost, get_tools_hash(tools))
+        with self._lock:
+            entry = self._agents.get(key)
+            # Tools are bound to their MCP session, so a reconnect needs a rebuild
+            if entry is not None and entry[0] is tools:
+                self._agents.move_to_end(key)
+                return entry[1]
+
+            logger.info(f">>> Compiling agent for {provider} (boost={boost})")
+            agent = create_react_agent(get_llm(provider, boost), tools)
+            self._agents[key] = (tools, agent)
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_size:
+                self._agents.popitem(last=False)
+            return agent
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
+
+    def __len__(self):
+        return len(self._agents)
+
+
+_agent_cache: AgentCache = None
+_agent_cache_lock = threading.Lock()
+
+def get_agent_cache() -> AgentCache:
+    global _agent_cache
+    if _agent_cache is None:
+        with _agent_cache_lock:
+            if _agent_cache is None:
+                _agent_cache = AgentCache()
+    return _agent_cache
+
 
 class LLMProvider:
     def __init__(self, session_memory: SessionMemory, provider: str, prompt: str):
@@ -58,25 +351,34 @@ class LLMProvider:
         self.prompt = str(prompt)
 
     async def get_response(self, message: str | list) -> str:
-        async with MultiServerMCPClient(
-            {
-                "test": {
-                    "url": "http://localhost:8080/sse",
-                    "transport": "sse",
-                }
+        pool = get_mcp_pool()
+        try:
+            tools = await pool.get_tools()
+        except MCP_CONNECTION_ERRORS as e:
+            logger.warning(f">>> MCP connection lost ({e}), reconnecting")
+            await pool.reset()
+            tools = await pool.get_tools()
+        try:
+            return await self._invoke(tools, message)
+        except MCP_CONNECTION_ERRORS as e:
+            # Not replayed: tool calls made earlier in the turn, or the one that
+            # failed, may already have run. The next turn reconnects.
+            logger.warning(f">>> MCP connection lost during the turn ({e})")
+            await pool.reset()
+            raise
+
+    async def _invoke(self, tools: list, message: str | list) -> str:
+        if isinstance(message, str):
+            message = [{"role": "user", "content": message}]
+        agent = get_agent_cache().get(self.provider_name, self.mem.get_boost_state(), tools)
+        response = await agent.ainvoke(
+            {"messages": [{"role": "system", "content": self.prompt}, *message]},
+            config={
+                "configurable": {"thread_id": self.mem.session_id},
+                "recursion_limit": 100
             }
-        ) as client:
-            model = get_llm(self.provider_name, self.mem.get_boost_state())
-            tools = client.get_tools()
-            agent = create_react_agent(model, tools, prompt=self.prompt)
-            response = await agent.ainvoke(
-                {"messages": message},
-                config={
-                    "configurable": {"thread_id": self.mem.session_id},
-                    "recursion_limit": 100
-                }
-            )
-            return response["messages"][-1].content
+        )
+        return response["messages"][-1].content
 
     def get_model_name(self):
         return MODEL_BOOST_MAP[self.provider_name][self.mem.get_boost_state()]
@@ -3,7 +3,6 @@ import os
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.tools.base import BaseTool
-from langchain_core.prompts import PromptTemplate
 from langchain_aws import ChatBedrock
 
 from langgraph.prebuilt import create_react_agent
@@ -22,17 +21,23 @@ from agent.tools import (
     tool_remove_note,
     tool_set_working_dir,
     tool_add_task,
+    tool_add_tasks,
+    tool_reorder_tasks,
     tool_set_task_status,
     tool_clear_tasks,
     tool_set_goal,
     tool_open_file,
     tool_close_file,
-    tool_write_file
+    tool_write_file,
+    tool_write_files,
+    tool_read_files
 )
 
 from agent.session_memory import SessionMemory
 from agent.actor import get_actor
 from agent.llm_provider import LLMProvider
+from agent.prompt_cache import get_prompt_template
+from agent.file_cache import OpenFileCache
 
 
 LLM_PROVIDER = 'bedrock'
@@ -86,6 +91,7 @@ class MainAgent:
         self.session_memory = session_memory
 
         self.actor = get_actor(session_memory.session_id)
+        self.open_files = OpenFileCache()
 
         if not session_memory.get_working_dir():
             session_memory.set_working_dir(DEFAULT_WORKING_DIR)
@@ -98,12 +104,16 @@ class MainAgent:
             tool_save_note,
             tool_remove_note,
             tool_add_task,
+            tool_add_tasks,
+            tool_reorder_tasks,
             tool_set_task_status,
             tool_clear_tasks,
             tool_set_goal,
             tool_open_file,
             tool_close_file,
-            tool_write_file
+            tool_write_file,
+            tool_write_files,
+            tool_read_files
         ]
 
         #checkpointer = MemorySaver()
@@ -114,12 +124,11 @@ class MainAgent:
 
 
     def get_prompt_text(self, file_name=PROMPT_FILE_DEFAULT):
-        config_path = os.path.join(os.path.dirname(__file__), "config", file_name)
-        with open(config_path, "r") as file:
-            return file.read()
+        return get_prompt_template(file_name).template
         
-    def get_open_files(self):
-        working_dir = self.session_memory.get_working_dir()
+    def get_open_files(self, snapshot: dict = None):
+        snapshot = snapshot or self.session_memory.get_snapshot()
+        working_dir = snapshot["working_dir"]
         local_data_path = os.getenv('PROJECT_FOLDER')
         
         # Check if working_dir is None or empty
@@ -143,17 +152,20 @@ class MainAgent:
         logging.info(f">>> File path: {file_path}")
         logging.info(f">>> Full local file path: {data_path}")
         
-        files = self.session_memory.get_open_files()
+        files = snapshot["open_files"]
+        paths = {os.path.join(data_path, f["file_path"]) for f in files}
+        self.open_files.retain(paths)
         result = []
         for f in files:
+            path = os.path.join(data_path, f["file_path"])
             try:
-                with open(os.path.join(data_path, f["file_path"]), "r") as file:
-                    result.append({
-                        "file_path": f,
-                        "data": file.read()
-                    })
+                result.append({
+                    "file_path": f,
+                    "data": self.open_files.read(path).content
+                })
             except Exception as e:
                 logging.error(f"Error reading file {f['file_path']}: {e}")
+                self.open_files.forget(path)
                 self.session_memory.remove_open_file(f["file_path"])
                     
         return result
@@ -174,19 +186,19 @@ class MainAgent:
         # response = final_state["messages"][-1].content
 
 
-        prompt = PromptTemplate.from_template(
-            template=self.get_prompt_text()
-        ).format(
+        snapshot = self.session_memory.get_snapshot()
+        prompt = get_prompt_template(PROMPT_FILE_DEFAULT).format(
             session_id=self.session_memory.session_id,
-            working_dir=self.session_memory.get_working_dir(),
-            goal=self.session_memory.get_goal(),
-            tasks=self.session_memory.get_tasks(),
-            notes_memory=self.session_memory.get_notes(),
-            open_files=self.get_open_files()
+            working_dir=snapshot["working_dir"],
+            goal=snapshot["goal"],
+            tasks=snapshot["tasks"],
+            notes_memory=snapshot["notes"],
+            open_files=self.get_open_files(snapshot)
         )
 
         self.llmprovider = LLMProvider(self.session_memory, LLM_PROVIDER, prompt)
 
         response = await self.llmprovider.get_response(message)
+        self.session_memory.flush()
 
         return response
\ No newline at end of file
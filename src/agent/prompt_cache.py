@@ -0,0 +1,38 @@
+import os
+import threading
+
+from langchain_core.prompts import PromptTemplate
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+PROMPT_CONFIG_DIR = os.path.join(os.path.dirname(__file__), "config")
+
+# path -> (mtime_ns, PromptTemplate), shared by every agent in the process
+_templates = {}
+_lock = threading.Lock()
+
+def get_prompt_template(file_name: str, config_dir: str = PROMPT_CONFIG_DIR) -> PromptTemplate:
+    """
+    Returns the parsed prompt template for `file_name`.
+    The file is only re-read and re-parsed when its mtime changes.
+    """
+    path = os.path.join(config_dir, file_name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _templates.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        cached = _templates.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        logger.info(f">>> Loading prompt template {path}")
+        with open(path, "r") as file:
+            template = PromptTemplate.from_template(template=file.read())
+        _templates[path] = (mtime, template)
+        return template
+
+def clear_prompt_templates():
+    with _lock:
+        _templates.clear()
@@ -0,0 +1,98 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Callable, Hashable, Any
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+class Registry:
+    """
+    Thread-safe keyed cache with LRU and idle-TTL eviction.
+
+    Values are built by `factory(key)` on a miss. Evicted values are passed to
+    `on_evict`, outside the lock, so they can release their resources. When
+    `executor` is given, it returns the executor `on_evict` runs on for values
+    evicted by `get()`, so a lookup from an event loop doesn't wait on it.
+    """
+
+    def __init__(self, factory: Callable[[Hashable], Any], max_size: int, idle_ttl: float = None, on_evict: Callable[[Any], None] = None, name: str = "registry", executor: Callable[[], Executor] = None):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self.name = name
+        self.executor = executor
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                value = entry[0]
+            else:
+                self.misses += 1
+                value = self.factory(key)
+                self._entries[key] = (value, now)
+                while len(self._entries) > self.max_size:
+                    evicted.append(self._entries.popitem(last=False)[1][0])
+                    self.evictions += 1
+        if evicted and self.executor is not None and self.on_evict is not None:
+            self.executor().submit(self._release, evicted)
+        else:
+            self._release(evicted)
+        return value
+
+    def peek(self, key: Hashable):
+        """Returns the cached value without creating it or counting as a use."""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def _evict_idle(self, now: float) -> list:
+        evicted = []
+        if self.idle_ttl is None:
+            return evicted
+        # Entries are in last-used order, so stop at the first fresh one
+        while self._entries:
+            key, (value, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            self._entries.popitem(last=False)
+            evicted.append(value)
+            self.evictions += 1
+        return evicted
+
+    def _release(self, values: list):
+        if not values or self.on_evict is None:
+            return
+        for value in values:
+            try:
+                self.on_evict(value)
+            except Exception as e:
+                logger.warning(f"{self.name}: error releasing evicted entry: {e}")
+
+    def clear(self):
+        with self._lock:
+            values = [value for value, _ in self._entries.values()]
+            self._entries.clear()
+        self._release(values)
+
+    def stats(self) -> dict:
+        return dict(size=len(self._entries), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
@@ -1,102 +1,603 @@
 from uuid import uuid4
+import os
+import time
+import asyncio
 import threading
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, InsertOne, UpdateOne, DeleteOne, DeleteMany
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 
+from agent.registry import Registry
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "aws-agent-session-memory")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+
+# Write-behind buffering of SessionMemory mutations (off unless enabled)
+WRITE_BEHIND = os.getenv("SESSION_MEMORY_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_OPS = int(os.getenv("SESSION_MEMORY_WRITE_BEHIND_MAX_OPS", "50"))
+WRITE_BEHIND_MAX_DELAY = float(os.getenv("SESSION_MEMORY_WRITE_BEHIND_MAX_DELAY", "1.0"))
+
+# How long a cached environment document is trusted before it is re-read.
+# Writes from other processes show up after at most this long, or immediately
+# when the change stream watcher is running.
+ENVIRONMENT_CACHE_TTL = float(os.getenv("SESSION_MEMORY_ENVIRONMENT_TTL", "2.0"))
+
+# Indexes created by ensure_indexes(), per collection: (keys, index options)
+SESSION_INDEXES = {
+    "notes": [([("session_id", ASCENDING)], {})],
+    "messages": [([("session_id", ASCENDING), ("seq", ASCENDING)], {})],
+    "tasks": [([("session_id", ASCENDING), ("sort_order", ASCENDING)], {})],
+    "files": [([("session_id", ASCENDING), ("file_path", ASCENDING)], {})],
+    "environment": [([("session_id", ASCENDING)], {})],
+    "counters": [([("session_id", ASCENDING), ("name", ASCENDING)], {"unique": True})],
+}
+
+# One MongoClient (and connection pool) shared by every SessionMemory in the process
+_client: MongoClient = None
+_client_lock = threading.Lock()
+_indexes_ensured = False
+
+def get_mongo_client() -> MongoClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    return _client
+
+def set_mongo_client(client: MongoClient):
+    """Replace the shared client, e.g. to point at a different server or a mock."""
+    global _client, _indexes_ensured
+    with _client_lock:
+        _client = client
+        _indexes_ensured = False
+
+def ensure_indexes(force: bool = False):
+    """Create the `session_id` indexes used by SessionMemory lookups. Idempotent."""
+    global _indexes_ensured
+    if _indexes_ensured and not force:
+        return
+    db = get_mongo_client()[MONGO_DB_NAME]
+    for collection, indexes in SESSION_INDEXES.items():
+        for keys, options in indexes:
+            db[collection].create_index(keys, **options)
+    logger.info(f">>> Ensured indexes on {MONGO_DB_NAME}")
+    _indexes_ensured = True
+
+
 class SessionMemory():
-    def __init__(self, session_id: str = None):
+    def __init__(self, session_id: str = None, client: MongoClient = None, write_behind: bool = None):
+        """
+        :param session_id: str - generated when not given
+        :param client: MongoClient - defaults to the shared process client
+        :param write_behind: bool - buffer mutations and send them as bulk writes on
+            flush(), when WRITE_BEHIND_MAX_OPS or WRITE_BEHIND_MAX_DELAY is reached, or
+            before any read. Defaults to SESSION_MEMORY_WRITE_BEHIND.
+        """
         if session_id is None:
             session_id = str(uuid4())[:8]
         self.session_id = session_id
-        self.client = MongoClient("mongodb://localhost:27017/")
-        self.db = self.client["aws-agent-session-memory"]
+        self.client = client or get_mongo_client()
+        self.db = self.client[MONGO_DB_NAME]
+        self._messages_sequenced = False
+        self.write_behind = WRITE_BEHIND if write_behind is None else write_behind
+        self._pending = []
+        self._pending_lock = threading.RLock()
+        self._flush_timer = None
+        self._flush_error = None  # write dropped by a background flush, raised by the next flush()
+        self._environment = None
+        self._environment_loaded_at = 0.0
+
+    def _write(self, collection: str, *operations):
+        if not self.write_behind:
+            self.db[collection].bulk_write(list(operations))
+            return
+        with self._pending_lock:
+            self._pending.extend((collection, op) for op in operations)
+            if len(self._pending) >= WRITE_BEHIND_MAX_OPS:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(WRITE_BEHIND_MAX_DELAY, self._flush_in_background)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """
+        Sends buffered mutations, one ordered bulk_write per collection.
+        Mutations are only dropped from the buffer once written, so a failed
+        flush is retried. Raises the error of this flush, or the rejection of
+        a write dropped by an earlier background flush.
+        """
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            error, self._flush_error = self._flush_error, None
+            if self._pending:
+                self._send_pending()
+            if error is not None:
+                raise error
+
+    def _send_pending(self):
+        batches = {}
+        for collection, op in self._pending:
+            batches.setdefault(collection, []).append(op)
+        for collection, ops in batches.items():
+            try:
+                self.db[collection].bulk_write(ops)
+            except BulkWriteError as e:
+                # The writes before the first error were applied; the rejected one
+                # would be rejected again, so it is dropped too
+                write_error = e.details["writeErrors"][0]
+                logger.error(f">>> Dropping {collection} write rejected for session {self.session_id}: {write_error.get('errmsg')}")
+                self._drop_pending(collection, write_error["index"] + 1)
+                raise
+            self._drop_pending(collection, len(ops))
+
+    def _drop_pending(self, collection: str, count: int):
+        """Removes the first `count` buffered operations on `collection`."""
+        kept = []
+        for entry in self._pending:
+            if count and entry[0] == collection:
+                count -= 1
+            else:
+                kept.append(entry)
+        self._pending = kept
+
+    def _flush_in_background(self):
+        with self._pending_lock:
+            if self._flush_timer is threading.current_thread():
+                self._flush_timer = None
+            try:
+                self._send_pending()
+            except BulkWriteError as e:
+                # The rejected write is gone, so the next flush() reports it
+                self._flush_error = e
+            except Exception as e:
+                # Nothing was dropped; the buffered writes are retried
+                logger.error(f">>> Write-behind flush for session {self.session_id} failed: {e}")
+            if self._pending:
+                self._schedule_flush()
 
     def add_note(self, note):
-        self.db["notes"].insert_one({"session_id": self.session_id, "note": note})
+        self._write("notes", InsertOne({"session_id": self.session_id, "note": note}))
 
     def get_notes(self):
+        self.flush()
         return list(self.db["notes"].find({"session_id": self.session_id}))
     
     def remove_note(self, note_id):
-        self.db["notes"].delete_one({"session_id": self.session_id, "_id": ObjectId(note_id)})
+        self._write("notes", DeleteOne({"session_id": self.session_id, "_id": ObjectId(note_id)}))
+
+    def _sequence_messages(self) -> int:
+        """
+        Gives messages stored before sequence numbers existed a `seq`, in insertion order.
+        Returns the highest `seq` of the session.
+        """
+        self.flush()
+        last = self.db["messages"].find_one(
+            {"session_id": self.session_id, "seq": {"$exists": True}},
+            sort=[("seq", DESCENDING)]
+        )
+        last_seq = last["seq"] if last else 0
+        legacy = list(self.db["messages"].find(
+            {"session_id": self.session_id, "seq": {"$exists": False}},
+            {"_id": 1}
+        ).sort("_id", ASCENDING))
+        if legacy:
+            self.db["messages"].bulk_write([
+                UpdateOne({"_id": m["_id"]}, {"$set": {"seq": last_seq + i + 1}})
+                for i, m in enumerate(legacy)
+            ])
+            last_seq += len(legacy)
+        self._messages_sequenced = True
+        return last_seq
 
-    def get_messages(self):
-        return list(self.db["messages"].find({"session_id": self.session_id}))
+    def get_messages(self, limit: int = None, before_seq: int = None, since_seq: int = None):
+        """
+        Returns messages in `seq` order.
+        With `limit`, returns the newest `limit` messages (older than `before_seq` if given),
+        or the oldest `limit` messages after `since_seq` when that is given.
+        """
+        self.flush()
+        if not self._messages_sequenced:
+            self._sequence_messages()
+        query = {"session_id": self.session_id}
+        if before_seq is not None or since_seq is not None:
+            query["seq"] = {}
+            if before_seq is not None:
+                query["seq"]["$lt"] = before_seq
+            if since_seq is not None:
+                query["seq"]["$gt"] = since_seq
+
+        if limit is not None and since_seq is None:
+            messages = list(self.db["messages"].find(query).sort("seq", DESCENDING).limit(limit))
+            messages.reverse()
+            return messages
+        cursor = self.db["messages"].find(query).sort("seq", ASCENDING)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
     
-    def add_message(self, role, content):
-        self.db["messages"].insert_one({"session_id": self.session_id, "role": role, "content": content})
+    def add_message(self, role, content) -> int:
+        return self.add_messages([(role, content)])[0]
 
-    def get_working_dir(self)->str:
-        result = self.db["environment"].find_one({"session_id": self.session_id})
-        if result:
-            return result.get("working_dir", None)
+    def add_messages(self, messages: list[tuple[str, str]]) -> list[int]:
+        """Appends (role, content) pairs, reserving their `seq` values in one counter update."""
+        if not messages:
+            return []
+        last = self._next_sequence("messages", count=len(messages), seed=self._sequence_messages)
+        first = last - len(messages) + 1
+        self._write("messages", *[
+            InsertOne({"session_id": self.session_id, "seq": first + i, "role": role, "content": content})
+            for i, (role, content) in enumerate(messages)
+        ])
+        return list(range(first, last + 1))
+
+    def _cached_environment(self) -> dict:
+        """Returns the cached `environment` document if it is still fresh, else None."""
+        environment = self._environment
+        if environment is not None and time.monotonic() - self._environment_loaded_at < ENVIRONMENT_CACHE_TTL:
+            return environment
         return None
 
+    def _get_environment(self) -> dict:
+        """Read-through cache of the session's `environment` document."""
+        environment = self._cached_environment()
+        if environment is not None:
+            return environment
+        self.flush()
+        environment = self.db["environment"].find_one({"session_id": self.session_id}) or {}
+        self._cache_environment(environment, authoritative=True)
+        return environment
+
+    def _cache_environment(self, environment: dict, authoritative: bool = False):
+        """
+        Caches `environment`. A change stream event older than the cached
+        version is ignored, as events can arrive out of order. A read from the
+        database (`authoritative`) is always taken, since the document may
+        have been deleted or re-created with a lower version.
+        """
+        cached = self._environment
+        if not authoritative and cached is not None and cached.get("version", 0) > environment.get("version", 0):
+            return
+        self._environment = environment
+        self._environment_loaded_at = time.monotonic()
+
+    def _set_environment(self, field: str, value):
+        self._write("environment", UpdateOne(
+            {"session_id": self.session_id},
+            {"$set": {field: value}, "$inc": {"version": 1}},
+            upsert=True
+        ))
+        if self._environment is not None:
+            environment = dict(self._environment)
+            environment[field] = value
+            environment["version"] = environment.get("version", 0) + 1
+            self._environment = environment
+
+    def invalidate_environment(self):
+        self._environment = None
+
+    def get_working_dir(self)->str:
+        return self._get_environment().get("working_dir", None)
+
     def set_working_dir(self, working_dir):
-        self.db["environment"].update_one({"session_id": self.session_id}, {"$set": {"working_dir": working_dir}}, upsert=True)
+        self._set_environment("working_dir", working_dir)
 
     def set_goal(self, goal):
-        self.db["environment"].update_one({"session_id": self.session_id}, {"$set": {"goal": goal}}, upsert=True)
+        self._set_environment("goal", goal)
 
     def get_goal(self):
-        result = self.db["environment"].find_one({"session_id": self.session_id})
-        if result:
-            return result.get("goal", None)
-        return None
+        return self._get_environment().get("goal", None)
     
+    def _next_sequence(self, name: str, count: int = 1, seed=None) -> float:
+        """
+        Atomically reserves `count` values from the per-session counter `name`
+        and returns the last one.
+        `seed` is called to get the starting value when the counter does not exist yet.
+        """
+        self.flush()
+        counter = self.db["counters"].find_one_and_update(
+            {"session_id": self.session_id, "name": name},
+            {"$inc": {"seq": count}},
+            return_document=ReturnDocument.AFTER
+        )
+        if counter is None:
+            # $max keeps a concurrent seeder from moving the counter backwards
+            self.db["counters"].update_one(
+                {"session_id": self.session_id, "name": name},
+                {"$max": {"seq": seed() if seed else 0}},
+                upsert=True
+            )
+            counter = self.db["counters"].find_one_and_update(
+                {"session_id": self.session_id, "name": name},
+                {"$inc": {"seq": count}},
+                return_document=ReturnDocument.AFTER
+            )
+        return counter["seq"]
+
+    def _max_task_order(self) -> float:
+        self.flush()
+        last = self.db["tasks"].find_one({"session_id": self.session_id}, sort=[("sort_order", DESCENDING)])
+        return last["sort_order"] if last else 0.0
+
+    def _raise_task_order(self, sort_order: float):
+        # Only moves an existing counter; a missing one is seeded from the tasks later
+        self._write("counters", UpdateOne(
+            {"session_id": self.session_id, "name": "tasks"},
+            {"$max": {"seq": sort_order}}
+        ))
+
     def add_task(self, task: str, sort_order: float=None):
         if sort_order is not None:
-            self.db["tasks"].insert_one(dict(session_id=self.session_id, task=task, status="new", sort_order=sort_order))
+            self._write("tasks", InsertOne(dict(session_id=self.session_id, task=task, status="new", sort_order=sort_order)))
+            self._raise_task_order(sort_order)
         else:
-            tasks = self.db["tasks"].find({"session_id": self.session_id})
-            sort_order = 0.0
-            for t in tasks:
-                if t["sort_order"] > sort_order:
-                    sort_order = t["sort_order"]
-            sort_order += 1
-            self.db["tasks"].insert_one(dict(session_id=self.session_id, task=task, status="new", sort_order=sort_order))
+            sort_order = self._next_sequence("tasks", seed=self._max_task_order)
+            self._write("tasks", InsertOne(dict(session_id=self.session_id, task=task, status="new", sort_order=sort_order)))
+
+    def add_tasks(self, tasks: list[str]):
+        """Appends `tasks` in order, reserving their sort orders in one counter update."""
+        if not tasks:
+            return
+        last = self._next_sequence("tasks", count=len(tasks), seed=self._max_task_order)
+        first = last - len(tasks) + 1
+        self._write("tasks", *[
+            InsertOne(dict(session_id=self.session_id, task=task, status="new", sort_order=first + i))
+            for i, task in enumerate(tasks)
+        ])
+
+    def reorder_tasks(self, sort_orders: dict):
+        """Sets the sort order of many tasks at once. `sort_orders` maps task id to sort order."""
+        if not sort_orders:
+            return
+        self._write("tasks", *[
+            UpdateOne({"session_id": self.session_id, "_id": ObjectId(task_id)}, {"$set": {"sort_order": sort_order}})
+            for task_id, sort_order in sort_orders.items()
+        ])
+        self._raise_task_order(max(sort_orders.values()))
 
     def set_task_status(self, task_id, status):
-        self.db["tasks"].update_one({"session_id": self.session_id, "_id": ObjectId(task_id)}, {"$set": {"status": status}})
+        self._write("tasks", UpdateOne({"session_id": self.session_id, "_id": ObjectId(task_id)}, {"$set": {"status": status}}))
 
     def update_task(self, task_id, status, result):
-        self.db["tasks"].update_one({"session_id": self.session_id, "_id": ObjectId(task_id)}, {"$set": {"status": status, "result": result}})
+        self._write("tasks", UpdateOne({"session_id": self.session_id, "_id": ObjectId(task_id)}, {"$set": {"status": status, "result": result}}))
         
     def get_tasks(self):
-        tasks = self.db["tasks"].find({"session_id": self.session_id})
-        sorted_tasks = sorted(tasks, key=lambda x: x["sort_order"])
-        return sorted_tasks
+        self.flush()
+        return list(self.db["tasks"].find({"session_id": self.session_id}).sort("sort_order", ASCENDING))
     
     def clear_tasks(self):
-        self.db["tasks"].delete_many({"session_id": self.session_id})
+        self._write("tasks", DeleteMany({"session_id": self.session_id}))
+        self._write("counters", DeleteOne({"session_id": self.session_id, "name": "tasks"}))
 
     def set_open_file(self, file_path):
-        self.db["files"].insert_one({"session_id": self.session_id, "file_path": file_path})
+        self._write("files", InsertOne({"session_id": self.session_id, "file_path": file_path}))
         
     def get_open_files(self):
+        self.flush()
         return list(self.db["files"].find({"session_id": self.session_id}))
     
     def remove_open_file(self, file_path):
-        self.db["files"].delete_one({"session_id": self.session_id, "file_path": file_path})
+        self._write("files", DeleteOne({"session_id": self.session_id, "file_path": file_path}))
     
     def get_boost_state(self):
-        result = self.db["environment"].find_one({"session_id": self.session_id})
-        if result:
-            return result.get("boost_state", False)
-        return False
+        return self._get_environment().get("boost_state", False)
     
     def set_boost_state(self, state):
-        self.db["environment"].update_one({"session_id": self.session_id}, {"$set": {"boost_state": state}}, upsert=True)
+        self._set_environment("boost_state", state)
+
+    def get_snapshot(self) -> dict:
+        """
+        Returns goal, working dir, boost state, tasks, notes and open files
+        in a single aggregation on the `environment` document.
+        """
+        self.flush()
+        pipeline = [
+            {"$match": {"session_id": self.session_id}},
+            {"$limit": 1},
+            {"$lookup": {"from": "tasks", "localField": "session_id", "foreignField": "session_id", "as": "tasks"}},
+            {"$lookup": {"from": "notes", "localField": "session_id", "foreignField": "session_id", "as": "notes"}},
+            {"$lookup": {"from": "files", "localField": "session_id", "foreignField": "session_id", "as": "open_files"}},
+        ]
+        result = next(self.db["environment"].aggregate(pipeline), None)
+        if result is not None:
+            self._cache_environment({k: v for k, v in result.items() if k not in ("tasks", "notes", "open_files")}, authoritative=True)
+        if result is None:
+            self._cache_environment({}, authoritative=True)
+            # No environment document yet, so there is nothing to join against
+            return dict(
+                goal=None,
+                working_dir=None,
+                boost_state=False,
+                tasks=self.get_tasks(),
+                notes=self.get_notes(),
+                open_files=self.get_open_files()
+            )
+        return dict(
+            goal=result.get("goal", None),
+            working_dir=result.get("working_dir", None),
+            boost_state=result.get("boost_state", False),
+            tasks=sorted(result["tasks"], key=lambda x: x["sort_order"]),
+            notes=result["notes"],
+            open_files=result["open_files"]
+        )
     
 
-# Lazy initialization with thread-safety
-_session_memory = {}
-_lock = threading.Lock()
+    def close(self):
+        """Sends pending writes. The shared MongoClient stays open for other sessions."""
+        self.flush()
+
+
+SESSION_MEMORY_THREADS = int(os.getenv("SESSION_MEMORY_THREADS", "16"))
+
+_executor: ThreadPoolExecutor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SESSION_MEMORY_THREADS, thread_name_prefix="session-memory")
+    return _executor
+
+
+class AsyncSessionMemory():
+    """
+    Async face of a SessionMemory for code running on an event loop.
+
+    Database calls run on a dedicated thread pool so a Mongo round trip never
+    stalls the loop; cached environment reads return without leaving it. All
+    state (counters, write-behind buffer, environment cache) is shared with the
+    wrapped SessionMemory.
+    """
+
+    def __init__(self, memory: SessionMemory):
+        self.memory = memory
+        self.session_id = memory.session_id
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+
+    async def _get_environment_field(self, field: str, default=None):
+        environment = self.memory._cached_environment()
+        if environment is None:
+            environment = await self._run(self.memory._get_environment)
+        return environment.get(field, default)
+
+    async def add_note(self, note):
+        return await self._run(self.memory.add_note, note)
+
+    async def get_notes(self):
+        return await self._run(self.memory.get_notes)
+
+    async def remove_note(self, note_id):
+        return await self._run(self.memory.remove_note, note_id)
+
+    async def get_messages(self, limit: int = None, before_seq: int = None, since_seq: int = None):
+        return await self._run(self.memory.get_messages, limit, before_seq, since_seq)
+
+    async def add_message(self, role, content) -> int:
+        return await self._run(self.memory.add_message, role, content)
+
+    async def add_messages(self, messages: list[tuple[str, str]]) -> list[int]:
+        return await self._run(self.memory.add_messages, messages)
+
+    async def get_working_dir(self) -> str:
+        return await self._get_environment_field("working_dir")
+
+    async def set_working_dir(self, working_dir):
+        return await self._run(self.memory.set_working_dir, working_dir)
+
+    async def get_goal(self):
+        return await self._get_environment_field("goal")
+
+    async def set_goal(self, goal):
+        return await self._run(self.memory.set_goal, goal)
+
+    async def get_boost_state(self):
+        return await self._get_environment_field("boost_state", False)
+
+    async def set_boost_state(self, state):
+        return await self._run(self.memory.set_boost_state, state)
+
+    async def add_task(self, task: str, sort_order: float = None):
+        return await self._run(self.memory.add_task, task, sort_order)
+
+    async def add_tasks(self, tasks: list[str]):
+        return await self._run(self.memory.add_tasks, tasks)
+
+    async def reorder_tasks(self, sort_orders: dict):
+        return await self._run(self.memory.reorder_tasks, sort_orders)
+
+    async def set_task_status(self, task_id, status):
+        return await self._run(self.memory.set_task_status, task_id, status)
+
+    async def update_task(self, task_id, status, result):
+        return await self._run(self.memory.update_task, task_id, status, result)
+
+    async def get_tasks(self):
+        return await self._run(self.memory.get_tasks)
+
+    async def clear_tasks(self):
+        return await self._run(self.memory.clear_tasks)
+
+    async def set_open_file(self, file_path):
+        return await self._run(self.memory.set_open_file, file_path)
+
+    async def get_open_files(self):
+        return await self._run(self.memory.get_open_files)
+
+    async def remove_open_file(self, file_path):
+        return await self._run(self.memory.remove_open_file, file_path)
+
+    async def get_snapshot(self) -> dict:
+        return await self._run(self.memory.get_snapshot)
+
+    async def flush(self):
+        return await self._run(self.memory.flush)
+
+
+SESSION_MEMORY_REGISTRY_SIZE = int(os.getenv("SESSION_MEMORY_REGISTRY_SIZE", "256"))
+SESSION_MEMORY_IDLE_TTL = float(os.getenv("SESSION_MEMORY_IDLE_TTL", "3600"))
+
+# Lazy initialization with thread-safety, bounded by size and idle time
+_session_memory = Registry(
+    factory=SessionMemory,
+    max_size=SESSION_MEMORY_REGISTRY_SIZE,
+    idle_ttl=SESSION_MEMORY_IDLE_TTL,
+    on_evict=SessionMemory.close,
+    name="session_memory",
+    executor=get_executor
+)
 
 def get_session_memory(session_id=None)->SessionMemory:
-    global _session_memory
-    if _session_memory is None or session_id not in _session_memory:
-        with _lock:  # Ensures thread-safe initialization
-            _session_memory[session_id] = SessionMemory(session_id)
-    return _session_memory[session_id]
\ No newline at end of file
+    return _session_memory.get(session_id)
+
+def get_session_memory_stats() -> dict:
+    return _session_memory.stats()
+
+
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+def watch_environment_changes():
+    """
+    Starts a daemon thread that pushes `environment` changes made by any process
+    into the cached SessionMemory instances. Needs a replica set; on a standalone
+    server the caches fall back to ENVIRONMENT_CACHE_TTL. Only the first call
+    starts a thread.
+    """
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+
+    def watch():
+        collection = get_mongo_client()[MONGO_DB_NAME]["environment"]
+        try:
+            with collection.watch(full_document="updateLookup") as stream:
+                for change in stream:
+                    document = change.get("fullDocument")
+                    if not document:
+                        continue
+                    memory = _session_memory.peek(document.get("session_id"))
+                    if memory is not None:
+                        memory._cache_environment(document)
+        except Exception as e:
+            logger.warning(f">>> Environment change stream unavailable, using {ENVIRONMENT_CACHE_TTL}s TTL: {e}")
+
+    threading.Thread(target=watch, name="environment-watcher", daemon=True).start()
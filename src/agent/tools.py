@@ -1,8 +1,10 @@
 import os
+import functools
 
 from langchain_core.tools import tool
 
-from docker_utils.docker_executor import DockerCommandExecutor
+from docker_utils.docker_executor import DockerCommandExecutor, CommandTimeoutError
+from docker_utils.container_pool import get_execution_container
 from agent.actor import get_actor, Actor
 from agent.session_memory import SessionMemory
 
@@ -12,6 +14,12 @@ logger.setLevel(INFO)
 
 DEFAULT_CONTAINER_NAME = "my_execution_container"
 
+# Bytes kept from the start and from the end of each output stream, per tool
+TOOL_SHELL_OUTPUT_LIMIT = int(os.getenv("TOOL_SHELL_OUTPUT_LIMIT", "16384"))
+TOOL_AWS_CLI_OUTPUT_LIMIT = int(os.getenv("TOOL_AWS_CLI_OUTPUT_LIMIT", "16384"))
+# Run tool_shell commands in a persistent per-session shell instead of a fresh exec each
+TOOL_SHELL_PERSISTENT = os.getenv("TOOL_SHELL_PERSISTENT", "true").lower() in ("1", "true", "yes")
+
 
 @tool
 def tool_local_ip() -> str:
@@ -40,10 +48,11 @@ def tool_set_working_dir(session_id: str, working_dir: str) -> str:
 
 
 @tool
-def tool_aws_cli(session_id: str, param_string: str) -> str:
+def tool_aws_cli(session_id: str, param_string: str, timeout_seconds: float = None) -> str:
     """
     Runs an AWS CLI command and returns the output.
     Will execute `aws {param_string}`.
+    `timeout_seconds` optionally limits how long the command may run.
     """
     logger.info(">> TOOL: Running AWS CLI command")
     logger.info(f"Command: aws {param_string}")
@@ -55,39 +64,55 @@ def tool_aws_cli(session_id: str, param_string: str) -> str:
         else:
             command = f"aws {param_string}"
         exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
             working_dir=actor.memory.get_working_dir(),
             command=command,
+            output_limit=TOOL_AWS_CLI_OUTPUT_LIMIT,
+            timeout=timeout_seconds,
         )
         if exit_code != 0:
             raise RuntimeError(f"AWS CLI command failed with exit code {exit_code}: {stderr}\n{stdout}")
         
         return str(stdout)
+    except CommandTimeoutError as e:
+        logger.error(f"AWS CLI command {e}")
+        return f"AWS CLI command {e}. Partial output:\n{e.stderr}\n{e.stdout}"
     except Exception as e:
         logger.error(f"Error running AWS CLI command: {str(e)}")
         return f"Error running AWS CLI command: {str(e)}"
 
 
 @tool
-def tool_shell(session_id: str, cmd_string: str) -> str:
+def tool_shell(session_id: str, cmd_string: str, timeout_seconds: float = None) -> str:
     """
     Runs a shell command and returns the output.
     Accepts a string of arguments to pass to the shell.
+    The shell persists between calls: `cd`, exported variables and activated virtualenvs carry over.
+    `timeout_seconds` optionally limits how long the command may run.
     """
     logger.info(">> TOOL: Running shell command")
     logger.info(f"Command: {cmd_string}")
 
     try:    
         actor: Actor = get_actor(session_id)
-        exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
+        if TOOL_SHELL_PERSISTENT:
+            execute = functools.partial(actor.executor.run_in_shell, session_id)
+        else:
+            execute = actor.executor.execute_command
+        exit_code, stdout, stderr = execute(
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
             working_dir=actor.memory.get_working_dir(),
             command=f"{cmd_string}",
+            output_limit=TOOL_SHELL_OUTPUT_LIMIT,
+            timeout=timeout_seconds,
         )
         if exit_code != 0:
             raise RuntimeError(f"shell command failed with exit code {exit_code}: {stderr}\n{stdout}")
         
         return str(stdout)
+    except CommandTimeoutError as e:
+        logger.error(f"shell command {e}")
+        return f"Shell command {e}. Partial output:\n{e.stderr}\n{e.stdout}"
     except Exception as e:
         logger.error(f"Error running shell command: {str(e)}")
         logger.error(f"working_dir={actor.memory.get_working_dir()}")
@@ -147,6 +172,32 @@ def tool_add_task(session_id: str, task: str, sort_order: float = None) -> str:
     actor.memory.add_task(task, sort_order)
     return f"Task added successfully."
 
+@tool
+def tool_add_tasks(session_id: str, tasks: list[str]) -> str:
+    """
+    Adds several tasks to the end of the task list, in the given order.
+    Use this to lay out a plan in one call.
+    """
+    logger.info(">> TOOL: Adding tasks")
+    logger.info(f"Tasks: {tasks}")
+
+    actor: Actor = get_actor(session_id)
+    actor.memory.add_tasks(tasks)
+    return f"{len(tasks)} tasks added successfully."
+
+@tool
+def tool_reorder_tasks(session_id: str, sort_orders: dict[str, float]) -> str:
+    """
+    Changes the order of several tasks at once.
+    `sort_orders` maps each task id to its new sort order.
+    """
+    logger.info(">> TOOL: Reordering tasks")
+    logger.info(f"Sort orders: {sort_orders}")
+
+    actor: Actor = get_actor(session_id)
+    actor.memory.reorder_tasks(sort_orders)
+    return f"{len(sort_orders)} tasks reordered successfully."
+
 @tool
 def tool_set_task_status(session_id: str, task_id: str, status: str) -> str:
     """
@@ -200,7 +251,7 @@ def tool_open_file(session_id: str, file_path: str) -> str:
     try:
         actor: Actor = get_actor(session_id)
         exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
             working_dir=actor.memory.get_working_dir(),
             command=f"cat {file_path}",
         )
@@ -241,7 +292,7 @@ def tool_write_file(session_id: str, file_path: str, file_data: str) -> str:
         actor: Actor = get_actor(session_id)
         
         exit_code, stdout, stderr = actor.executor.write_to_file(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
             working_dir=actor.memory.get_working_dir(),
             file_path=file_path,
             content=file_data
@@ -255,3 +306,63 @@ def tool_write_file(session_id: str, file_path: str, file_data: str) -> str:
     except Exception as e:
         logger.error(f"Error writing file: {str(e)}")
         return f"Error writing file: {str(e)}"
+
+
+@tool
+def tool_write_files(session_id: str, files: dict[str, str]) -> str:
+    """
+    Writes several files at once. Use this instead of repeated tool_write_file calls when creating or updating multiple files.
+    `files` maps each path, relative to the working directory, to the full file contents.
+    """
+    logger.info(">> TOOL: Writing files")
+    logger.info(f"File paths: {list(files)}")
+
+    try:
+        actor: Actor = get_actor(session_id)
+
+        exit_code, stdout, stderr = actor.executor.write_files(
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
+            working_dir=actor.memory.get_working_dir(),
+            files=files
+        )
+        if exit_code != 0:
+            logger.error(f"Error writing files: {stderr}\n{stdout}")
+            raise RuntimeError(f"Error writing files: {stderr}\n{stdout}")
+
+        return f"{len(files)} files written successfully."
+
+    except Exception as e:
+        logger.error(f"Error writing files: {str(e)}")
+        return f"Error writing files: {str(e)}"
+
+
+@tool
+def tool_read_files(session_id: str, paths: list[str]) -> dict[str, str]:
+    """
+    Reads several files at once and returns their contents keyed by path.
+    Use this instead of repeated tool_open_file calls to look at a group of files, e.g. a whole module.
+    `paths` are file paths or glob patterns (e.g. `src/*.py`), relative to the working directory.
+    Binary files and files over the size limits are listed with the reason they were skipped.
+    The files are not added to the open files.
+    """
+    logger.info(">> TOOL: Reading files")
+    logger.info(f"Paths: {paths}")
+
+    try:
+        actor: Actor = get_actor(session_id)
+        results = actor.executor.read_files(
+            container_name=get_execution_container(session_id, DEFAULT_CONTAINER_NAME),
+            working_dir=actor.memory.get_working_dir(),
+            paths=paths
+        )
+        return format_read_results(results)
+    except Exception as e:
+        logger.error(f"Error reading files: {str(e)}")
+        return {"error": f"Error reading files: {str(e)}"}
+
+
+def format_read_results(results: dict) -> dict[str, str]:
+    return {
+        path: result["content"] if "content" in result else f"[skipped: {result['skipped']}, {result['size']} bytes]"
+        for path, result in results.items()
+    }
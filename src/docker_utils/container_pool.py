@@ -0,0 +1,295 @@
+import os
+import time
+import uuid
+import functools
+import threading
+from typing import Callable, Dict, List, Optional
+
+import docker
+from docker.models.containers import Container
+
+from docker_utils.docker_client import get_docker_client
+from docker_utils.container_scheduler import ContainerScheduler, get_container_scheduler
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Warm containers kept ready for new sessions; 0 disables the pool and every
+# session shares EXECUTION_CONTAINER_NAME
+CONTAINER_POOL_SIZE = int(os.getenv("CONTAINER_POOL_SIZE", "0"))
+CONTAINER_POOL_IMAGE = os.getenv("CONTAINER_POOL_IMAGE", "devops-container")
+CONTAINER_POOL_PREFIX = os.getenv("CONTAINER_POOL_PREFIX", "agent-pool")
+# Seconds to wait before retrying after a failed launch
+CONTAINER_POOL_RETRY = float(os.getenv("CONTAINER_POOL_RETRY", "10"))
+# Seconds a leased container may go unused before it goes back to the pool; keep it
+# well above CONTAINER_IDLE_STOP so an idle session's container is stopped, not recycled
+CONTAINER_LEASE_TTL = float(os.getenv("CONTAINER_LEASE_TTL", "86400"))
+CONTAINER_LEASE_CHECK = 60
+# Resource quota per pool container, e.g. CONTAINER_CPUS=1.5 and CONTAINER_MEMORY=2g; unset means unlimited
+CONTAINER_CPUS = float(os.getenv("CONTAINER_CPUS", "0")) or None
+CONTAINER_MEMORY = os.getenv("CONTAINER_MEMORY") or None
+
+POOL_LABEL = "agent.pool"
+
+
+class ContainerPool:
+    """
+    Keeps `size` execution containers running so a session can lease one on
+    its first tool call without paying the container start latency.
+
+    A background thread launches containers until `size` are warm. A session
+    keeps its container until `release`, or until it has gone unused for
+    `lease_ttl`; it is then removed and the pool refilled with a clean one. A container
+    is never taken back while the scheduler has a call running in it.
+    """
+
+    def __init__(
+        self,
+        launch: Callable[[str, Dict[str, str]], Container],
+        size: int = CONTAINER_POOL_SIZE,
+        prefix: str = CONTAINER_POOL_PREFIX,
+        client: docker.DockerClient = None,
+        scheduler: Optional[ContainerScheduler] = None,
+        lease_ttl: float = CONTAINER_LEASE_TTL
+    ):
+        """
+        Args:
+            launch: Starts a container given its name and labels, and returns
+                once it is running
+            size: Warm containers to keep ready
+            prefix: Container names are "<prefix>-<id>"; also the pool label value
+            client: Docker client used to recycle containers
+            scheduler: Manages leased containers while they are idle
+            lease_ttl: Seconds without use after which a lease expires
+        """
+        self.launch = launch
+        self.size = size
+        self.prefix = prefix
+        self.client = client or get_docker_client()
+        self.scheduler = scheduler
+        self.warm: List[str] = []
+        self.leases: Dict[str, str] = {}  # session_id -> container name
+        self.lease_ttl = lease_ttl
+        self._last_leased: Dict[str, float] = {}  # session_id -> monotonic time of the last lease call
+        self._pending_release = set()  # sessions released while a call was running
+        self.launching = 0
+        self.cold_starts = 0
+        self.recycled = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+
+    def start(self):
+        """Removes containers left by an earlier run of this pool and starts the refill thread."""
+        for container in self.client.containers.list(all=True, filters={"label": f"{POOL_LABEL}={self.prefix}"}):
+            logger.info(f">>> Removing stale pool container {container.name}")
+            self._remove(container.name)
+        threading.Thread(target=self._refill, name=f"{self.prefix}-refill", daemon=True).start()
+        threading.Thread(target=self._expire_leases, name=f"{self.prefix}-leases", daemon=True).start()
+
+    def lease(self, session_id: str) -> str:
+        """Returns the container leased to `session_id`, leasing one on first use."""
+        with self._lock:
+            self._last_leased[session_id] = time.monotonic()
+            self._pending_release.discard(session_id)
+            name = self.leases.get(session_id)
+            if name is not None:
+                return name
+            if self.warm:
+                name = self.leases[session_id] = self.warm.pop(0)
+                self._wake.notify()
+            else:
+                name = None
+                self.cold_starts += 1
+
+        if name is None:
+            # Nothing warm: start one for this session rather than wait for the refill
+            name = self._new_name()
+            try:
+                self.launch(name, self._labels())
+            except Exception:
+                # The container may have been created before the launch failed
+                self._remove(name)
+                raise
+            with self._lock:
+                existing = self.leases.setdefault(session_id, name)
+            if existing != name:
+                # Another call for the same session won the race
+                self._retire(name)
+                return existing
+        logger.info(f">>> Leased {name} to session {session_id}")
+        if self.scheduler is not None:
+            self.scheduler.register(name)
+        return name
+
+    def release(self, session_id: str):
+        """
+        Takes back the session's container and recycles it. If a call is
+        running in it, the release happens once the call has finished.
+        """
+        with self._lock:
+            name = self.leases.get(session_id)
+            if name is None:
+                return
+            if self._busy(name):
+                logger.info(f">>> Session {session_id} released {name} while in use, deferring")
+                self._pending_release.add(session_id)
+                return
+            del self.leases[session_id]
+            self._last_leased.pop(session_id, None)
+            self._pending_release.discard(session_id)
+        logger.info(f">>> Session {session_id} released {name}")
+        if self.scheduler is not None:
+            self.scheduler.unregister(name)
+        threading.Thread(target=self._retire, args=(name,), name=f"{self.prefix}-recycle", daemon=True).start()
+
+    def expire_leases(self):
+        """Releases leases unused for `lease_ttl` and deferred releases whose call finished."""
+        now = time.monotonic()
+        with self._lock:
+            expired = []
+            for session_id, name in self.leases.items():
+                last_used = self._last_leased.get(session_id, now)
+                if self.scheduler is not None:
+                    last_used = max(last_used, self.scheduler.last_activity(name) or last_used)
+                if session_id in self._pending_release or now - last_used >= self.lease_ttl:
+                    expired.append(session_id)
+        for session_id in expired:
+            self.release(session_id)
+
+    def _busy(self, name: str) -> bool:
+        return self.scheduler is not None and self.scheduler.in_use(name)
+
+    def close(self):
+        """Stops refilling and removes every warm and leased container."""
+        with self._lock:
+            self._closed = True
+            names = self.warm + list(self.leases.values())
+            self.warm, self.leases = [], {}
+            self._last_leased.clear()
+            self._pending_release.clear()
+            self._wake.notify_all()
+        for name in names:
+            self._remove(name)
+
+    def stats(self) -> dict:
+        return dict(
+            warm=len(self.warm),
+            leased=len(self.leases),
+            launching=self.launching,
+            cold_starts=self.cold_starts,
+            recycled=self.recycled
+        )
+
+    def _retire(self, name: str):
+        # Removed rather than reused: a container's filesystem keeps whatever
+        # its session left outside the shared mounts
+        self.recycled += 1
+        self._remove(name)
+        with self._lock:
+            self._wake.notify()
+
+    def _remove(self, name: str):
+        try:
+            self.client.containers.get(name).remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        except Exception as e:
+            logger.warning(f">>> Failed to remove pool container {name}: {e}")
+
+    def _refill(self):
+        while True:
+            with self._lock:
+                while not self._closed and len(self.warm) + self.launching >= self.size:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                self.launching += 1
+            name = self._new_name()
+            launched = False
+            try:
+                self.launch(name, self._labels())
+                launched = True
+            except Exception as e:
+                logger.error(f">>> Failed to launch pool container {name}: {e}")
+            with self._lock:
+                self.launching -= 1
+                keep = launched and not self._closed
+                if keep:
+                    self.warm.append(name)
+            if not keep:
+                self._remove(name)
+            if not launched:
+                time.sleep(CONTAINER_POOL_RETRY)
+
+    def _expire_leases(self):
+        while not self._closed:
+            time.sleep(CONTAINER_LEASE_CHECK)
+            try:
+                self.expire_leases()
+            except Exception as e:
+                logger.error(f">>> Lease expiry check failed: {e}")
+
+    def _new_name(self) -> str:
+        return f"{self.prefix}-{uuid.uuid4().hex[:8]}"
+
+    def _labels(self) -> Dict[str, str]:
+        return {POOL_LABEL: self.prefix}
+
+
+_pool: ContainerPool = None
+_pool_lock = threading.Lock()
+
+def get_container_pool() -> Optional[ContainerPool]:
+    """
+    Returns the process-wide pool, started on first use, or None when
+    CONTAINER_POOL_SIZE is 0. Pool containers are launched like the one from
+    start_docker_manager, with PROJECT_FOLDER mounted, under the CPU and memory
+    quotas, and leased ones are paused and stopped when idle.
+    """
+    global _pool
+    if CONTAINER_POOL_SIZE <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from docker_utils.docker_launcher import DockerEnvironmentManager, shared_folder_volumes, DATA_FOLDER
+
+                manager = DockerEnvironmentManager()
+                launch = functools.partial(
+                    _launch,
+                    manager,
+                    environment={"AWS_PROFILE": os.getenv("AWS_PROFILE"), "AWS_REGION": os.getenv("AWS_REGION")},
+                    volumes=shared_folder_volumes([DATA_FOLDER, os.getenv("PROJECT_FOLDER")]),
+                    use_aws_credentials=True,
+                    use_github_credentials=True,
+                    image_tag=CONTAINER_POOL_IMAGE,
+                    cpus=CONTAINER_CPUS,
+                    mem_limit=CONTAINER_MEMORY
+                )
+                _pool = ContainerPool(launch, scheduler=get_container_scheduler())
+                _pool.start()
+    return _pool
+
+def _launch(manager, name: str, labels: Dict[str, str], **kwargs) -> Container:
+    return manager.run_container(container_name=name, labels=labels, **kwargs)
+
+def get_execution_container(session_id: str, default: str) -> str:
+    """
+    Returns the container `session_id` runs its tools in: its leased pool
+    container, or EXECUTION_CONTAINER_NAME (else `default`) without a pool.
+    May block while a container starts if none is warm.
+    """
+    pool = get_container_pool()
+    if pool is None:
+        return os.getenv("EXECUTION_CONTAINER_NAME", default)
+    return pool.lease(session_id)
+
+def release_execution_container(session_id: str):
+    """
+    Returns the session's container to the pool, if it leased one. Call it
+    when the session ends; leases of abandoned sessions expire after
+    CONTAINER_LEASE_TTL.
+    """
+    if _pool is not None:
+        _pool.release(session_id)
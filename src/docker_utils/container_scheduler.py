@@ -0,0 +1,299 @@
+import os
+import time
+import threading
+import contextlib
+from typing import Dict, Optional, Tuple
+
+import docker
+
+from docker_utils.docker_client import get_docker_client, invalidate_container
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds without activity before a session container is paused, then stopped; 0 disables either step
+CONTAINER_IDLE_PAUSE = float(os.getenv("CONTAINER_IDLE_PAUSE", "300"))
+CONTAINER_IDLE_STOP = float(os.getenv("CONTAINER_IDLE_STOP", "1800"))
+# Session containers allowed to run (not paused or stopped) at once
+CONTAINER_MAX_ACTIVE = int(os.getenv("CONTAINER_MAX_ACTIVE", "8"))
+# Seconds a call waits for an active slot before running over the cap
+CONTAINER_CAP_WAIT = float(os.getenv("CONTAINER_CAP_WAIT", "60"))
+CONTAINER_IDLE_CHECK = 15
+CONTAINER_STOP_TIMEOUT = 1
+
+RUNNING, PAUSED, STOPPED = "running", "paused", "stopped"
+
+
+class _Tracked:
+    def __init__(self):
+        self.state = RUNNING
+        self.last_activity = time.monotonic()
+        self.in_use = 0
+        self.pending = None  # "pause" or "stop" once decided, until carried out or called off
+        self.pending_since = None
+        self.resuming = False
+        self.io_lock = threading.Lock()  # serializes Docker calls for the container
+
+
+class ContainerScheduler:
+    """
+    Bounds how many session containers run at once.
+
+    Containers are registered when a session leases them. Each use is
+    bracketed by `activity`, which resumes a paused or stopped container and
+    records the time. A background thread pauses containers idle for
+    `pause_after` seconds and stops those idle for `stop_after`. When
+    `max_active` containers are running, resuming another first pauses the
+    least recently used one that is not in use.
+
+    Decisions are made under one lock, but Docker calls are made outside it,
+    under a per-container lock, so a slow start or an idle sweep only holds
+    up calls to the containers involved. A pause or stop is called off if
+    the container was used after it was decided.
+    """
+
+    def __init__(
+        self,
+        client: docker.DockerClient = None,
+        pause_after: float = CONTAINER_IDLE_PAUSE,
+        stop_after: float = CONTAINER_IDLE_STOP,
+        max_active: int = CONTAINER_MAX_ACTIVE,
+        cap_wait: float = CONTAINER_CAP_WAIT
+    ):
+        self.client = client or get_docker_client()
+        self.pause_after = pause_after
+        self.stop_after = stop_after
+        self.max_active = max_active
+        self.cap_wait = cap_wait
+        self.pauses = 0
+        self.stops = 0
+        self.resumes = 0
+        self._containers: Dict[str, _Tracked] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def register(self, name: str):
+        """Starts managing a running container, pausing another if that goes over the cap."""
+        with self._lock:
+            if name in self._containers:
+                return
+            victim = self._make_room(name)
+            self._containers[name] = _Tracked()
+        if victim is not None:
+            self._suspend(*victim)
+
+    def unregister(self, name: str):
+        """Stops managing a container, e.g. before it is recycled. Resumes it if needed."""
+        with self._lock:
+            tracked = self._containers.pop(name, None)
+            self._changed.notify_all()
+        if tracked is None:
+            return
+        try:
+            self._resume(name, tracked)
+        except Exception as e:
+            logger.error(f">>> Failed to resume {name}: {e}")
+
+    @contextlib.contextmanager
+    def activity(self, name: str):
+        """
+        Marks the container in use for the block, resuming it first if needed.
+
+        Raises:
+            RuntimeError: The container could not be resumed
+        """
+        self._acquire(name)
+        try:
+            yield
+        finally:
+            with self._lock:
+                tracked = self._containers.get(name)
+                if tracked is not None:
+                    tracked.in_use -= 1
+                    tracked.last_activity = time.monotonic()
+                    self._changed.notify_all()
+
+    def in_use(self, name: str) -> bool:
+        """Whether a call is running in the container."""
+        tracked = self._containers.get(name)
+        return tracked is not None and tracked.in_use > 0
+
+    def last_activity(self, name: str) -> Optional[float]:
+        tracked = self._containers.get(name)
+        return tracked.last_activity if tracked is not None else None
+
+    def _acquire(self, name: str):
+        with self._lock:
+            tracked = self._containers.get(name)
+            if tracked is None:
+                return
+            tracked.in_use += 1
+            tracked.last_activity = time.monotonic()
+            if tracked.state == RUNNING and tracked.pending is None:
+                return
+            victim = self._make_room(name) if tracked.state != RUNNING else None
+            tracked.resuming = True
+        try:
+            if victim is not None:
+                self._suspend(*victim)
+            self._resume(name, tracked)
+        except Exception as e:
+            with self._lock:
+                tracked.in_use -= 1
+                self._changed.notify_all()
+            raise RuntimeError(f"Failed to resume container {name}: {e}") from e
+        finally:
+            with self._lock:
+                tracked.resuming = False
+
+    def _make_room(self, name: str) -> Optional[Tuple[str, _Tracked]]:
+        """
+        Called with the lock held. Picks the container to pause so `name` can
+        run and marks the pause pending, waiting up to `cap_wait` for one to
+        become idle if all are busy. The caller carries out the pause.
+        """
+        deadline = time.monotonic() + self.cap_wait
+        while True:
+            active = [
+                (n, t) for n, t in self._containers.items()
+                if n != name and ((t.state == RUNNING and t.pending is None) or t.resuming)
+            ]
+            if len(active) < self.max_active:
+                return None
+            idle = [(t.last_activity, n) for n, t in active if t.in_use == 0 and not t.resuming]
+            if idle:
+                victim = min(idle)[1]
+                tracked = self._containers[victim]
+                tracked.pending, tracked.pending_since = "pause", time.monotonic()
+                logger.info(f">>> Pausing {victim} to make room for {name}")
+                return victim, tracked
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f">>> All {len(active)} active containers are busy, running {name} over the cap")
+                return None
+            self._changed.wait(remaining)
+
+    def check_idle(self):
+        """Pauses or stops containers that have been idle too long."""
+        now = time.monotonic()
+        decided = []
+        with self._lock:
+            for name, tracked in self._containers.items():
+                if tracked.in_use or tracked.pending or tracked.resuming:
+                    continue
+                idle = now - tracked.last_activity
+                if self.stop_after and idle >= self.stop_after and tracked.state != STOPPED:
+                    action = "stop"
+                elif self.pause_after and idle >= self.pause_after and tracked.state == RUNNING:
+                    action = "pause"
+                else:
+                    continue
+                logger.info(f">>> {'Stopping' if action == 'stop' else 'Pausing'} {name}, idle for {idle:.0f}s")
+                tracked.pending, tracked.pending_since = action, now
+                decided.append((name, tracked))
+        for name, tracked in decided:
+            self._suspend(name, tracked)
+
+    def start(self):
+        """Starts the daemon thread that applies the idle policy."""
+        def check():
+            while True:
+                time.sleep(CONTAINER_IDLE_CHECK)
+                try:
+                    self.check_idle()
+                except Exception as e:
+                    logger.error(f">>> Idle container check failed: {e}")
+
+        threading.Thread(target=check, name="container-idle-check", daemon=True).start()
+
+    def _suspend(self, name: str, tracked: _Tracked):
+        """Carries out the pending pause or stop, unless the container was used since."""
+        with tracked.io_lock:
+            with self._lock:
+                action = tracked.pending
+                current = self._containers.get(name) is tracked
+                if not current or tracked.in_use or tracked.last_activity > tracked.pending_since:
+                    tracked.pending = None
+                    self._changed.notify_all()
+                    return
+            try:
+                self._apply(name, action)
+                failed = None
+            except Exception as e:
+                failed = e
+                logger.error(f">>> Failed to {action} {name}: {e}")
+            with self._lock:
+                tracked.pending = None
+                if failed is None:
+                    if action == "pause":
+                        tracked.state = PAUSED
+                        self.pauses += 1
+                    else:
+                        tracked.state = STOPPED
+                        self.stops += 1
+                self._changed.notify_all()
+
+    def _resume(self, name: str, tracked: _Tracked):
+        """Resumes the container if it isn't running, waiting out a pause or stop in progress."""
+        with tracked.io_lock:
+            with self._lock:
+                if tracked.state == RUNNING:
+                    return
+            self._apply(name, "resume")
+            with self._lock:
+                tracked.state = RUNNING
+                self.resumes += 1
+                self._changed.notify_all()
+
+    def _apply(self, name: str, action: str):
+        try:
+            container = self.client.containers.get(name)
+            if action == "pause":
+                if container.status == "running":
+                    container.pause()
+            elif action == "stop":
+                if container.status == "paused":
+                    container.unpause()
+                # The image's shell ignores SIGTERM, so don't wait long for it
+                container.stop(timeout=CONTAINER_STOP_TIMEOUT)
+            elif action == "resume":
+                if container.status == "paused":
+                    container.unpause()
+                elif container.status != "running":
+                    container.start()
+        finally:
+            # Don't let executors act on a cached status until the event arrives
+            invalidate_container(name)
+
+    def stats(self) -> dict:
+        states = [t.state for t in self._containers.values()]
+        return dict(
+            running=states.count(RUNNING),
+            paused=states.count(PAUSED),
+            stopped=states.count(STOPPED),
+            pauses=self.pauses,
+            stops=self.stops,
+            resumes=self.resumes
+        )
+
+
+_scheduler: ContainerScheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_container_scheduler() -> ContainerScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ContainerScheduler()
+                _scheduler.start()
+    return _scheduler
+
+def container_activity(name: str):
+    """
+    Context manager marking `name` in use. Only containers registered with
+    the scheduler (i.e. leased from the pool) are tracked.
+    """
+    if _scheduler is None:
+        return contextlib.nullcontext()
+    return _scheduler.activity(name)
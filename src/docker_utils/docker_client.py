@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from typing import Optional
+
+import docker
+from docker.models.containers import Container
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Connections in the shared client's pool; each streaming exec holds one while it runs
+DOCKER_MAX_POOL_SIZE = int(os.getenv("DOCKER_MAX_POOL_SIZE", "32"))
+# How long a cached container is trusted while the events stream is not connected
+CONTAINER_CACHE_TTL = float(os.getenv("CONTAINER_CACHE_TTL", "5"))
+# Seconds to wait before reconnecting a dropped events stream
+DOCKER_EVENTS_RETRY = float(os.getenv("DOCKER_EVENTS_RETRY", "5"))
+
+# Container events that change what a cached handle reports
+INVALIDATING_EVENTS = {"start", "die", "stop", "kill", "destroy", "pause", "unpause", "rename", "oom"}
+
+
+_client: docker.DockerClient = None
+_client_lock = threading.Lock()
+
+def get_docker_client() -> docker.DockerClient:
+    """Returns the process-wide Docker client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = docker.from_env(max_pool_size=DOCKER_MAX_POOL_SIZE)
+    return _client
+
+def set_docker_client(client: docker.DockerClient):
+    """Replace the shared client, e.g. to point at a different daemon or a fake."""
+    global _client, _cache
+    with _client_lock:
+        _client = client
+        _cache = None
+
+
+class ContainerCache:
+    """
+    Container handles by name, so a command does not pay an inspect round trip
+    before every exec.
+
+    Entries are dropped when the Docker events stream reports a state change for
+    the container (see `watch`). While the stream is not connected, entries
+    expire after `ttl` seconds instead.
+    """
+
+    def __init__(self, client: docker.DockerClient, ttl: float = CONTAINER_CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.watching = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: dict[str, tuple[Container, float]] = {}
+        self._generation = 0  # bumped on every invalidation
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Container:
+        """
+        Returns the container called `name`.
+
+        Raises:
+            docker.errors.NotFound: No such container
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and (self.watching or time.monotonic() - entry[1] < self.ttl):
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+        container = self.client.containers.get(name)
+        with self._lock:
+            # Don't store a handle fetched before an event that may have made it stale
+            if generation == self._generation:
+                self._entries[name] = (container, time.monotonic())
+        return container
+
+    def invalidate(self, name_or_id: Optional[str] = None):
+        """Drops the entry for a container name or id, or every entry when not given."""
+        with self._lock:
+            self._generation += 1
+            if name_or_id is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            for key, (container, _) in list(self._entries.items()):
+                if name_or_id in (key, container.id, container.name):
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def handle_event(self, event: dict):
+        action = event.get("Action") or event.get("status") or ""
+        # Exec events arrive as e.g. "exec_start: /bin/sh -c ..."; they do not change the container
+        if action not in INVALIDATING_EVENTS:
+            return
+        actor = event.get("Actor", {})
+        self.invalidate(actor.get("ID") or event.get("id"))
+        name = actor.get("Attributes", {}).get("name")
+        if name:
+            self.invalidate(name)
+
+    def watch(self):
+        """
+        Starts a daemon thread that applies container events from the Docker
+        daemon to the cache, reconnecting after DOCKER_EVENTS_RETRY seconds if
+        the stream drops.
+        """
+        def watch():
+            while True:
+                try:
+                    events = self.client.events(decode=True, filters={"type": "container"})
+                    # Anything may have changed while the stream was down
+                    self.invalidate()
+                    self.watching = True
+                    for event in events:
+                        self.handle_event(event)
+                except Exception as e:
+                    logger.warning(f">>> Docker events stream unavailable, using {self.ttl}s TTL: {e}")
+                finally:
+                    self.watching = False
+                time.sleep(DOCKER_EVENTS_RETRY)
+
+        threading.Thread(target=watch, name="docker-events-watcher", daemon=True).start()
+
+    def stats(self) -> dict:
+        return dict(
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            invalidations=self.invalidations,
+            watching=self.watching
+        )
+
+
+_cache: ContainerCache = None
+_cache_lock = threading.Lock()
+
+def get_container_cache() -> ContainerCache:
+    """Returns the process-wide container cache, watching the shared client's events."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ContainerCache(get_docker_client())
+                _cache.watch()
+    return _cache
+
+def invalidate_container(name_or_id: str):
+    """Drops a container from the shared cache, if there is one, after changing its state."""
+    if _cache is not None:
+        _cache.invalidate(name_or_id)
@@ -1,22 +1,255 @@
 import os
+import io
 import sys
-import subprocess
+import time
+import uuid
+import shlex
+import inspect
+import functools
+import codecs
+import tarfile
+import tempfile
+import threading
 import docker
-from typing import List, Optional, Dict
+from docker.models.containers import Container
+from typing import List, Optional, Dict, Callable, Iterator, Tuple, Union
+
+from docker_utils.docker_client import get_docker_client, get_container_cache, ContainerCache
+from docker_utils.shell_session import ShellSession, SHELL_COMMAND
+from docker_utils.container_scheduler import container_activity
 
 import logging
 
+# Where truncated command output is stored inside the container
+OUTPUT_SPILL_DIR = os.getenv("OUTPUT_SPILL_DIR", "/tmp/agent-output")
+# Output kept in host memory before the spill buffer moves to a host temp file
+OUTPUT_SPOOL_MEMORY = int(os.getenv("OUTPUT_SPOOL_MEMORY", str(1024 * 1024)))
+
+# Seconds a command may run before it is killed; 0 disables the limit
+EXEC_DEFAULT_TIMEOUT = float(os.getenv("EXEC_DEFAULT_TIMEOUT", "600"))
+# Seconds between SIGTERM and SIGKILL when a command is stopped
+EXEC_KILL_GRACE = float(os.getenv("EXEC_KILL_GRACE", "2"))
+EXEC_WATCHDOG_INTERVAL = 0.2
+EXEC_PID_DIR = "/tmp/agent-exec"
+
+# Runs "$0" as the leader of a new process group and records the group id in "$1".
+# setsid -w forks only when needed and passes the command's exit code through.
+PROCESS_GROUP_WRAPPER = (
+    'mkdir -p "$(dirname "$1")"; '
+    'setsid -w /bin/sh -c \'echo $$ > "$1"; exec /bin/sh -c "$0"\' "$0" "$1"; '
+    'rc=$?; rm -f "$1"; exit $rc'
+)
+
+# Limits for read_files: bytes per file, bytes per call, files per call
+READ_FILES_MAX_BYTES = int(os.getenv("READ_FILES_MAX_BYTES", str(256 * 1024)))
+READ_FILES_MAX_TOTAL = int(os.getenv("READ_FILES_MAX_TOTAL", str(2 * 1024 * 1024)))
+READ_FILES_MAX_COUNT = int(os.getenv("READ_FILES_MAX_COUNT", "200"))
+READ_STAGING_DIR = "/tmp/agent-read"
+
+# Expands each pattern argument as a glob (no word splitting) and copies the
+# regular files within the limits to "$dest/<n>". Prints one tab-separated line
+# per match: status, size, n, path.
+READ_FILES_SCRIPT = r"""
+dest=$1; max_file=$2; max_total=$3; max_files=$4; shift 4
+mkdir -p "$dest" || exit 1
+total=0; n=0
+IFS='
+'
+for pattern in "$@"; do
+  matched=0
+  for f in $pattern; do
+    [ -e "$f" ] || continue
+    matched=1
+    if [ ! -f "$f" ]; then printf 'not a file	0	-	%s
+' "$f"; continue; fi
+    size=$(stat -c %s -- "$f")
+    if [ "$size" -gt "$max_file" ]; then printf 'too large	%s	-	%s
+' "$size" "$f"; continue; fi
+    if [ "$n" -ge "$max_files" ] || [ $((total + size)) -gt "$max_total" ]; then printf 'over limit	%s	-	%s
+' "$size" "$f"; continue; fi
+    if cp -- "$f" "$dest/$n"; then
+      printf 'ok	%s	%s	%s
+' "$size" "$n" "$f"
+      total=$((total + size)); n=$((n + 1))
+    else
+      printf 'unreadable	%s	-	%s
+' "$size" "$f"
+    fi
+  done
+  [ "$matched" = 1 ] || printf 'not found	0	-	%s
+' "$pattern"
+done
+"""
+
+
+class CommandTimeoutError(RuntimeError):
+    """The command was killed after running longer than its timeout. Carries the partial output."""
+
+    def __init__(self, timeout: float, stdout: str, stderr: str):
+        super().__init__(f"timed out after {timeout:g}s")
+        self.timeout = timeout
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class CommandCancelledError(RuntimeError):
+    """The command was killed because its caller cancelled it. Carries the partial output."""
+
+    def __init__(self, stdout: str, stderr: str):
+        super().__init__("cancelled")
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+def tracks_activity(method):
+    """Brackets the call with container_activity for its `container_name` argument."""
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        container_name = signature.bind(self, *args, **kwargs).arguments["container_name"]
+        with container_activity(container_name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def decode_text(data: bytes) -> Dict:
+    """Returns dict(content=text), or dict(skipped="binary") for data that isn't UTF-8 text."""
+    if b"\x00" in data[:8192]:
+        return dict(skipped="binary")
+    try:
+        return dict(content=data.decode("utf-8"))
+    except UnicodeDecodeError:
+        return dict(skipped="binary")
+
+
+class OutputCapture:
+    """
+    Bounded capture of one output stream: keeps the first and last `limit`
+    bytes plus byte and line counts. The full output is spooled to a host temp
+    file so it can be copied into the container when it was truncated.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.spill_path = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spool = tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MEMORY)
+
+    def feed(self, text: str):
+        data = text.encode("utf-8")
+        self.total_bytes += len(data)
+        self.total_lines += data.count(b"\n")
+        self._spool.write(data)
+        if len(self._head) < self.limit:
+            room = self.limit - len(self._head)
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            if len(self._tail) > self.limit:
+                del self._tail[:len(self._tail) - self.limit]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self._head) + len(self._tail)
+
+    def spill(self) -> io.IOBase:
+        """Returns the spooled full output, rewound for reading."""
+        self._spool.seek(0)
+        return self._spool
+
+    def close(self):
+        self._spool.close()
+
+    def render(self) -> str:
+        head = self._head.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + self._tail.decode("utf-8", errors="replace")
+        omitted = self.total_bytes - len(self._head) - len(self._tail)
+        location = f"full output saved to {self.spill_path}" if self.spill_path else "full output not saved"
+        return (
+            f"{head}\n"
+            f"... [{omitted} bytes omitted; {self.total_bytes} bytes, {self.total_lines} lines total; {location}] ...\n"
+            f"{self._tail.decode('utf-8', errors='replace')}"
+        )
+
+
+class ExecStream:
+    """
+    Iterates over an exec's output as ("stdout" | "stderr", text) chunks.
+    Bytes are decoded incrementally, so multi-byte UTF-8 characters split
+    across chunks come out whole.
+    """
+
+    def __init__(self, api: docker.APIClient, exec_id: str, chunks: Iterator[Tuple[Optional[bytes], Optional[bytes]]]):
+        self.api = api
+        self.exec_id = exec_id
+        self._chunks = chunks
+        self._exit_code = None
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        }
+        for stdout, stderr in self._chunks:
+            for name, data in (("stdout", stdout), ("stderr", stderr)):
+                if data:
+                    text = decoders[name].decode(data)
+                    if text:
+                        yield name, text
+        for name, decoder in decoders.items():
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield name, text
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        if self._exit_code is None:
+            self._exit_code = self.api.exec_inspect(self.exec_id)["ExitCode"]
+        return self._exit_code
+
+
 class DockerCommandExecutor:
-    def __init__(self):
-        """Initialize the Docker client."""
-        self.client = docker.from_env()
+    def __init__(self, client: Optional[docker.DockerClient] = None):
+        """
+        Use the process-wide Docker client and container cache, or a private
+        cache over `client` when one is given.
+        """
+        if client is None:
+            self.client = get_docker_client()
+            self.containers = get_container_cache()
+        else:
+            self.client = client
+            self.containers = ContainerCache(client)
+        self._shells: Dict[Tuple[str, str], ShellSession] = {}
+        self._shells_lock = threading.Lock()
 
+    def close(self):
+        """Closes this executor's persistent shells; the Docker client is shared."""
+        self.close_shells()
+
+    def _running_container(self, container_name: str) -> Container:
+        container = self.containers.get(container_name)
+        if container.status != "running":
+            raise RuntimeError(f"Container {container_name} is not running")
+        return container
+
+    @tracks_activity
     def execute_command(
         self,
         container_name: str,
         command: str,
         working_dir: Optional[str] = None,
-        environment: Optional[Dict[str, str]] = None
+        environment: Optional[Dict[str, str]] = None,
+        on_output: Optional[Callable[[str, str], None]] = None,
+        output_limit: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None
     ) -> tuple[int, str, str]:
         """
         Execute a command in a running container.
@@ -26,79 +259,418 @@ class DockerCommandExecutor:
             command: Command to execute
             working_dir: Working directory for command execution
             environment: Environment variables for the command
+            on_output: Called with ("stdout" | "stderr", text) for each chunk
+                as it arrives
+            output_limit: Keep only the first and last `output_limit` bytes of
+                each stream; the full output is saved to a file under
+                OUTPUT_SPILL_DIR in the container and its path noted in the result
+            timeout: Seconds before the command's process group is killed;
+                defaults to EXEC_DEFAULT_TIMEOUT, 0 disables it
+            cancel_event: Kills the command's process group when set
             
+        Returns:
+            Tuple of (exit_code, stdout, stderr)
+
+        Raises:
+            CommandTimeoutError: The command ran longer than `timeout`
+            CommandCancelledError: `cancel_event` was set while it ran
+        """
+        exec_id = uuid.uuid4().hex[:8]
+        pid_file = f"{EXEC_PID_DIR}/{exec_id}.pid"
+
+        def run(feed: Callable[[str, str], None]) -> int:
+            stream = self.stream_command(container_name, command, working_dir, environment, pid_file=pid_file)
+            for name, text in stream:
+                feed(name, text)
+            return stream.exit_code
+
+        return self._run_watched(container_name, exec_id, pid_file, run, on_output, output_limit, timeout, cancel_event)
+
+    @tracks_activity
+    def run_in_shell(
+        self,
+        session_id: str,
+        container_name: str,
+        command: str,
+        working_dir: Optional[str] = None,
+        environment: Optional[Dict[str, str]] = None,
+        on_output: Optional[Callable[[str, str], None]] = None,
+        output_limit: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> tuple[int, str, str]:
+        """
+        Execute a command in the session's persistent shell, so that `cd`,
+        exported variables and shell functions carry over between commands.
+        The shell is started on first use and closed after SHELL_IDLE_TTL.
+
+        `working_dir` is applied when the shell starts and whenever it differs
+        from the previous call's; `environment` only when the shell starts.
+        If the shell is busy with another command of the same session, the
+        command runs in a one-off exec instead. On timeout or cancellation
+        the shell is killed with the command and a new one is started next time.
+
+        Args:
+            session_id: Session that owns the shell
+            container_name: Name or ID of the container
+            command: Command to execute
+            working_dir, environment, on_output, output_limit, timeout,
+            cancel_event: As for execute_command
+
         Returns:
             Tuple of (exit_code, stdout, stderr)
         """
+        key = (session_id, container_name)
+        with self._shells_lock:
+            shell = self._shells.get(key)
+            try:
+                container = self._running_container(container_name)
+            except docker.errors.NotFound:
+                raise ValueError(f"Container {container_name} not found")
+            started_at = container.attrs.get("State", {}).get("StartedAt")
+            if shell is not None and shell.started_at != started_at:
+                # The container was restarted; the old shell went with it
+                shell.close()
+            if shell is None or shell.closed:
+                exec_id = uuid.uuid4().hex[:8]
+                pid_file = f"{EXEC_PID_DIR}/shell-{exec_id}.pid"
+                try:
+                    shell = ShellSession(
+                        self.client.api,
+                        container.id,
+                        ["/bin/sh", "-c", PROCESS_GROUP_WRAPPER, SHELL_COMMAND, pid_file],
+                        environment,
+                        pid_file
+                    )
+                    shell.started_at = started_at
+                except docker.errors.NotFound:
+                    self.containers.invalidate(container_name)
+                    raise ValueError(f"Container {container_name} not found")
+                except docker.errors.APIError as e:
+                    self.containers.invalidate(container_name)
+                    raise RuntimeError(f"Docker API error: {str(e)}")
+                self._shells[key] = shell
+
+        if not shell.lock.acquire(blocking=False):
+            return self.execute_command(
+                container_name, command, working_dir, environment, on_output, output_limit, timeout, cancel_event
+            )
         try:
-            container = self.client.containers.get(container_name)
-            
-            # Check if container is running
-            if container.status != "running":
-                raise RuntimeError(f"Container {container_name} is not running")
-            
-            # Execute the command
-            exec_result = container.exec_run(
-                cmd=["/bin/sh", "-c", command],
-                workdir=working_dir,
-                environment=environment,
-                demux=True  # Split stdout and stderr
+            return self._run_watched(
+                container_name,
+                uuid.uuid4().hex[:8],
+                shell.pid_file,
+                lambda feed: shell.run(command, working_dir, feed),
+                on_output, output_limit, timeout, cancel_event
             )
+        except (CommandTimeoutError, CommandCancelledError):
+            shell.close()
+            raise
+        finally:
+            shell.release()
+
+    def close_shells(self, session_id: Optional[str] = None):
+        """
+        Closes the persistent shells of `session_id`, or all of them. A shell
+        running a command is closed once the command finishes.
+        """
+        with self._shells_lock:
+            keys = [key for key in self._shells if session_id is None or key[0] == session_id]
+            shells = [self._shells.pop(key) for key in keys]
+        for shell in shells:
+            shell.close_when_idle()
+
+    def _run_watched(
+        self,
+        container_name: str,
+        exec_id: str,
+        pid_file: str,
+        run: Callable[[Callable[[str, str], None]], int],
+        on_output: Optional[Callable[[str, str], None]],
+        output_limit: Optional[int],
+        timeout: Optional[float],
+        cancel_event: Optional[threading.Event]
+    ) -> tuple[int, str, str]:
+        """
+        Calls `run(feed)`, which passes output chunks to `feed` and returns the
+        exit code, under a watchdog that kills the process group in `pid_file`
+        on timeout or cancellation. Captures, spills and renders the output.
+        """
+        timeout = EXEC_DEFAULT_TIMEOUT if timeout is None else timeout
+        limit = output_limit if output_limit is not None else sys.maxsize
+        output = {"stdout": OutputCapture(limit), "stderr": OutputCapture(limit)}
+        done = threading.Event()
+        interrupted = []
+
+        def feed(name: str, text: str):
+            output[name].feed(text)
+            if on_output is not None:
+                on_output(name, text)
+
+        try:
+            threading.Thread(
+                target=self._watchdog,
+                args=(container_name, pid_file, timeout, cancel_event, done, interrupted),
+                name=f"exec-watchdog-{exec_id}",
+                daemon=True
+            ).start()
+            exit_code = run(feed)
+            done.set()
+
+            for name, capture in output.items():
+                if capture.truncated:
+                    path = f"{OUTPUT_SPILL_DIR}/{exec_id}.{name}"
+                    try:
+                        self._put_file(container_name, path, capture.spill(), capture.total_bytes)
+                        capture.spill_path = path
+                    except Exception as e:
+                        logging.warning(f"Failed to save full {name} to {path}: {e}")
+
+            stdout, stderr = output["stdout"].render(), output["stderr"].render()
+            if interrupted == ["timed out"]:
+                raise CommandTimeoutError(timeout, stdout, stderr)
+            if interrupted == ["cancelled"]:
+                raise CommandCancelledError(stdout, stderr)
+            return exit_code, stdout, stderr
+        finally:
+            done.set()
+            for capture in output.values():
+                capture.close()
+
+    def _watchdog(
+        self,
+        container_name: str,
+        pid_file: str,
+        timeout: float,
+        cancel_event: Optional[threading.Event],
+        done: threading.Event,
+        interrupted: list
+    ):
+        """Kills the exec's process group on timeout or cancellation, unless it finishes first."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while not done.wait(EXEC_WATCHDOG_INTERVAL):
+            if cancel_event is not None and cancel_event.is_set():
+                interrupted.append("cancelled")
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                interrupted.append("timed out")
+                break
+        else:
+            return
+
+        logging.warning(f"Command {interrupted[0]}, killing process group from {pid_file}")
+        try:
+            container = self.containers.get(container_name)
+            container.exec_run([
+                "/bin/sh", "-c",
+                'pgid=$(cat "$0" 2>/dev/null) || exit 0; '
+                'kill -TERM -$pgid 2>/dev/null; sleep "$1"; kill -KILL -$pgid 2>/dev/null; exit 0',
+                pid_file, str(EXEC_KILL_GRACE)
+            ])
+        except Exception as e:
+            logging.error(f"Failed to kill process group from {pid_file}: {e}")
+
+    def _put_file(self, container_name: str, path: str, fileobj: io.IOBase, size: int):
+        """Copy `size` bytes from `fileobj` to absolute `path` in the container."""
+        self._put_files(container_name, {path: (fileobj, size)})
+
+    def _put_files(self, container_name: str, files: Dict[str, Tuple[io.IOBase, int]]):
+        """
+        Copy several files into the container as one tar stream.
+
+        Args:
+            container_name: Name or ID of the container
+            files: Absolute path in the container -> (file object, size in bytes)
+        """
+        now = int(time.time())
+        with tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MEMORY) as archive:
+            with tarfile.open(fileobj=archive, mode="w") as tar:
+                for path, (fileobj, size) in files.items():
+                    # Entries are relative to "/"; extraction creates missing parent directories
+                    info = tarfile.TarInfo(name=os.path.normpath(path).lstrip("/"))
+                    info.size = size
+                    info.mtime = now
+                    info.mode = 0o644
+                    tar.addfile(info, fileobj)
+            archive.seek(0)
+            container = self.containers.get(container_name)
+            container.put_archive("/", archive)
+
+    def stream_command(
+        self,
+        container_name: str,
+        command: str,
+        working_dir: Optional[str] = None,
+        environment: Optional[Dict[str, str]] = None,
+        pid_file: Optional[str] = None
+    ) -> "ExecStream":
+        """
+        Start a command in a running container without buffering its output.
+        
+        Args:
+            container_name: Name or ID of the container
+            command: Command to execute
+            working_dir: Working directory for command execution
+            environment: Environment variables for the command
+            pid_file: Run the command in its own process group and write the
+                group id to this path, so the whole tree can be signalled
             
-            exit_code = exec_result.exit_code
-            stdout, stderr = exec_result.output
-            
-            # Decode bytes to string, handle None cases
-            stdout_str = stdout.decode('utf-8') if stdout else ""
-            stderr_str = stderr.decode('utf-8') if stderr else ""
-            
-            return exit_code, stdout_str, stderr_str
-            
+        Returns:
+            ExecStream yielding ("stdout" | "stderr", text) chunks as they
+            arrive; its exit_code is available once iteration finishes
+        """
+        try:
+            container = self._running_container(container_name)
+
+            cmd = ["/bin/sh", "-c", command]
+            if pid_file:
+                cmd = ["/bin/sh", "-c", PROCESS_GROUP_WRAPPER, command, pid_file]
+            exec_id = self.client.api.exec_create(
+                container.id,
+                cmd,
+                workdir=working_dir,
+                environment=environment
+            )["Id"]
+            chunks = self.client.api.exec_start(exec_id, stream=True, demux=True)
+            return ExecStream(self.client.api, exec_id, chunks)
+
         except docker.errors.NotFound:
+            self.containers.invalidate(container_name)
             raise ValueError(f"Container {container_name} not found")
         except docker.errors.APIError as e:
+            # e.g. 409 when the container stopped after it was cached
+            self.containers.invalidate(container_name)
+            raise RuntimeError(f"Docker API error: {str(e)}")
+
+    @tracks_activity
+    def read_files(
+        self,
+        container_name: str,
+        working_dir: str,
+        paths: List[str],
+        max_file_bytes: int = READ_FILES_MAX_BYTES,
+        max_total_bytes: int = READ_FILES_MAX_TOTAL,
+        max_files: int = READ_FILES_MAX_COUNT
+    ) -> Dict[str, Dict]:
+        """
+        Read many files from a running container with one archive download.
+
+        The paths are expanded in the container, the files within the limits
+        are staged under READ_STAGING_DIR, and the staging directory is fetched
+        with get_archive.
+
+        Args:
+            container_name: Name or ID of the container
+            working_dir: Directory that relative paths and globs are resolved against
+            paths: File paths or shell glob patterns
+            max_file_bytes: Files larger than this are skipped
+            max_total_bytes: Files past this running total are skipped
+            max_files: Files past this count are skipped
+
+        Returns:
+            Matched path -> dict(size=..., content=...) for text files, or
+            dict(size=..., skipped=reason) for files not returned
+        """
+        staging = f"{READ_STAGING_DIR}/{uuid.uuid4().hex[:8]}"
+        args = [staging, str(max_file_bytes), str(max_total_bytes), str(max_files), *paths]
+        exit_code, stdout, stderr = self.execute_command(
+            container_name=container_name,
+            working_dir=working_dir,
+            command=f"set -- {' '.join(shlex.quote(arg) for arg in args)}\n{READ_FILES_SCRIPT}"
+        )
+        if exit_code != 0:
+            raise RuntimeError(f"Failed to stage files: {stderr}")
+
+        results, staged = {}, {}
+        for line in stdout.splitlines():
+            status, size, index, path = line.split("\t", 3)
+            if status == "ok":
+                staged[index] = path
+                results[path] = dict(size=int(size))
+            else:
+                results[path] = dict(size=int(size), skipped=status)
+        if not staged:
+            return results
+
+        try:
+            container = self.containers.get(container_name)
+            chunks, _ = container.get_archive(staging)
+            with tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MEMORY) as archive:
+                for chunk in chunks:
+                    archive.write(chunk)
+                archive.seek(0)
+                with tarfile.open(fileobj=archive) as tar:
+                    for member in tar:
+                        path = staged.get(os.path.basename(member.name))
+                        if path is None or not member.isfile():
+                            continue
+                        data = tar.extractfile(member).read()
+                        results[path].update(decode_text(data))
+        except docker.errors.APIError as e:
+            self.containers.invalidate(container_name)
             raise RuntimeError(f"Docker API error: {str(e)}")
+        finally:
+            try:
+                self.containers.get(container_name).exec_run(["rm", "-rf", staging])
+            except Exception as e:
+                logging.warning(f"Failed to remove {staging}: {e}")
+        return results
 
     def write_to_file(
         self,
         container_name: str,
         working_dir: str,
         file_path: str,
-        content: str
-    ) -> None:
+        content: Union[str, bytes]
+    ) -> tuple[int, str, str]:
         """
         Write content to a file in a running container.
         
         Args:
             container_name: Name or ID of the container
+            working_dir: Directory that relative `file_path`s are resolved against
             file_path: Path to the file in the container
             content: Content to write to the file
+
+        Returns:
+            Tuple of (exit_code, stdout, stderr)
+        """
+        return self.write_files(container_name, working_dir, {file_path: content})
+
+    @tracks_activity
+    def write_files(
+        self,
+        container_name: str,
+        working_dir: str,
+        files: Dict[str, Union[str, bytes]]
+    ) -> tuple[int, str, str]:
+        """
+        Write several files to a running container in one archive upload.
+        Missing parent directories are created.
+        
+        Args:
+            container_name: Name or ID of the container
+            working_dir: Directory that relative paths are resolved against
+            files: Path in the container -> content; str is encoded as UTF-8
+
+        Returns:
+            Tuple of (exit_code, stdout, stderr)
         """
         try:
-            container = self.client.containers.get(container_name)
-            
-            # Check if container is running
-            if container.status != "running":
-                raise RuntimeError(f"Container {container_name} is not running")
-            
-            docker_path = os.path.join(working_dir, file_path)
-            local_path = os.path.join("/tmp", file_path)
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            with open(local_path, "w") as f:
-                f.write(content)
-            
-            result = subprocess.run(
-                ["docker", "cp", local_path, f"{container_name}:{docker_path}"],
-                capture_output=True,
-                text=True
-            )
+            self._running_container(container_name)
 
-            if result.returncode != 0:
-                raise RuntimeError(f"Failed to copy file to container: {result.stderr}")
-            else:
-                return 0, "File copied succesfully", None
+            entries = {}
+            for file_path, content in files.items():
+                data = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+                entries[os.path.join(working_dir or "/", file_path)] = (io.BytesIO(data), len(data))
+            self._put_files(container_name, entries)
+
+            total = sum(size for _, size in entries.values())
+            return 0, f"Wrote {len(entries)} file(s), {total} bytes", ""
 
         except docker.errors.NotFound:
+            self.containers.invalidate(container_name)
             raise ValueError(f"Container {container_name} not found")
         except docker.errors.APIError as e:
-            raise RuntimeError(f"Docker API error: {str(e)}")
\ No newline at end of file
+            self.containers.invalidate(container_name)
+            raise RuntimeError(f"Docker API error: {str(e)}")
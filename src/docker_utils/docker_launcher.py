@@ -1,11 +1,18 @@
 import os
 import sys
 import time
+import json
+import hashlib
+import subprocess
+import threading
 import docker
 import argparse
 import os
 from typing import Optional, Dict, List
-from docker.errors import APIError, NotFound
+from docker.errors import APIError, BuildError, ContainerError, NotFound
+from docker.utils.build import exclude_paths
+
+from docker_utils.docker_client import get_docker_client
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -17,41 +24,134 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DEFAULT_WORKING_DIR = "/container/data"
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "data-map")
 AWS_PROFILE = os.getenv("DOCKER_AWS_PROFILE", "default")
 
+# Image label holding the digest of the build context the image was built from
+IMAGE_DIGEST_LABEL = "agent.context-digest"
+# Build with BuildKit through the docker CLI rather than the Engine API's classic builder. The
+# project Dockerfile uses BuildKit cache mounts, so only turn this off for other Dockerfiles
+DOCKER_BUILDKIT = os.getenv("DOCKER_BUILDKIT", "1") == "1"
+# Comma separated images the build may reuse layers from, e.g. a registry copy of devops-container
+DOCKER_BUILD_CACHE_FROM = [image for image in os.getenv("DOCKER_BUILD_CACHE_FROM", "").split(",") if image]
+
+# Seconds a launched container has to become ready
+CONTAINER_READY_TIMEOUT = float(os.getenv("CONTAINER_READY_TIMEOUT", "30"))
+# Command that must succeed in a started container before it counts as ready; empty skips the probe
+CONTAINER_READY_PROBE = os.getenv("CONTAINER_READY_PROBE", "aws --version && git --version")
+CONTAINER_PROBE_INTERVAL = 0.2
+
 
 class DockerEnvironmentManager:
     def __init__(self):
         try:
-            self.client = docker.from_env()
+            self.client = get_docker_client()
         except Exception as e:
             logger.error(f"Failed to initialize Docker client: {e}")
             sys.exit(2)
 
-    def build_image(self, dockerfile_path: str, requirements_path: str = None, tag: str = "devops-container"):
+    def build_image(
+            self,
+            dockerfile_path: str,
+            requirements_path: str = None,
+            tag: str = "devops-container",
+            force: bool = False,
+            cache_from: Optional[List[str]] = None) -> bool:
+        """
+        Builds the image unless one tagged `tag` was already built from the
+        same build context, as recorded in its IMAGE_DIGEST_LABEL label.
+
+        Build output is logged as it arrives. By default (DOCKER_BUILDKIT=1)
+        the build runs through the docker CLI so BuildKit features such as
+        cache mounts are available, and the image embeds its cache metadata so
+        it can serve as `cache_from` for builds on other hosts. With
+        DOCKER_BUILDKIT=0 it goes through the Engine API's classic builder.
+
+        Args:
+            dockerfile_path: Dockerfile; its directory is the build context
+            requirements_path: Passed as the REQUIREMENTS build arg
+            tag: Image tag
+            force: Build even if the image is up to date
+            cache_from: Images to reuse layers from, DOCKER_BUILD_CACHE_FROM by default
+
+        Returns:
+            True if the image was built, False if the existing one was kept
+        """
+        context_path = os.path.dirname(dockerfile_path)
+        dockerfile_rel = os.path.basename(dockerfile_path)
+        cache_from = DOCKER_BUILD_CACHE_FROM if cache_from is None else cache_from
+
+        build_args = {}
+        if requirements_path:
+            build_args["REQUIREMENTS"] = requirements_path
+
+        digest = build_context_digest(context_path, dockerfile_rel, build_args)
+        if not force:
+            try:
+                image = self.client.images.get(tag)
+                if image.labels.get(IMAGE_DIGEST_LABEL) == digest:
+                    logger.info(f"\n\n>>> Image {tag} is up to date ({digest[:12]}), skipping build")
+                    return False
+            except NotFound:
+                pass
+
+        logger.info(f"\n\n>>> Building Docker image from {dockerfile_path} ({digest[:12]})")
+        start_time = time.monotonic()
+        labels = {IMAGE_DIGEST_LABEL: digest}
         try:
-            logger.info(f"\n\n>>> Building Docker image from {dockerfile_path}")
-            context_path = os.path.dirname(dockerfile_path)
-            dockerfile_rel = os.path.basename(dockerfile_path)
-
-            build_args = {}
-            if requirements_path:
-                build_args["REQUIREMENTS"] = requirements_path
-
-            image, logs = self.client.images.build(
-                path=context_path,
-                dockerfile=dockerfile_rel,
-                tag=tag,
-                buildargs=build_args,
-                rm=True
-            )
-            for chunk in logs:
-                if 'stream' in chunk:
-                    logger.info(chunk['stream'].strip())
-            logger.info(f"Successfully built image: {tag}")
-        except APIError as e:
+            if DOCKER_BUILDKIT:
+                self._build_with_buildkit(context_path, dockerfile_path, tag, build_args, labels, cache_from)
+            else:
+                self._build_with_api(context_path, dockerfile_rel, tag, build_args, labels, cache_from)
+        except (APIError, BuildError, OSError) as e:
             logger.error(f"Docker build failed: {e}")
             sys.exit(3)
+        logger.info(f"Successfully built image: {tag} in {time.monotonic() - start_time:.1f}s")
+        return True
+
+    def _build_with_api(self, context_path, dockerfile_rel, tag, build_args, labels, cache_from):
+        # The low-level API streams the build log; images.build only returns it once the build is done
+        for chunk in self.client.api.build(
+            path=context_path,
+            dockerfile=dockerfile_rel,
+            tag=tag,
+            buildargs=build_args,
+            labels=labels,
+            cache_from=cache_from or None,
+            rm=True,
+            decode=True
+        ):
+            if "stream" in chunk:
+                line = chunk["stream"].strip()
+                if line:
+                    logger.info(line)
+            elif "status" in chunk:
+                logger.info(f"{chunk['status']} {chunk.get('progress', '')}".strip())
+            elif "error" in chunk:
+                raise BuildError(chunk["error"], [chunk])
+
+    def _build_with_buildkit(self, context_path, dockerfile_path, tag, build_args, labels, cache_from):
+        cmd = ["docker", "build", "--progress=plain", "-f", dockerfile_path, "-t", tag]
+        for key, value in build_args.items():
+            cmd += ["--build-arg", f"{key}={value}"]
+        cmd += ["--build-arg", "BUILDKIT_INLINE_CACHE=1"]
+        for key, value in labels.items():
+            cmd += ["--label", f"{key}={value}"]
+        for image in cache_from:
+            cmd += ["--cache-from", image]
+        cmd.append(context_path)
+
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=dict(os.environ, DOCKER_BUILDKIT="1")
+        )
+        for line in process.stdout:
+            logger.info(line.rstrip())
+        if process.wait() != 0:
+            raise BuildError(f"docker build exited with code {process.returncode}", [])
 
     def launch_container(
             self,
@@ -63,71 +163,205 @@ class DockerEnvironmentManager:
             use_github_credentials: bool = False, 
             image_tag: str = "devops-container"):
         try:
-            logger.info("\n\n>>> Launching Docker container...")
+            return self.run_container(
+                container_name=container_name,
+                environment=environment,
+                ports=ports,
+                volumes=volumes,
+                use_aws_credentials=use_aws_credentials,
+                use_github_credentials=use_github_credentials,
+                image_tag=image_tag
+            )
+        except TimeoutError as e:
+            logger.error(str(e))
+            sys.exit(4)
+        except (APIError, ContainerError) as e:
+            logger.error(f"Failed to launch container: {e}")
+            sys.exit(5)
+
+    def run_container(
+            self,
+            container_name: Optional[str] = None,
+            environment: Optional[Dict[str, str]] = None,
+            ports: Optional[Dict[str, str]] = None,
+            volumes: Optional[Dict[str, Dict[str, str]]] = None,
+            use_aws_credentials: bool = False,
+            use_github_credentials: bool = False,
+            image_tag: str = "devops-container",
+            labels: Optional[Dict[str, str]] = None,
+            cpus: Optional[float] = None,
+            mem_limit: Optional[str] = None,
+            ready_timeout: float = CONTAINER_READY_TIMEOUT,
+            ready_probe: Optional[str] = CONTAINER_READY_PROBE):
+        """
+        Starts a container, replacing any existing one with the same name, and
+        waits until it is ready. Unlike launch_container, errors are raised
+        rather than exiting the process, so it can be used from a long-running
+        service such as the container pool.
+
+        `cpus` (e.g. 1.5) and `mem_limit` (e.g. "2g") cap the container's
+        resources; by default it is unlimited.
 
-            # Clean up any existing container with same name
+        The container is ready once its start event arrives (and its image's
+        HEALTHCHECK reports healthy, if it has one) and `ready_probe`, a shell
+        command, succeeds in it.
+
+        Raises:
+            TimeoutError: The container was not ready within `ready_timeout` seconds
+            docker.errors.ContainerError: The container exited while starting
+            docker.errors.APIError: The daemon rejected a request
+        """
+        logger.info("\n\n>>> Launching Docker container...")
+
+        # Clean up any existing container with same name
+        if container_name:
             try:
                 old_container = self.client.containers.get(container_name)
                 logger.info(f"\n\n>>> Removing existing container: {container_name}")
-                old_container.stop()
-                old_container.remove()
+                # The image's shell ignores SIGTERM, so stopping it would wait out the full grace period
+                old_container.remove(force=True)
             except NotFound:
                 pass  # No existing container
 
-            env_vars = environment or {}
-            volumes = volumes or {}
+        env_vars = environment or {}
+        volumes = dict(volumes or {})
 
-            # Always mount Docker socket to control the daemon
-            docker_socket_path = "/var/run/docker.sock"
-            if os.path.exists(docker_socket_path):
-                volumes[docker_socket_path] = {"bind": "/var/run/docker.sock", "mode": "rw"}
-                logger.info("\n\n>>> Mounted Docker socket for daemon access.")
-            else:
-                logger.warning("\n\n>>> Docker socket not found. Container control will not be available.")
-
-            if use_aws_credentials:
-                aws_path = os.path.expanduser("~/.aws")
-                if os.path.exists(aws_path):
-                    volumes[aws_path] = {"bind": "/root/.aws", "mode": "rw"}
-                    logger.info("Mounted AWS credentials.")
-
-            if use_github_credentials:
-                gitconfig = os.path.expanduser("~/.gitconfig")
-                ssh_folder = os.path.expanduser("~/.ssh")
-                if os.path.exists(gitconfig):
-                    volumes[gitconfig] = {"bind": "/root/.gitconfig", "mode": "rw"}
-                if os.path.exists(ssh_folder):
-                    volumes[ssh_folder] = {"bind": "/root/.ssh", "mode": "rw"}
-                logger.info("Mounted GitHub credentials.")
-
-            logger.info(f"\n\n>>> Launching container {container_name}")
-            container = self.client.containers.run(
-                image_tag,
-                name=container_name,
-                environment=env_vars,
-                ports=ports,
-                volumes=volumes,
-                stdin_open=True,
-                tty=True,
-                detach=True,
-                privileged=True,
-            )
+        # Always mount Docker socket to control the daemon
+        docker_socket_path = "/var/run/docker.sock"
+        if os.path.exists(docker_socket_path):
+            volumes[docker_socket_path] = {"bind": "/var/run/docker.sock", "mode": "rw"}
+            logger.info("\n\n>>> Mounted Docker socket for daemon access.")
+        else:
+            logger.warning("\n\n>>> Docker socket not found. Container control will not be available.")
 
-            # Wait for container to be healthy or timeout
-            timeout = 30  # seconds
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                container.reload()
-                if container.status == "running":
-                    logger.info(f"Container {container_name} is running.")
-                    return container
-                time.sleep(1)
-            logger.error(f"Container {container_name} did not become healthy within {timeout} seconds.")
-            sys.exit(4)
+        if use_aws_credentials:
+            aws_path = os.path.expanduser("~/.aws")
+            if os.path.exists(aws_path):
+                volumes[aws_path] = {"bind": "/root/.aws", "mode": "rw"}
+                logger.info("Mounted AWS credentials.")
 
-        except APIError as e:
-            logger.error(f"Failed to launch container: {e}")
-            sys.exit(5)
+        if use_github_credentials:
+            gitconfig = os.path.expanduser("~/.gitconfig")
+            ssh_folder = os.path.expanduser("~/.ssh")
+            if os.path.exists(gitconfig):
+                volumes[gitconfig] = {"bind": "/root/.gitconfig", "mode": "rw"}
+            if os.path.exists(ssh_folder):
+                volumes[ssh_folder] = {"bind": "/root/.ssh", "mode": "rw"}
+            logger.info("Mounted GitHub credentials.")
+
+        logger.info(f"\n\n>>> Launching container {container_name}")
+        container = self.client.containers.create(
+            image_tag,
+            name=container_name,
+            environment=env_vars,
+            ports=ports,
+            volumes=volumes,
+            labels=labels or {},
+            nano_cpus=int(cpus * 1e9) if cpus else None,
+            mem_limit=mem_limit,
+            stdin_open=True,
+            tty=True,
+            privileged=True,
+        )
+        self._start_and_wait(container, image_tag, ready_timeout, ready_probe)
+        return container
+
+    def _start_and_wait(self, container, image_tag: str, timeout: float, probe: Optional[str]):
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+        healthcheck = bool(container.attrs.get("Config", {}).get("Healthcheck"))
+
+        # Subscribe before starting so the start event can't be missed; closing
+        # the stream from a timer ends the wait at the deadline
+        events = self.client.events(
+            decode=True,
+            filters={"container": container.id, "event": ["start", "die", "health_status"]}
+        )
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            events.close()
+
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+        ready = False
+        try:
+            container.start()
+            for event in events:
+                action = event.get("Action") or event.get("status", "")
+                if action == "die":
+                    exit_code = int(event.get("Actor", {}).get("Attributes", {}).get("exitCode", -1))
+                    raise ContainerError(container, exit_code, None, image_tag, container.logs().decode("utf-8", "replace"))
+                if action == "start":
+                    logger.info(f"Container {container.name} started in {time.monotonic() - start_time:.2f}s.")
+                    if not healthcheck:
+                        ready = True
+                        break
+                elif action == "health_status: healthy":
+                    ready = True
+                    break
+        except ContainerError:
+            raise
+        except Exception:
+            # Closing the stream under the reader can surface as a socket error
+            if not timed_out.is_set():
+                raise
+        finally:
+            timer.cancel()
+            events.close()
+        if not ready:
+            raise TimeoutError(f"Container {container.name} did not become healthy within {timeout} seconds.")
+
+        if probe:
+            while True:
+                exit_code, output = container.exec_run(["sh", "-c", probe])
+                if exit_code == 0:
+                    break
+                if time.monotonic() + CONTAINER_PROBE_INTERVAL > deadline:
+                    raise TimeoutError(
+                        f"Container {container.name} did not pass its readiness probe within {timeout} seconds: "
+                        f"{output.decode('utf-8', 'replace').strip()}"
+                    )
+                time.sleep(CONTAINER_PROBE_INTERVAL)
+
+        logger.info(f"Container {container.name} is ready in {time.monotonic() - start_time:.2f}s.")
+
+
+def build_context_digest(context_path: str, dockerfile: str = "Dockerfile", build_args: Optional[Dict[str, str]] = None) -> str:
+    """
+    Hashes everything a build depends on: the files Docker sends as the build
+    context (so .dockerignore applies), their modes, the Dockerfile name and
+    the build args. Touching a file without changing it keeps the digest.
+    """
+    patterns = []
+    dockerignore = os.path.join(context_path, ".dockerignore")
+    if os.path.exists(dockerignore):
+        with open(dockerignore) as f:
+            patterns = [line.strip() for line in f.read().splitlines() if line.strip() and not line.strip().startswith("#")]
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"dockerfile": dockerfile, "buildargs": build_args or {}}, sort_keys=True).encode("utf-8"))
+    for rel_path in sorted(exclude_paths(os.path.abspath(context_path), patterns, dockerfile=dockerfile)):
+        path = os.path.join(context_path, rel_path)
+        if os.path.isdir(path):
+            continue
+        digest.update(f"\0{rel_path}\0{os.stat(path).st_mode & 0o777:o}\0".encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def shared_folder_volumes(paths: List[str]) -> Dict[str, Dict[str, str]]:
+    """Mounts each existing host folder at /container/<folder name>."""
+    volumes = {}
+    for path in paths:
+        if path and os.path.exists(path):
+            volumes[path] = {"bind": f"/container/{os.path.basename(path)}", "mode": "rw"}
+        else:
+            logger.warning(f"Path {path} does not exist and will not be mounted.")
+    return volumes
 
 
 def main():
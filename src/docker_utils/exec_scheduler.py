@@ -0,0 +1,167 @@
+import os
+import asyncio
+import functools
+import threading
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+EXEC_POOL_SIZE = int(os.getenv("EXEC_POOL_SIZE", "16"))
+EXEC_MAX_PER_CONTAINER = int(os.getenv("EXEC_MAX_PER_CONTAINER", "8"))
+EXEC_MAX_PER_SESSION = int(os.getenv("EXEC_MAX_PER_SESSION", "2"))
+
+
+class _Job:
+    def __init__(self, session_id: str, container_name: str, fn: Callable, future: asyncio.Future):
+        self.session_id = session_id
+        self.container_name = container_name
+        self.fn = fn
+        self.future = future
+
+
+class ExecScheduler:
+    """
+    Runs blocking container calls on a bounded thread pool for async callers.
+
+    Jobs are queued per session and started round-robin across sessions, so a
+    session with a deep backlog cannot starve the others. A job only starts
+    while its session and its container are under their concurrency caps.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = EXEC_POOL_SIZE,
+        max_per_container: int = EXEC_MAX_PER_CONTAINER,
+        max_per_session: int = EXEC_MAX_PER_SESSION
+    ):
+        self.max_workers = max_workers
+        self.max_per_container = max_per_container
+        self.max_per_session = max_per_session
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docker-exec")
+        self._queues: dict[str, deque] = {}
+        self._order = deque()  # sessions with queued jobs, in round-robin order
+        self._running = 0
+        self._running_by_session = Counter()
+        self._running_by_container = Counter()
+        self.completed = 0
+        self.peak_queue_depth = 0
+
+    async def run(
+        self,
+        session_id: str,
+        container_name: str,
+        fn: Callable,
+        *args,
+        on_cancel: Optional[Callable[[], None]] = None,
+        **kwargs
+    ):
+        """
+        Queues `fn(*args, **kwargs)` for `session_id` against `container_name`
+        and waits for its result.
+
+        If the caller is cancelled, a queued job is dropped; a running job
+        cannot be interrupted from here, so `on_cancel` is called for `fn` to
+        stop itself (e.g. by setting an event it watches).
+        """
+        loop = asyncio.get_running_loop()
+        job = _Job(session_id, container_name, functools.partial(fn, *args, **kwargs), loop.create_future())
+        queue = self._queues.get(session_id)
+        if queue is None:
+            queue = self._queues[session_id] = deque()
+            self._order.append(session_id)
+        queue.append(job)
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth())
+        self._dispatch()
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self._discard(job)
+            if on_cancel is not None:
+                on_cancel()
+            raise
+
+    def _discard(self, job: _Job):
+        queue = self._queues.get(job.session_id)
+        if queue is not None and job in queue:
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.session_id]
+                self._order.remove(job.session_id)
+
+    def _dispatch(self):
+        while self._running < self.max_workers:
+            for _ in range(len(self._order)):
+                session_id = self._order[0]
+                self._order.rotate(-1)
+                if self._running_by_session[session_id] >= self.max_per_session:
+                    continue
+                queue = self._queues[session_id]
+                job = queue[0]
+                if self._running_by_container[job.container_name] >= self.max_per_container:
+                    continue
+                queue.popleft()
+                if not queue:
+                    del self._queues[session_id]
+                    self._order.remove(session_id)
+                self._start(job)
+                break
+            else:
+                return
+
+    def _start(self, job: _Job):
+        self._running += 1
+        self._running_by_session[job.session_id] += 1
+        self._running_by_container[job.container_name] += 1
+        loop = job.future.get_loop()
+        loop.run_in_executor(self._pool, job.fn).add_done_callback(
+            functools.partial(self._finish, job)
+        )
+
+    def _finish(self, job: _Job, result: asyncio.Future):
+        self._running -= 1
+        self._release(self._running_by_session, job.session_id)
+        self._release(self._running_by_container, job.container_name)
+        self.completed += 1
+        if not job.future.done():
+            if result.exception() is not None:
+                job.future.set_exception(result.exception())
+            else:
+                job.future.set_result(result.result())
+        self._dispatch()
+
+    @staticmethod
+    def _release(counter: Counter, key: str):
+        # Drop keys at zero so sessions and containers seen once don't pile up
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def queue_depth(self, session_id: Optional[str] = None) -> int:
+        if session_id is not None:
+            return len(self._queues.get(session_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        return dict(
+            queued=self.queue_depth(),
+            queued_by_session={s: len(q) for s, q in self._queues.items()},
+            peak_queue_depth=self.peak_queue_depth,
+            running=self._running,
+            running_by_container=dict(self._running_by_container),
+            completed=self.completed
+        )
+
+
+_scheduler: ExecScheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_exec_scheduler() -> ExecScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ExecScheduler()
+    return _scheduler
@@ -0,0 +1,221 @@
+import os
+import time
+import uuid
+import codecs
+import shlex
+import weakref
+import threading
+from typing import Optional, Dict, Callable, List, Tuple
+
+import docker
+from docker.utils.socket import frames_iter, STDOUT
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds a shell may sit unused before it is closed
+SHELL_IDLE_TTL = float(os.getenv("SHELL_IDLE_TTL", "600"))
+SHELL_REAP_INTERVAL = 30
+
+CD_FAILED = "cd-failed"
+
+SHELL_COMMAND = "if command -v bash >/dev/null; then exec bash --noprofile --norc; else exec sh; fi"
+
+
+class ShellSession:
+    """
+    A long-lived shell in a container, driven over the exec socket.
+
+    Each command is sent to the shell's stdin followed by a marker written to
+    stdout (with the exit code) and to stderr. Output up to the markers belongs
+    to the command, so `cd`, exported variables, activated virtualenvs and shell
+    functions carry over from one command to the next.
+
+    Commands run one at a time; `lock` is held while one is running.
+    """
+
+    def __init__(
+        self,
+        api: docker.APIClient,
+        container_id: str,
+        cmd: List[str],
+        environment: Optional[Dict[str, str]] = None,
+        pid_file: Optional[str] = None
+    ):
+        """
+        Args:
+            api: Low-level Docker API client
+            container_id: Container to start the shell in
+            cmd: Exec command that starts the shell, e.g. ["bash"]
+            environment: Environment variables for the shell
+            pid_file: Where `cmd` records the shell's process group id, if it does
+        """
+        self.api = api
+        self.pid_file = pid_file
+        self.started_at = None  # StartedAt of the container the shell runs in, set by the owner
+        self.working_dir = None  # last directory applied with cd
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.closed = False
+        self._close_pending = False  # close once the running command finishes
+        self.exec_id = api.exec_create(
+            container_id,
+            cmd,
+            stdin=True,
+            environment=environment
+        )["Id"]
+        self._socket = api.exec_start(self.exec_id, socket=True)
+        self._raw = getattr(self._socket, "_sock", self._socket)
+        self._frames = frames_iter(self._raw, tty=False)
+        _live_shells.add(self)
+        _start_reaper()
+
+    def run(self, command: str, working_dir: Optional[str], on_output: Callable[[str, str], None]) -> int:
+        """
+        Runs `command` in the shell, passing ("stdout" | "stderr", text) chunks
+        to `on_output`, and returns its exit code. If the shell ends first
+        (e.g. the command ran `exit`), the shell's exit code is returned and
+        the session is closed.
+
+        `working_dir` is applied with cd when it differs from the last one
+        applied, so a `cd` inside a command otherwise persists. If the cd
+        fails, the command is not run and the exit code is 1.
+        """
+        marker = f"__agent_done_{uuid.uuid4().hex}__"
+        # eval keeps a syntax error in the command from ending the shell; stdin
+        # is the control channel, so the command must not read from it
+        script = (
+            f"eval {shlex.quote(command)} < /dev/null\n"
+            f"printf '%s %d\\n' {marker} $?\n"
+        )
+        change_dir = working_dir and working_dir != self.working_dir
+        if change_dir:
+            script = (
+                f"if cd {shlex.quote(working_dir)}; then\n"
+                f"{script}"
+                f"else\n"
+                f"printf '%s %d %s\\n' {marker} 1 {CD_FAILED}\n"
+                f"fi\n"
+            )
+        script += f"printf '%s\\n' {marker} >&2\n"
+        self.last_used = time.monotonic()
+        try:
+            self._raw.sendall(script.encode("utf-8"))
+            exit_code, flags = self._read_until(marker.encode("utf-8"), on_output)
+        finally:
+            self.last_used = time.monotonic()
+        if change_dir and CD_FAILED not in flags:
+            self.working_dir = working_dir
+        return exit_code
+
+    def _read_until(self, marker: bytes, on_output: Callable[[str, str], None]) -> Tuple[int, List[str]]:
+        """Returns the exit code and any flags written after it on the stdout marker line."""
+        names = {STDOUT: "stdout"}
+        pending = {"stdout": bytearray(), "stderr": bytearray()}
+        decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in pending}
+        finished = {}
+        exit_code = None
+        flags = []
+
+        def emit(name, data, final=False):
+            text = decoders[name].decode(bytes(data), final=final)
+            if text:
+                on_output(name, text)
+
+        for stream, data in self._frames:
+            name = names.get(stream, "stderr")
+            if name in finished:
+                continue
+            buffer = pending[name]
+            buffer += data
+            index = buffer.find(marker)
+            if index < 0:
+                # Hold back what could be the start of a marker split across frames
+                safe = len(buffer) - len(marker) + 1
+                if safe > 0:
+                    emit(name, buffer[:safe])
+                    del buffer[:safe]
+                continue
+            rest = buffer[index + len(marker):]
+            if b"\n" not in rest:
+                continue
+            emit(name, buffer[:index], final=True)
+            finished[name] = True
+            if name == "stdout":
+                status = rest.split(b"\n", 1)[0].decode("utf-8").split()
+                exit_code, flags = int(status[0]), status[1:]
+            if len(finished) == 2:
+                return exit_code, flags
+
+        # The shell is gone; pass on whatever it wrote before exiting
+        for name, buffer in pending.items():
+            if name not in finished:
+                emit(name, buffer, final=True)
+        self.close()
+        # The exit code is recorded shortly after the stream ends
+        for _ in range(20):
+            result = self.api.exec_inspect(self.exec_id)
+            if not result.get("Running"):
+                break
+            time.sleep(0.05)
+        return result["ExitCode"], flags
+
+    def close_when_idle(self):
+        """Closes the shell now, or once the running command finishes if one is running."""
+        self._close_pending = True
+        self._close_if_pending()
+
+    def release(self):
+        """Releases `lock` after a command, closing the shell if close_when_idle() was called."""
+        self.lock.release()
+        self._close_if_pending()
+
+    def _close_if_pending(self):
+        # Whoever holds the lock next checks again after releasing it
+        if self._close_pending and self.lock.acquire(blocking=False):
+            try:
+                self.close()
+            finally:
+                self.lock.release()
+
+    def close(self):
+        """Ends the shell by closing its stdin."""
+        if self.closed:
+            return
+        self.closed = True
+        _live_shells.discard(self)
+        try:
+            self._raw.close()
+            self._socket.close()
+        except Exception as e:
+            logger.warning(f"Error closing shell {self.exec_id}: {e}")
+
+
+_live_shells = weakref.WeakSet()
+_reaper_started = False
+_reaper_lock = threading.Lock()
+
+def _start_reaper():
+    """Starts the daemon thread that closes shells idle for SHELL_IDLE_TTL."""
+    global _reaper_started
+    with _reaper_lock:
+        if _reaper_started:
+            return
+        _reaper_started = True
+
+    def reap():
+        while True:
+            time.sleep(SHELL_REAP_INTERVAL)
+            now = time.monotonic()
+            for shell in list(_live_shells):
+                if now - shell.last_used < SHELL_IDLE_TTL:
+                    continue
+                # A busy shell is not idle, however long its command has been running
+                if shell.lock.acquire(blocking=False):
+                    try:
+                        logger.info(f">>> Closing shell idle for {now - shell.last_used:.0f}s")
+                        shell.close()
+                    finally:
+                        shell.lock.release()
+
+    threading.Thread(target=reap, name="shell-reaper", daemon=True).start()
@@ -5,7 +5,7 @@ import argparse
 
 from dotenv import load_dotenv
 
-from docker_utils.docker_launcher import DockerEnvironmentManager
+from docker_utils.docker_launcher import DockerEnvironmentManager, shared_folder_volumes, DATA_FOLDER
 
 
 # Setup logging
@@ -19,22 +19,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the DevOps Docker Manager")
     parser.add_argument('--shared-folder', action='append', help='Folders to mount into the container', default=[])
     parser.add_argument('--ports', type=str, nargs='*', help='Port mappings in the format host:container')
+    parser.add_argument('--rebuild', action='store_true', help='Build the image even if its build context is unchanged')
+    parser.add_argument('--cache-from', action='append', help='Images the build may reuse layers from', default=None)
     args = parser.parse_args()
 
     src_path = os.path.join(os.path.dirname(__file__), "..", "src")
     if src_path not in sys.path:
         sys.path.insert(0, src_path)
 
-    data_folder = os.path.join(os.path.dirname(__file__), "..", "data-map")
+    volume_paths = [DATA_FOLDER] + args.shared_folder
 
-    volume_paths = [data_folder] + args.shared_folder
-
-    volumes = {}
-    for path in volume_paths:
-        if os.path.exists(path):
-            volumes[path] = {"bind": f"/container/{os.path.basename(path)}", "mode": "rw"}
-        else:
-            logger.warning(f"Path {path} does not exist and will not be mounted.")
+    volumes = shared_folder_volumes(volume_paths)
 
     if not volumes:
         logger.error("No valid volumes to mount. Exiting.")
@@ -61,7 +56,9 @@ if __name__ == "__main__":
     launcher = DockerEnvironmentManager()
     launcher.build_image(
         dockerfile_path=os.path.join(os.path.dirname(__file__), "Dockerfile"),
-        requirements_path=os.path.join(os.path.dirname(__file__), "requirements.txt")
+        requirements_path=os.path.join(os.path.dirname(__file__), "requirements.txt"),
+        force=args.rebuild,
+        cache_from=args.cache_from
     )
 
     env_vars = {
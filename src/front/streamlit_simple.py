@@ -1,5 +1,4 @@
 import os, sys
-import asyncio
 import streamlit as st
 
 from dotenv import load_dotenv
@@ -13,7 +12,8 @@ if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
 from agent.main import MainAgent
-from agent.session_memory import get_session_memory
+from agent.session_memory import get_session_memory, ensure_indexes, watch_environment_changes
+from agent.llm_provider import run_sync
 
 CONVERSATION_LENGTH=50
 
@@ -50,36 +50,41 @@ class StreamlitApp:
         logging.info(f">>> loading session: {session_id}")
         self.state.session_id = session_id
         self.mem = st.session_state.memory = get_session_memory(self.state.session_id)
-        self.state.messages = self.clean_messages(self.mem.get_messages())
+        self.state.messages = self.clean_messages(self.mem.get_messages(limit=CONVERSATION_LENGTH))
         self.agent = MainAgent(self.mem)
 
+    def load_older_messages(self):
+        before_seq = self.state.messages[0]["seq"] if self.state.messages else None
+        older = self.mem.get_messages(limit=CONVERSATION_LENGTH, before_seq=before_seq)
+        self.state.messages = self.clean_messages(older) + self.state.messages
+
     def clean_messages(self, messages):
-        return [dict(role=msg["role"], content=msg["content"]) for msg in messages]
+        return [dict(role=msg["role"], content=msg["content"], seq=msg.get("seq")) for msg in messages]
 
     def handle_submit(self):
         if self.state.user_input.strip():
             user_input = self.state.user_input
-            self.state.messages.append(dict(role="user", content=user_input))
+            self.state.messages.append(dict(role="user", content=user_input, seq=None))
+            window = [dict(role=msg["role"], content=msg["content"]) for msg in self.state.messages[-CONVERSATION_LENGTH:]]
 
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # Now run your async function
-            response = loop.run_until_complete(self.agent.generate_response(self.state.messages[-CONVERSATION_LENGTH:]))
-            
-            # Clean up
-            loop.close()
+            # Run on the shared loop so pooled MCP sessions survive between turns
+            response = run_sync(self.agent.generate_response(window))
 
             # Append the response to the messages
-            self.state.messages.append(dict(role="assistant", content=response))
+            self.state.messages.append(dict(role="assistant", content=response, seq=None))
 
-            self.mem.add_message("user", user_input)
-            self.mem.add_message("assistant", response)
+            user_seq, response_seq = self.mem.add_messages([("user", user_input), ("assistant", response)])
+            self.state.messages[-2]["seq"] = user_seq
+            self.state.messages[-1]["seq"] = response_seq
+            # End of turn: send any buffered session memory writes
+            self.mem.flush()
             
             # Clear the input after processing
             self.state.user_input = ""
 
     def run(self):
+        snapshot = self.mem.get_snapshot()
+
         col1, col2 = st.columns(2)
         with col1:
             st.title("CREO-CORTEX")
@@ -91,8 +96,8 @@ class StreamlitApp:
                     self.load_session(new_session_id)
                     st.rerun()
             
-            if st.button(f"toggle boost: {self.mem.get_boost_state()}"):
-                self.mem.set_boost_state(not self.mem.get_boost_state())
+            if st.button(f"toggle boost: {snapshot['boost_state']}"):
+                self.mem.set_boost_state(not snapshot["boost_state"])
                 st.rerun()
             # st.write(self.agent.llmprovider.get_model_name())
 
@@ -108,8 +113,11 @@ class StreamlitApp:
             
             if st.button("Submit"):
                 self.handle_submit()
+                snapshot = self.mem.get_snapshot()
 
             with st.popover("all chat history"):
+                if st.button("load older messages"):
+                    self.load_older_messages()
                 for msg in self.state.messages:
                     role = msg.get("role", "system")
                     prefix = "🐒 *user*: " if role == "user" else "⭐ agent: "
@@ -123,29 +131,31 @@ class StreamlitApp:
 
         with col2:
             st.subheader("Goal")
-            st.markdown(self.mem.get_goal())
+            st.markdown(snapshot["goal"])
 
             st.subheader("Tasks")
-            for task in self.mem.get_tasks():
+            for task in snapshot["tasks"]:
                 st.markdown(f"{task['sort_order']}) [{task['status']}] {task['task']}\n{task.get('result', '')}")
 
             st.subheader("Working Directory")
-            if new_working_dir := st.text_input("path", self.mem.get_working_dir()):
-                if new_working_dir != self.mem.get_working_dir():
+            if new_working_dir := st.text_input("path", snapshot["working_dir"]):
+                if new_working_dir != snapshot["working_dir"]:
                     self.mem.set_working_dir(new_working_dir)
                     st.rerun()
 
             st.subheader("Open Files")
-            for file in self.mem.get_open_files():
+            for file in snapshot["open_files"]:
                 st.markdown(f"File: {file['file_path']}")
 
             st.subheader("Notes")
-            for note in self.mem.get_notes():
+            for note in snapshot["notes"]:
                 st.markdown(f"(note id: {note['_id']})\n{note['note']}")
 
 
 if __name__ == '__main__':
     if 'app' not in st.session_state:
         logging.info("\n\n>> Creating new app\n\n")
+        ensure_indexes()
+        watch_environment_changes()
         st.session_state.app = StreamlitApp()
     st.session_state.app.run()
\ No newline at end of file
@@ -1,8 +1,17 @@
 import os
+import time
+import asyncio
+import functools
+import threading
 
 from mcp.server.fastmcp import FastMCP, Context
 
 from agent.actor import get_actor, Actor
+from agent.session_memory import ensure_indexes, watch_environment_changes
+from docker_utils.exec_scheduler import get_exec_scheduler
+from docker_utils.docker_executor import CommandTimeoutError
+from docker_utils.container_pool import get_execution_container, get_container_pool
+from agent.tools import format_read_results
 
 from logging import getLogger, INFO
 logger = getLogger(__name__)
@@ -12,6 +21,60 @@ mcp = FastMCP()
 
 DEFAULT_CONTAINER_NAME = "agent-execution-container"
 
+OUTPUT_RELAY_INTERVAL = float(os.getenv("OUTPUT_RELAY_INTERVAL", "0.5"))
+
+# Bytes kept from the start and from the end of each output stream, per tool
+TOOL_SHELL_OUTPUT_LIMIT = int(os.getenv("TOOL_SHELL_OUTPUT_LIMIT", "16384"))
+TOOL_AWS_CLI_OUTPUT_LIMIT = int(os.getenv("TOOL_AWS_CLI_OUTPUT_LIMIT", "16384"))
+# Run tool_shell commands in a persistent per-session shell instead of a fresh exec each
+TOOL_SHELL_PERSISTENT = os.getenv("TOOL_SHELL_PERSISTENT", "true").lower() in ("1", "true", "yes")
+
+
+async def get_container_name(session_id: str) -> str:
+    """The session's execution container; leasing one may start it, so this runs off the event loop."""
+    return await asyncio.to_thread(get_execution_container, session_id, DEFAULT_CONTAINER_NAME)
+
+
+class OutputRelay:
+    """
+    Forwards command output from the worker thread running the command to the
+    MCP client, batched to at most one message per OUTPUT_RELAY_INTERVAL.
+    """
+
+    def __init__(self, ctx: Context, loop: asyncio.AbstractEventLoop):
+        self.ctx = ctx
+        self.loop = loop
+        self.total_bytes = 0
+        self._buffer = []
+        self._last_sent = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, text: str):
+        with self._lock:
+            self._buffer.append(text)
+            self.total_bytes += len(text)
+            if time.monotonic() - self._last_sent < OUTPUT_RELAY_INTERVAL:
+                return
+            text, total = self._take()
+        asyncio.run_coroutine_threadsafe(self._send(text, total), self.loop)
+
+    def _take(self):
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._last_sent = time.monotonic()
+        return text, self.total_bytes
+
+    async def _send(self, text: str, total: int):
+        await self.ctx.info(text)
+        await self.ctx.report_progress(total)
+
+    async def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            text, total = self._take()
+        await self._send(text, total)
+
 
 @mcp.tool()
 async def tool_set_working_dir(ctx: Context, session_id: str, working_dir: str) -> str:
@@ -23,14 +86,15 @@ async def tool_set_working_dir(ctx: Context, session_id: str, working_dir: str)
     await ctx.info(f"Working directory: {working_dir}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.set_working_dir(working_dir)
+    await actor.async_memory.set_working_dir(working_dir)
     return f"Working directory set to {working_dir}"
 
 
 @mcp.tool()
-async def tool_aws_cli(ctx: Context, session_id: str, aws_command: str) -> str:
+async def tool_aws_cli(ctx: Context, session_id: str, aws_command: str, timeout_seconds: float = None) -> str:
     """
     Runs an AWS CLI command and returns the output.
+    `timeout_seconds` optionally limits how long the command may run.
     """
     await ctx.info(">> TOOL: tool_aws_cli")
     await ctx.info(f"Command: {aws_command}")
@@ -41,43 +105,73 @@ async def tool_aws_cli(ctx: Context, session_id: str, aws_command: str) -> str:
             command = aws_command
         else:
             command = f"aws {aws_command}"
-        exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
-            working_dir=actor.memory.get_working_dir(),
+        container_name = await get_container_name(session_id)
+        cancel_event = threading.Event()
+        exit_code, stdout, stderr = await get_exec_scheduler().run(
+            session_id, container_name, actor.executor.execute_command,
+            on_cancel=cancel_event.set,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
             command=command,
+            output_limit=TOOL_AWS_CLI_OUTPUT_LIMIT,
+            timeout=timeout_seconds,
+            cancel_event=cancel_event,
         )
         if exit_code != 0:
             raise RuntimeError(f"AWS CLI command failed with exit code {exit_code}: {stderr}\n{stdout}")
         
         return str(stdout)
+    except CommandTimeoutError as e:
+        await ctx.error(f"AWS CLI command {e}")
+        return f"AWS CLI command {e}. Partial output:\n{e.stderr}\n{e.stdout}"
     except Exception as e:
         await ctx.error(f"Error running AWS CLI command: {str(e)}")
         return f"Error running AWS CLI command: {str(e)}"
 
 
 @mcp.tool()
-async def tool_shell(ctx: Context, session_id: str, cmd_string: str) -> str:
+async def tool_shell(ctx: Context, session_id: str, cmd_string: str, timeout_seconds: float = None) -> str:
     """
     Runs a shell command and returns the output.
     Accepts a string of arguments to pass to the shell.
+    The shell persists between calls: `cd`, exported variables and activated virtualenvs carry over.
+    `timeout_seconds` optionally limits how long the command may run.
     """
     await ctx.info(">> TOOL: Running shell command")
     await ctx.info(f"Command: {cmd_string}")
 
     try:    
         actor: Actor = get_actor(session_id)
-        exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
-            working_dir=actor.memory.get_working_dir(),
+        container_name = await get_container_name(session_id)
+        relay = OutputRelay(ctx, asyncio.get_running_loop())
+        cancel_event = threading.Event()
+        if TOOL_SHELL_PERSISTENT:
+            execute = functools.partial(actor.executor.run_in_shell, session_id)
+        else:
+            execute = actor.executor.execute_command
+        exit_code, stdout, stderr = await get_exec_scheduler().run(
+            session_id, container_name, execute,
+            on_cancel=cancel_event.set,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
             command=f"{cmd_string}",
+            on_output=relay,
+            output_limit=TOOL_SHELL_OUTPUT_LIMIT,
+            timeout=timeout_seconds,
+            cancel_event=cancel_event,
         )
+        await relay.flush()
         if exit_code != 0:
             raise RuntimeError(f"shell command failed with exit code {exit_code}: {stderr}\n{stdout}")
         
         return str(stdout)
+    except CommandTimeoutError as e:
+        await relay.flush()
+        await ctx.error(f"shell command {e}")
+        return f"Shell command {e}. Partial output:\n{e.stderr}\n{e.stdout}"
     except Exception as e:
         await ctx.error(f"Error running shell command: {str(e)}")
-        await ctx.error(f"working_dir={actor.memory.get_working_dir()}")
+        await ctx.error(f"working_dir={await actor.async_memory.get_working_dir()}")
         return f"Error running shell command: {str(e)}"
 
 
@@ -91,7 +185,7 @@ async def tool_save_note(ctx: Context, session_id: str, note_text: str) -> str:
     await ctx.info(f"Note: {note_text}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.add_note(note_text)
+    await actor.async_memory.add_note(note_text)
     return f"Note saved to state memory successfully."
 
 
@@ -104,7 +198,7 @@ async def tool_remove_note(ctx: Context, session_id: str, note_id: str) -> str:
     await ctx.info(f"Note ID: {note_id}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.remove_note(note_id)
+    await actor.async_memory.remove_note(note_id)
     return f"Note removed from state memory successfully."
 
 
@@ -120,7 +214,7 @@ async def tool_set_goal(ctx: Context, session_id: str, goal: str) -> str:
     await ctx.info(f"Goal: {goal}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.set_goal(goal)
+    await actor.async_memory.set_goal(goal)
     return f"Goal set to {goal}"
 
 
@@ -133,10 +227,38 @@ async def tool_add_task(ctx: Context, session_id: str, task: str, sort_order: fl
     await ctx.info(f"Task: {task}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.add_task(task, sort_order)
+    await actor.async_memory.add_task(task, sort_order)
     return f"Task added successfully."
 
 
+@mcp.tool()
+async def tool_add_tasks(ctx: Context, session_id: str, tasks: list[str]) -> str:
+    """
+    Adds several tasks to the end of the task list, in the given order.
+    Use this to lay out a plan in one call.
+    """
+    await ctx.info(">> TOOL: Adding tasks")
+    await ctx.info(f"Tasks: {tasks}")
+
+    actor: Actor = get_actor(session_id)
+    await actor.async_memory.add_tasks(tasks)
+    return f"{len(tasks)} tasks added successfully."
+
+
+@mcp.tool()
+async def tool_reorder_tasks(ctx: Context, session_id: str, sort_orders: dict[str, float]) -> str:
+    """
+    Changes the order of several tasks at once.
+    `sort_orders` maps each task id to its new sort order.
+    """
+    await ctx.info(">> TOOL: Reordering tasks")
+    await ctx.info(f"Sort orders: {sort_orders}")
+
+    actor: Actor = get_actor(session_id)
+    await actor.async_memory.reorder_tasks(sort_orders)
+    return f"{len(sort_orders)} tasks reordered successfully."
+
+
 @mcp.tool()
 async def tool_set_task_status(ctx: Context, session_id: str, task_id: str, status: str) -> str:
     """
@@ -147,7 +269,7 @@ async def tool_set_task_status(ctx: Context, session_id: str, task_id: str, stat
     await ctx.info(f"Status: {status}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.set_task_status(task_id, status)
+    await actor.async_memory.set_task_status(task_id, status)
     return f"Task status set to {status} for task {task_id}"
 
 
@@ -164,7 +286,7 @@ async def tool_close_task(ctx: Context, session_id: str, task_id: str, status: s
     await ctx.info(f"Result: {result}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.update_task(task_id, status, result)
+    await actor.async_memory.update_task(task_id, status, result)
     return f"Task closed with status {status} and result saved as a note."
 
 
@@ -176,7 +298,7 @@ async def tool_clear_tasks(ctx: Context, session_id: str) -> str:
     await ctx.info(">> TOOL: Clearing tasks")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.clear_tasks()
+    await actor.async_memory.clear_tasks()
     return f"Tasks cleared successfully."
 
 
@@ -191,16 +313,18 @@ async def tool_open_file(ctx: Context, session_id: str, file_path: str) -> str:
 
     try:
         actor: Actor = get_actor(session_id)
-        exit_code, stdout, stderr = actor.executor.execute_command(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
-            working_dir=actor.memory.get_working_dir(),
+        container_name = await get_container_name(session_id)
+        exit_code, stdout, stderr = await get_exec_scheduler().run(
+            session_id, container_name, actor.executor.execute_command,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
             command=f"cat {file_path}",
         )
         if exit_code != 0:
             raise RuntimeError(f"Error opening file: {stderr}\n{stdout}")
         
         data = stdout
-        actor.memory.set_open_file(file_path)
+        await actor.async_memory.set_open_file(file_path)
         return f"{file_path} opened successfully:\n{data}"
     except Exception as e:
         await ctx.error(f"Error opening file: {str(e)}")
@@ -216,7 +340,7 @@ async def tool_close_file(ctx: Context, session_id: str, file_path: str) -> str:
     await ctx.info(f"File path: {file_path}")
 
     actor: Actor = get_actor(session_id)
-    actor.memory.remove_open_file(file_path)
+    await actor.async_memory.remove_open_file(file_path)
     return f"File closed successfully."
 
 
@@ -233,9 +357,11 @@ async def tool_write_file(ctx: Context, session_id: str, file_path: str, file_da
     try:
         actor: Actor = get_actor(session_id)
         
-        exit_code, stdout, stderr = actor.executor.write_to_file(
-            container_name=os.getenv("EXECUTION_CONTAINER_NAME", DEFAULT_CONTAINER_NAME),
-            working_dir=actor.memory.get_working_dir(),
+        container_name = await get_container_name(session_id)
+        exit_code, stdout, stderr = await get_exec_scheduler().run(
+            session_id, container_name, actor.executor.write_to_file,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
             file_path=file_path,
             content=file_data
         )
@@ -250,7 +376,69 @@ async def tool_write_file(ctx: Context, session_id: str, file_path: str, file_da
         return f"Error writing file: {str(e)}"
 
 
+
+@mcp.tool()
+async def tool_write_files(ctx: Context, session_id: str, files: dict[str, str]) -> str:
+    """
+    Writes several files at once. Use this instead of repeated tool_write_file calls when creating or updating multiple files.
+    `files` maps each path, relative to the working directory, to the full file contents.
+    """
+    await ctx.info(">> TOOL: Writing files")
+    await ctx.info(f"File paths: {list(files)}")
+
+    try:
+        actor: Actor = get_actor(session_id)
+
+        container_name = await get_container_name(session_id)
+        exit_code, stdout, stderr = await get_exec_scheduler().run(
+            session_id, container_name, actor.executor.write_files,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
+            files=files
+        )
+        if exit_code != 0:
+            raise RuntimeError(f"Error writing files: {stderr}\n{stdout}")
+
+        return f"{len(files)} files written successfully."
+
+    except Exception as e:
+        await ctx.error(f"Error writing files: {str(e)}")
+        return f"Error writing files: {str(e)}"
+
+
+
+@mcp.tool()
+async def tool_read_files(ctx: Context, session_id: str, paths: list[str]) -> dict[str, str]:
+    """
+    Reads several files at once and returns their contents keyed by path.
+    Use this instead of repeated tool_open_file calls to look at a group of files, e.g. a whole module.
+    `paths` are file paths or glob patterns (e.g. `src/*.py`), relative to the working directory.
+    Binary files and files over the size limits are listed with the reason they were skipped.
+    The files are not added to the open files.
+    """
+    await ctx.info(">> TOOL: Reading files")
+    await ctx.info(f"Paths: {paths}")
+
+    try:
+        actor: Actor = get_actor(session_id)
+        container_name = await get_container_name(session_id)
+        results = await get_exec_scheduler().run(
+            session_id, container_name, actor.executor.read_files,
+            container_name=container_name,
+            working_dir=await actor.async_memory.get_working_dir(),
+            paths=paths
+        )
+        return format_read_results(results)
+    except Exception as e:
+        await ctx.error(f"Error reading files: {str(e)}")
+        return {"error": f"Error reading files: {str(e)}"}
+
+
 if __name__ == "__main__":
     print("\n\n>>> Starting FastMCP server...")
+    ensure_indexes()
+    watch_environment_changes()
+    # Start warming execution containers before the first session asks for one
+    get_container_pool()
     mcp.settings.port = 8080
     mcp.run(transport="sse")
\ No newline at end of file
@@ -0,0 +1,55 @@
+import mongomock
+import pytest
+
+import agent.actor as actor_module
+import agent.session_memory as session_memory_module
+from agent.registry import Registry
+from agent.session_memory import set_mongo_client
+
+
+class FakeExecutor:
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def registries(monkeypatch):
+    set_mongo_client(mongomock.MongoClient())
+    monkeypatch.setattr(actor_module, "DockerCommandExecutor", FakeExecutor)
+    memories = Registry(session_memory_module.SessionMemory, max_size=1, on_evict=session_memory_module.SessionMemory.close)
+    monkeypatch.setattr(session_memory_module, "_session_memory", memories)
+    monkeypatch.setattr(actor_module, "_actor", Registry(
+        lambda session_id: actor_module.Actor(session_memory_module.get_session_memory(session_id)),
+        max_size=4,
+        on_evict=actor_module.Actor.close
+    ))
+    yield memories
+    set_mongo_client(None)
+
+
+def test_actor_keeps_its_session_memory_registered(registries):
+    actor = actor_module.get_actor("a")
+    memory = actor.memory
+    actor_module.get_actor("b")
+    assert registries.peek("a") is None
+
+    # Using the actor again registers a memory for the session and switches to it
+    actor = actor_module.get_actor("a")
+    assert registries.peek("a") is actor.memory
+    assert actor.async_memory.memory is actor.memory
+    assert session_memory_module.get_session_memory("a") is actor.memory
+    assert actor.memory is not memory
+
+
+def test_actor_use_refreshes_session_memory(registries, monkeypatch):
+    import agent.registry as registry_module
+    now = [1000.0]
+    monkeypatch.setattr(registry_module.time, "monotonic", lambda: now[0])
+    registries.idle_ttl = 60
+
+    actor = actor_module.get_actor("a")
+    memory = actor.memory
+    for _ in range(3):
+        now[0] += 40
+        assert actor_module.get_actor("a").memory is memory
+    assert registries.peek("a") is memory
@@ -0,0 +1,51 @@
+import os
+
+from agent.file_cache import OpenFileCache
+
+
+def touch(path, seconds=1):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+def test_file_only_reread_when_stat_changes(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("one\n")
+    cache = OpenFileCache()
+
+    assert cache.read(str(path)).content == "one\n"
+    assert cache.read(str(path)).content == "one\n"
+    assert cache.reads == 1
+
+    path.write_text("two\n")
+    touch(path)
+    assert cache.read(str(path)).content == "two\n"
+    assert cache.reads == 2
+
+
+def test_touched_file_keeps_entry(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("one\n")
+    cache = OpenFileCache()
+    first = cache.read(str(path))
+
+    touch(path)
+    assert cache.read(str(path)) is first
+    assert cache.reads == 2
+    # The new mtime is recorded, so the next read is a hit
+    cache.read(str(path))
+    assert cache.reads == 2
+
+
+def test_retain_drops_closed_files(tmp_path):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("a")
+    b.write_text("b")
+    cache = OpenFileCache()
+    cache.read(str(a))
+    cache.read(str(b))
+
+    cache.retain({str(a)})
+    cache.read(str(a))
+    cache.read(str(b))
+    assert cache.reads == 3
@@ -0,0 +1,173 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.tools import tool
+
+import agent.llm_provider as llm_provider
+from agent.llm_provider import AgentCache, LLMProvider, get_tools_hash
+
+
+@tool
+def tool_a(session_id: str) -> str:
+    """Tool A."""
+    return "a"
+
+@tool
+def tool_b(session_id: str, value: int) -> str:
+    """Tool B."""
+    return "b"
+
+
+def fake_create_react_agent(model, tools, **kwargs):
+    return object()
+
+
+def test_tools_hash_ignores_order():
+    assert get_tools_hash([tool_a, tool_b]) == get_tools_hash([tool_b, tool_a])
+    assert get_tools_hash([tool_a]) != get_tools_hash([tool_a, tool_b])
+
+
+def test_agent_cache_hit_and_eviction(monkeypatch):
+    monkeypatch.setattr(llm_provider, "create_react_agent", fake_create_react_agent)
+    monkeypatch.setattr(llm_provider, "get_llm", lambda provider, boost: (provider, boost))
+
+    cache = AgentCache(max_size=2)
+    tools = [tool_a, tool_b]
+    agent = cache.get("openai", False, tools)
+    assert cache.get("openai", False, tools) is agent
+
+    cache.get("openai", True, tools)
+    cache.get("bedrock", False, tools)
+    assert len(cache) == 2
+    assert cache.get("openai", False, tools) is not agent
+
+
+def test_agent_cache_rebuilds_for_new_tool_objects(monkeypatch):
+    monkeypatch.setattr(llm_provider, "create_react_agent", fake_create_react_agent)
+    monkeypatch.setattr(llm_provider, "get_llm", lambda provider, boost: (provider, boost))
+
+    cache = AgentCache(max_size=2)
+    agent = cache.get("openai", False, [tool_a, tool_b])
+    assert cache.get("openai", False, [tool_a, tool_b]) is not agent
+    assert len(cache) == 1
+
+
+class FlakyPool:
+    """MCP pool whose first `get_tools()` calls fail with a dropped connection."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.resets = 0
+
+    async def get_tools(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("SSE stream closed")
+        return [tool_a]
+
+    async def reset(self):
+        self.resets += 1
+
+
+class FakeMemory:
+    session_id = "test-session"
+
+    def get_boost_state(self):
+        return False
+
+
+def make_provider(monkeypatch, pool, invoke):
+    monkeypatch.setattr(llm_provider, "get_mcp_pool", lambda: pool)
+    provider = LLMProvider(FakeMemory(), "openai", "prompt")
+    monkeypatch.setattr(provider, "_invoke", invoke)
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_get_response_reconnects_when_loading_tools_fails(monkeypatch):
+    pool = FlakyPool(failures=1)
+    invoked = []
+
+    async def invoke(tools, message):
+        invoked.append(tools)
+        return "done"
+
+    provider = make_provider(monkeypatch, pool, invoke)
+    assert await provider.get_response("hi") == "done"
+    assert pool.resets == 1 and invoked == [[tool_a]]
+
+
+@pytest.mark.asyncio
+async def test_get_response_does_not_replay_turn_after_mid_run_disconnect(monkeypatch):
+    pool = FlakyPool()
+    invoked = []
+
+    async def invoke(tools, message):
+        invoked.append(message)
+        raise ConnectionError("SSE stream closed")
+
+    provider = make_provider(monkeypatch, pool, invoke)
+    with pytest.raises(ConnectionError):
+        await provider.get_response("delete the bucket")
+    # The tool calls already made are not run a second time
+    assert invoked == ["delete the bucket"]
+    assert pool.resets == 1
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    peers = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        StubOpenAIHandler.peers.append(self.client_address)
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "stub",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "pong"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubOpenAIHandler.peers = []
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    llm_provider.clear_llm_clients()
+    yield StubOpenAIHandler.peers
+    llm_provider.clear_llm_clients()
+    server.shutdown()
+
+
+def test_llm_clients_are_reused(stub_openai):
+    llm = llm_provider.get_llm("openai", False)
+    assert llm_provider.get_llm("openai", False) is llm
+    boosted = llm_provider.get_llm("openai", True)
+    assert boosted is not llm
+    assert llm_provider.get_llm("openai", False) is llm
+
+    assert llm.invoke("ping").content == "pong"
+    assert llm.invoke("ping").content == "pong"
+    # Both requests went over the same kept-alive connection
+    assert len(stub_openai) == 2
+    assert stub_openai[0] == stub_openai[1]
@@ -8,16 +8,94 @@ async def test_get_tools():
     """
     Test the get_tools function
     """
-    async with MultiServerMCPClient(
+    client = MultiServerMCPClient(
         {
             "test": {
                 "url": "http://localhost:8080/sse",
                 "transport": "sse",
             }
         }
-    ) as client:
-        tools = client.get_tools()
-        print (f"\n\n>>> Tools: {tools}")
-        assert tools is not None
-        assert type(tools) == list
-        assert len(tools) > 0
\ No newline at end of file
+    )
+    tools = await client.get_tools()
+    print (f"\n\n>>> Tools: {tools}")
+    assert tools is not None
+    assert type(tools) == list
+    assert len(tools) > 0
+
+@pytest.mark.asyncio
+async def test_mcp_pool_reuses_session():
+    """
+    The pooled session's tools are cached across turns; see
+    benchmarks/mcp_tool_setup.py for the latency comparison.
+    """
+    from agent.llm_provider import MCPClientPool, MCP_CONNECTIONS
+
+    pool = MCPClientPool(MCP_CONNECTIONS)
+    first = await pool.get_tools()
+    assert len(first) > 0
+    for _ in range(3):
+        assert await pool.get_tools() is first
+    await pool.reset()
+
+
+@pytest.mark.asyncio
+async def test_mcp_pool_reconnects_after_reset():
+    from agent.llm_provider import MCPClientPool, MCP_CONNECTIONS
+
+    pool = MCPClientPool(MCP_CONNECTIONS)
+    first = await pool.get_tools()
+    await pool.reset()
+    second = await pool.get_tools()
+    assert second is not first
+    assert [t.name for t in second] == [t.name for t in first]
+    await pool.reset()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_tool_call_cancels_server_exec():
+    """
+    Cancelling the task awaiting a tool reaches the server: the handler is
+    cancelled and the exec's cancel_event is set, as in tool_shell.
+    """
+    import asyncio
+    import threading
+
+    import anyio
+    from mcp.server.fastmcp import FastMCP
+    from mcp.shared.memory import create_client_server_memory_streams
+    from langchain_mcp_adapters.tools import load_mcp_tools
+    from agent.llm_provider import CancellingClientSession
+    from docker_utils.exec_scheduler import ExecScheduler
+
+    scheduler = ExecScheduler(max_workers=2)
+    started = threading.Event()
+    killed = threading.Event()
+    server = FastMCP("test")
+
+    def run_command(cancel_event):
+        started.set()
+        # Stands in for the watchdog killing the process group
+        if cancel_event.wait(10):
+            killed.set()
+        return "done"
+
+    @server.tool()
+    async def tool_sleep(session_id: str) -> str:
+        cancel_event = threading.Event()
+        return await scheduler.run(session_id, "container", run_command, cancel_event, on_cancel=cancel_event.set)
+
+    async with create_client_server_memory_streams() as ((client_read, client_write), (server_read, server_write)):
+        async with anyio.create_task_group() as tg:
+            low_level = server._mcp_server
+            tg.start_soon(lambda: low_level.run(server_read, server_write, low_level.create_initialization_options()))
+            async with CancellingClientSession(client_read, client_write) as session:
+                await session.initialize()
+                tool = next(t for t in await load_mcp_tools(session) if t.name == "tool_sleep")
+
+                call = asyncio.create_task(tool.ainvoke({"session_id": "s1"}))
+                await asyncio.to_thread(started.wait, 5)
+                call.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await call
+                assert await asyncio.to_thread(killed.wait, 5)
+            tg.cancel_scope.cancel()
@@ -0,0 +1,37 @@
+import os
+
+from agent.prompt_cache import get_prompt_template, clear_prompt_templates
+
+
+def test_prompt_template_cached_until_mtime_changes(tmp_path):
+    clear_prompt_templates()
+    path = tmp_path / "A.txt"
+    path.write_text("Hello {name}")
+
+    template = get_prompt_template("A.txt", config_dir=str(tmp_path))
+    assert get_prompt_template("A.txt", config_dir=str(tmp_path)) is template
+    assert template.format(name="agent") == "Hello agent"
+
+    path.write_text("Bye {name}")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = get_prompt_template("A.txt", config_dir=str(tmp_path))
+    assert reloaded is not template
+    assert reloaded.format(name="agent") == "Bye agent"
+
+
+def test_prompt_templates_cached_side_by_side(tmp_path):
+    clear_prompt_templates()
+    (tmp_path / "A.txt").write_text("A {x}")
+    (tmp_path / "B.txt").write_text("B {x}")
+
+    a = get_prompt_template("A.txt", config_dir=str(tmp_path))
+    b = get_prompt_template("B.txt", config_dir=str(tmp_path))
+    assert a is not b
+    assert get_prompt_template("A.txt", config_dir=str(tmp_path)) is a
+    assert get_prompt_template("B.txt", config_dir=str(tmp_path)) is b
+
+
+def test_default_prompt_loads():
+    template = get_prompt_template("MAIN.txt")
+    assert "session_id" in template.input_variables
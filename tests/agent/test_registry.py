@@ -0,0 +1,75 @@
+from agent.registry import Registry
+
+
+class Resource:
+    def __init__(self, key):
+        self.key = key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_registry_lru_eviction():
+    registry = Registry(Resource, max_size=2, on_evict=Resource.close)
+    a = registry.get("a")
+    registry.get("b")
+    assert registry.get("a") is a
+    c = registry.get("c")
+
+    assert "b" not in registry
+    assert "a" in registry and "c" in registry
+    assert not a.closed and not c.closed
+    assert registry.stats() == dict(size=2, hits=1, misses=3, evictions=1)
+
+
+def test_registry_idle_ttl_eviction(monkeypatch):
+    import agent.registry as registry_module
+    now = [1000.0]
+    monkeypatch.setattr(registry_module.time, "monotonic", lambda: now[0])
+
+    registry = Registry(Resource, max_size=10, idle_ttl=60, on_evict=Resource.close)
+    a = registry.get("a")
+    now[0] += 30
+    b = registry.get("b")
+    now[0] += 40
+    registry.get("b")
+
+    assert a.closed
+    assert not b.closed
+    assert "a" not in registry
+    assert registry.stats()["evictions"] == 1
+
+
+def test_registry_peek_and_clear():
+    registry = Registry(Resource, max_size=2, on_evict=Resource.close)
+    assert registry.peek("a") is None
+    a = registry.get("a")
+    assert registry.peek("a") is a
+    assert registry.stats()["hits"] == 0
+
+    registry.clear()
+    assert a.closed
+    assert len(registry) == 0
+
+
+def test_registry_releases_evicted_values_on_executor():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    closing = threading.Event()
+
+    class SlowResource(Resource):
+        def close(self):
+            closing.wait(5)
+            super().close()
+
+    registry = Registry(SlowResource, max_size=1, on_evict=SlowResource.close, executor=lambda: executor)
+    a = registry.get("a")
+    # Evicting "a" doesn't wait for it to close
+    registry.get("b")
+    assert not a.closed
+    closing.set()
+    executor.shutdown(wait=True)
+    assert a.closed
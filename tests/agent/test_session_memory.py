@@ -0,0 +1,355 @@
+import mongomock
+import pytest
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+import agent.session_memory as session_memory_module
+from agent.session_memory import SessionMemory, ensure_indexes, set_mongo_client, MONGO_DB_NAME
+
+
+@pytest.fixture(autouse=True)
+def mongo_client():
+    client = mongomock.MongoClient()
+    set_mongo_client(client)
+    yield client
+    set_mongo_client(None)
+
+
+@pytest.fixture
+def session_memory():
+    mem = SessionMemory("test-session-memory")
+    mem.clear_tasks()
+    for note in mem.get_notes():
+        mem.remove_note(note["_id"])
+    for f in mem.get_open_files():
+        mem.remove_open_file(f["file_path"])
+    return mem
+
+
+def test_get_snapshot(session_memory):
+    session_memory.set_working_dir("/container/data")
+    session_memory.set_goal("goal")
+    session_memory.set_boost_state(True)
+    session_memory.add_task("second", 2)
+    session_memory.add_task("first", 1)
+    session_memory.add_note("note")
+    session_memory.set_open_file("README.md")
+
+    snapshot = session_memory.get_snapshot()
+    assert snapshot["working_dir"] == "/container/data"
+    assert snapshot["goal"] == "goal"
+    assert snapshot["boost_state"] is True
+    assert [t["task"] for t in snapshot["tasks"]] == ["first", "second"]
+    assert [n["note"] for n in snapshot["notes"]] == ["note"]
+    assert [f["file_path"] for f in snapshot["open_files"]] == ["README.md"]
+
+
+def test_get_snapshot_without_environment():
+    mem = SessionMemory("test-session-memory-empty")
+    mem.db["environment"].delete_many({"session_id": mem.session_id})
+    mem.clear_tasks()
+
+    snapshot = mem.get_snapshot()
+    assert snapshot["working_dir"] is None
+    assert snapshot["boost_state"] is False
+    assert snapshot["tasks"] == []
+
+
+def test_session_memories_share_client(mongo_client):
+    assert SessionMemory("a").client is SessionMemory("b").client is mongo_client
+
+
+def test_ensure_indexes(mongo_client):
+    ensure_indexes()
+    db = mongo_client[MONGO_DB_NAME]
+    task_index_keys = [index["key"] for index in db["tasks"].index_information().values()]
+    assert [("session_id", 1), ("sort_order", 1)] in task_index_keys
+    for collection in session_memory_module.SESSION_INDEXES:
+        assert len(db[collection].index_information()) > 1
+
+
+def test_add_task_appends_in_order(session_memory):
+    session_memory.add_task("first")
+    session_memory.add_task("second")
+    session_memory.add_task("pinned", 10)
+    session_memory.add_task("third")
+    tasks = session_memory.get_tasks()
+    assert [t["task"] for t in tasks] == ["first", "second", "pinned", "third"]
+    assert [t["sort_order"] for t in tasks] == [1, 2, 10, 11]
+
+
+def test_add_task_seeds_counter_from_existing_tasks(session_memory):
+    session_memory.db["tasks"].insert_one(dict(session_id=session_memory.session_id, task="old", status="new", sort_order=5.0))
+    session_memory.add_task("new")
+    assert [t["sort_order"] for t in session_memory.get_tasks()] == [5, 6]
+
+
+def test_clear_tasks_resets_order(session_memory):
+    session_memory.add_task("first")
+    session_memory.clear_tasks()
+    session_memory.add_task("again")
+    assert [t["sort_order"] for t in session_memory.get_tasks()] == [1]
+
+
+def test_add_tasks_and_reorder(session_memory):
+    session_memory.add_task("first")
+    session_memory.add_tasks(["a", "b", "c"])
+    tasks = session_memory.get_tasks()
+    assert [t["task"] for t in tasks] == ["first", "a", "b", "c"]
+    assert [t["sort_order"] for t in tasks] == [1, 2, 3, 4]
+
+    ids = {t["task"]: str(t["_id"]) for t in tasks}
+    session_memory.reorder_tasks({ids["c"]: 0, ids["first"]: 5})
+    assert [t["task"] for t in session_memory.get_tasks()] == ["c", "a", "b", "first"]
+    session_memory.add_task("last")
+    assert session_memory.get_tasks()[-1]["sort_order"] == 6
+
+
+def test_message_windows():
+    mem = SessionMemory("test-session-messages")
+    seqs = [mem.add_message("user", f"m{i}") for i in range(10)]
+    assert seqs == list(range(1, 11))
+
+    assert [m["content"] for m in mem.get_messages(limit=3)] == ["m7", "m8", "m9"]
+    assert [m["content"] for m in mem.get_messages(limit=3, before_seq=4)] == ["m0", "m1", "m2"]
+    assert [m["content"] for m in mem.get_messages(since_seq=8)] == ["m8", "m9"]
+    assert [m["content"] for m in mem.get_messages(limit=1, since_seq=2)] == ["m2"]
+    assert len(mem.get_messages()) == 10
+
+
+def test_legacy_messages_get_sequenced():
+    mem = SessionMemory("test-session-legacy")
+    mem.db["messages"].insert_many([
+        {"session_id": mem.session_id, "role": "user", "content": "old0"},
+        {"session_id": mem.session_id, "role": "assistant", "content": "old1"},
+    ])
+    assert mem.add_message("user", "new") == 3
+    assert [m["seq"] for m in mem.get_messages()] == [1, 2, 3]
+    assert [m["content"] for m in mem.get_messages(limit=2)] == ["old1", "new"]
+
+
+def test_write_behind_batches_until_read(mongo_client):
+    mem = SessionMemory("test-session-write-behind", write_behind=True)
+    collection = mongo_client[MONGO_DB_NAME]["notes"]
+    mem.add_note("a")
+    mem.add_note("b")
+    assert collection.count_documents({"session_id": mem.session_id}) == 0
+
+    # Reads see pending writes
+    assert [n["note"] for n in mem.get_notes()] == ["a", "b"]
+    assert collection.count_documents({"session_id": mem.session_id}) == 2
+
+
+def test_write_behind_flushes_on_size(mongo_client, monkeypatch):
+    monkeypatch.setattr(session_memory_module, "WRITE_BEHIND_MAX_OPS", 3)
+    mem = SessionMemory("test-session-write-behind-size", write_behind=True)
+    collection = mongo_client[MONGO_DB_NAME]["files"]
+    mem.set_open_file("a")
+    mem.set_open_file("b")
+    assert collection.count_documents({"session_id": mem.session_id}) == 0
+    mem.set_open_file("c")
+    assert collection.count_documents({"session_id": mem.session_id}) == 3
+
+
+def test_write_behind_flushes_on_timer(mongo_client, monkeypatch):
+    import time
+    monkeypatch.setattr(session_memory_module, "WRITE_BEHIND_MAX_DELAY", 0.05)
+    mem = SessionMemory("test-session-write-behind-timer", write_behind=True)
+    mem.set_goal("goal")
+    time.sleep(0.3)
+    assert mongo_client[MONGO_DB_NAME]["environment"].find_one({"session_id": mem.session_id})["goal"] == "goal"
+
+
+def test_write_behind_keeps_task_order(mongo_client):
+    mem = SessionMemory("test-session-write-behind-tasks", write_behind=True)
+    mem.clear_tasks()
+    mem.add_task("a")
+    mem.add_task("b", 5)
+    mem.clear_tasks()
+    mem.add_task("c")
+    mem.flush()
+    assert [(t["task"], t["sort_order"]) for t in mem.get_tasks()] == [("c", 1)]
+
+
+class FailingWrites:
+    """Makes bulk_write fail for the given collections until `failing` is cleared."""
+
+    def __init__(self, monkeypatch, *collections):
+        from mongomock.collection import Collection
+        self.failing = set(collections)
+        bulk_write = Collection.bulk_write
+        failing = self.failing
+
+        def maybe_failing_bulk_write(collection, requests, *args, **kwargs):
+            if collection.name in failing:
+                raise ConnectionError(f"{collection.name} unavailable")
+            return bulk_write(collection, requests, *args, **kwargs)
+
+        monkeypatch.setattr(Collection, "bulk_write", maybe_failing_bulk_write)
+
+
+def test_write_behind_keeps_ops_when_flush_fails(mongo_client, monkeypatch):
+    mem = SessionMemory("test-session-write-behind-retry", write_behind=True)
+    mem.add_note("note")
+    mem.set_goal("goal")
+    mem.set_open_file("a")
+    failing = FailingWrites(monkeypatch, "environment")
+
+    with pytest.raises(ConnectionError):
+        mem.flush()
+    # Collections written before the failure are not written twice
+    db = mongo_client[MONGO_DB_NAME]
+    assert db["notes"].count_documents({"session_id": mem.session_id}) == 1
+    assert [collection for collection, _ in mem._pending] == ["environment", "files"]
+
+    failing.failing.clear()
+    mem.flush()
+    assert mem._pending == []
+    assert db["notes"].count_documents({"session_id": mem.session_id}) == 1
+    assert db["environment"].find_one({"session_id": mem.session_id})["goal"] == "goal"
+    assert db["files"].count_documents({"session_id": mem.session_id}) == 1
+
+
+def test_write_behind_drops_only_rejected_op(mongo_client):
+    mem = SessionMemory("test-session-write-behind-rejected", write_behind=True)
+    mem.add_note("a")
+    mem.flush()
+    note = mongo_client[MONGO_DB_NAME]["notes"].find_one({"session_id": mem.session_id})
+    mem._write("notes", InsertOne({"session_id": mem.session_id, "note": "b"}), InsertOne(note), InsertOne({"session_id": mem.session_id, "note": "c"}))
+
+    with pytest.raises(BulkWriteError):
+        mem.flush()
+    assert len(mem._pending) == 1
+    mem.flush()
+    assert [n["note"] for n in mem.get_notes()] == ["a", "b", "c"]
+
+
+def test_write_behind_timer_retries_failed_flush(mongo_client, monkeypatch):
+    import time
+    monkeypatch.setattr(session_memory_module, "WRITE_BEHIND_MAX_DELAY", 0.05)
+    mem = SessionMemory("test-session-write-behind-timer-failure", write_behind=True)
+    failing = FailingWrites(monkeypatch, "notes")
+    mem.add_note("note")
+    time.sleep(0.2)
+    assert mem._pending
+
+    # The timer retry writes the note, and nothing was lost to report
+    failing.failing.clear()
+    time.sleep(0.3)
+    assert mem._pending == []
+    assert [n["note"] for n in mem.get_notes()] == ["note"]
+    mem.get_snapshot()
+
+
+def test_write_behind_timer_rejection_reaches_next_flush(mongo_client, monkeypatch):
+    import time
+    monkeypatch.setattr(session_memory_module, "WRITE_BEHIND_MAX_DELAY", 0.05)
+    mem = SessionMemory("test-session-write-behind-timer-rejected", write_behind=True)
+    mem.add_note("a")
+    mem.flush()
+    note = mongo_client[MONGO_DB_NAME]["notes"].find_one({"session_id": mem.session_id})
+    mem._write("notes", InsertOne(note))
+    time.sleep(0.3)
+    assert mem._pending == []
+
+    with pytest.raises(BulkWriteError):
+        mem.get_notes()
+    # The error is only reported once
+    assert [n["note"] for n in mem.get_notes()] == ["a"]
+
+
+def test_environment_cache(mongo_client, monkeypatch):
+    monkeypatch.setattr(session_memory_module, "ENVIRONMENT_CACHE_TTL", 60)
+    mem = SessionMemory("test-session-environment")
+    other = SessionMemory("test-session-environment")
+    mem.set_working_dir("/a")
+    assert mem.get_working_dir() == "/a"
+
+    # Cached: a write from another instance is not seen until the TTL expires
+    other.set_working_dir("/b")
+    assert mem.get_working_dir() == "/a"
+    mem._environment_loaded_at -= 61
+    assert mem.get_working_dir() == "/b"
+
+    # Local writes update the cache and bump the version
+    version = mem._environment["version"]
+    mem.set_goal("goal")
+    assert mem.get_goal() == "goal"
+    assert mem._environment["version"] == version + 1
+    assert mongo_client[MONGO_DB_NAME]["environment"].find_one({"session_id": mem.session_id})["version"] == version + 1
+
+
+def test_environment_cache_ignores_stale_documents():
+    mem = SessionMemory("test-session-environment-stale")
+    mem.set_boost_state(True)
+    mem.get_boost_state()
+    mem._cache_environment({"session_id": mem.session_id, "boost_state": False, "version": 0})
+    assert mem.get_boost_state() is True
+
+
+def test_environment_cache_takes_recreated_document(mongo_client, monkeypatch):
+    monkeypatch.setattr(session_memory_module, "ENVIRONMENT_CACHE_TTL", 60)
+    mem = SessionMemory("test-session-environment-recreated")
+    mem.set_working_dir("/a")
+    mem.set_goal("goal")
+    assert mem.get_working_dir() == "/a"
+
+    # Another process deletes and re-creates the document, restarting its version
+    collection = mongo_client[MONGO_DB_NAME]["environment"]
+    collection.delete_many({"session_id": mem.session_id})
+    SessionMemory(mem.session_id).set_working_dir("/b")
+    mem._environment_loaded_at -= 61
+    assert mem.get_working_dir() == "/b"
+    assert mem.get_goal() is None
+    assert mem._cached_environment() is not None
+
+
+@pytest.mark.asyncio
+async def test_async_session_memory_calls_overlap(monkeypatch):
+    import asyncio
+    import time
+    from agent.session_memory import AsyncSessionMemory
+
+    delay = 0.2
+    add_note = SessionMemory.add_note
+
+    def slow_add_note(self, note):
+        # Stands in for a slow Mongo round trip
+        time.sleep(delay)
+        add_note(self, note)
+
+    monkeypatch.setattr(SessionMemory, "add_note", slow_add_note)
+
+    sessions = [AsyncSessionMemory(SessionMemory(f"test-session-async-{i}")) for i in range(8)]
+    start = time.perf_counter()
+    await asyncio.gather(*[mem.add_note("note") for mem in sessions])
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < delay * len(sessions) / 2
+    for mem in sessions:
+        assert [n["note"] for n in await mem.get_notes()] == ["note"]
+
+
+@pytest.mark.asyncio
+async def test_async_session_memory_cached_environment():
+    from agent.session_memory import AsyncSessionMemory
+
+    mem = AsyncSessionMemory(SessionMemory("test-session-async-environment"))
+    await mem.set_working_dir("/container/data")
+    assert await mem.get_working_dir() == "/container/data"
+    assert await mem.get_boost_state() is False
+
+
+def test_environment_watcher_starts_once(monkeypatch):
+    import threading
+    started = []
+
+    class RecordingThread(threading.Thread):
+        def start(self):
+            started.append(self.name)
+
+    monkeypatch.setattr(session_memory_module, "_watcher_started", False)
+    monkeypatch.setattr(session_memory_module.threading, "Thread", RecordingThread)
+    session_memory_module.watch_environment_changes()
+    session_memory_module.watch_environment_changes()
+    assert started == ["environment-watcher"]
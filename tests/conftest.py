@@ -6,4 +6,19 @@ if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
 from dotenv import load_dotenv
-load_dotenv()
\ No newline at end of file
+load_dotenv()
+
+# mongomock 4.3 predates the `sort` argument pymongo 4.11 passes to bulk
+# UpdateOne/ReplaceOne operations; drop it so bulk_write works in tests.
+try:
+    from mongomock.collection import BulkOperationBuilder
+
+    def _drop_sort(method):
+        def wrapper(self, *args, sort=None, **kwargs):
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    BulkOperationBuilder.add_update = _drop_sort(BulkOperationBuilder.add_update)
+    BulkOperationBuilder.add_replace = _drop_sort(BulkOperationBuilder.add_replace)
+except ImportError:
+    pass
@@ -0,0 +1,155 @@
+import time
+
+import docker
+import pytest
+
+from docker_utils.container_pool import ContainerPool
+
+
+class FakeContainer:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def remove(self, force=False):
+        self.client.removed.append(self.name)
+        self.client.running.discard(self.name)
+
+
+class FakeClient:
+    def __init__(self):
+        self.running = set()
+        self.removed = []
+        self.containers = self
+
+    def get(self, name):
+        if name not in self.running:
+            raise docker.errors.NotFound(name)
+        return FakeContainer(self, name)
+
+    def list(self, all=False, filters=None):
+        return []
+
+
+def make_pool(size, delay=0.0):
+    client = FakeClient()
+    launched = []
+
+    def launch(name, labels):
+        time.sleep(delay)
+        client.running.add(name)
+        launched.append((name, labels))
+
+    return ContainerPool(launch, size=size, prefix="test-pool", client=client), client, launched
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_lease_comes_from_warm_pool_and_refills():
+    pool, client, launched = make_pool(size=2)
+    pool.start()
+    wait_for(lambda: pool.stats()["warm"] == 2)
+    assert all(labels == {"agent.pool": "test-pool"} for _, labels in launched)
+
+    name = pool.lease("s1")
+    assert pool.lease("s1") == name
+    assert pool.stats()["cold_starts"] == 0
+    wait_for(lambda: pool.stats()["warm"] == 2)
+    assert pool.lease("s2") != name
+    pool.close()
+
+
+def test_cold_start_when_pool_empty():
+    pool, client, launched = make_pool(size=0)
+    name = pool.lease("s1")
+    assert name in client.running
+    assert pool.stats()["cold_starts"] == 1
+
+
+def test_failed_cold_start_removes_container():
+    client = FakeClient()
+
+    def launch(name, labels):
+        client.running.add(name)
+        raise TimeoutError(f"{name} did not become ready")
+
+    pool = ContainerPool(launch, size=0, prefix="test-pool", client=client)
+    with pytest.raises(TimeoutError):
+        pool.lease("s1")
+    assert client.running == set()
+    assert len(client.removed) == 1
+    assert pool.leases == {}
+
+
+def test_release_replaces_container():
+    pool, client, launched = make_pool(size=1)
+    pool.start()
+    wait_for(lambda: pool.stats()["warm"] == 1)
+    name = pool.lease("s1")
+    pool.release("s1")
+    wait_for(lambda: name in client.removed)
+    wait_for(lambda: pool.stats()["warm"] == 1)
+    assert pool.warm[0] != name
+    pool.close()
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.busy = set()
+        self.activity = {}
+
+    def register(self, name):
+        pass
+
+    def unregister(self, name):
+        pass
+
+    def in_use(self, name):
+        return name in self.busy
+
+    def last_activity(self, name):
+        return self.activity.get(name)
+
+
+def test_release_waits_for_running_call():
+    pool, client, launched = make_pool(size=0)
+    pool.scheduler = scheduler = FakeScheduler()
+    name = pool.lease("s1")
+    scheduler.busy.add(name)
+
+    pool.release("s1")
+    pool.expire_leases()
+    assert pool.lease("s1") == name
+    assert name not in client.removed
+
+    pool.release("s1")
+    scheduler.busy.discard(name)
+    pool.expire_leases()
+    wait_for(lambda: name in client.removed)
+    assert pool.stats()["leased"] == 0
+
+
+def test_idle_lease_expires():
+    pool, client, launched = make_pool(size=0)
+    pool.scheduler = scheduler = FakeScheduler()
+    pool.lease_ttl = 60
+    name = pool.lease("s1")
+    pool._last_leased["s1"] -= 120
+
+    # Recent activity in the container keeps the lease, and so does a running call
+    scheduler.activity[name] = time.monotonic()
+    pool.expire_leases()
+    scheduler.activity[name] -= 120
+    scheduler.busy.add(name)
+    pool.expire_leases()
+    assert pool.leases == {"s1": name}
+
+    scheduler.busy.discard(name)
+    pool.expire_leases()
+    wait_for(lambda: name in client.removed)
+    assert pool.leases == {}
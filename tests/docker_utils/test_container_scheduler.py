@@ -0,0 +1,196 @@
+import time
+import threading
+
+import docker
+import pytest
+
+from docker_utils import container_scheduler
+from docker_utils.container_scheduler import ContainerScheduler
+
+
+class FakeContainer:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    @property
+    def status(self):
+        return self.client.status[self.name]
+
+    def pause(self):
+        self.client.calls.append(("pause", self.name))
+        self.client.status[self.name] = "paused"
+
+    def unpause(self):
+        self.client.calls.append(("unpause", self.name))
+        self.client.status[self.name] = "running"
+
+    def stop(self, timeout=None):
+        self.client.calls.append(("stop", self.name))
+        self.client.status[self.name] = "exited"
+
+    def start(self):
+        self.client.calls.append(("start", self.name))
+        self.client.status[self.name] = "running"
+
+
+class FakeClient:
+    def __init__(self):
+        self.status = {}
+        self.calls = []
+        self.containers = self
+        self.blocked = {}  # name -> Event that a Docker call on it waits for
+        self.failing = set()
+
+    def get(self, name):
+        if name in self.blocked:
+            self.blocked[name].wait(5)
+        if name in self.failing:
+            raise docker.errors.APIError(f"cannot reach {name}")
+        return FakeContainer(self, name)
+
+
+def make_scheduler(names, **kwargs):
+    client = FakeClient()
+    kwargs = dict(dict(pause_after=10, stop_after=100, max_active=8, cap_wait=0), **kwargs)
+    scheduler = ContainerScheduler(client=client, **kwargs)
+    for name in names:
+        client.status[name] = "running"
+        scheduler.register(name)
+    return scheduler, client
+
+
+def age(scheduler, name, seconds):
+    scheduler._containers[name].last_activity = time.monotonic() - seconds
+
+
+def test_idle_container_is_paused_then_stopped():
+    scheduler, client = make_scheduler(["a", "b"])
+    age(scheduler, "a", 20)
+    scheduler.check_idle()
+    assert client.status == {"a": "paused", "b": "running"}
+
+    age(scheduler, "a", 200)
+    scheduler.check_idle()
+    assert client.status["a"] == "exited"
+    assert scheduler.stats()["stopped"] == 1
+
+
+def test_activity_resumes_paused_and_stopped_containers():
+    scheduler, client = make_scheduler(["a", "b"])
+    age(scheduler, "a", 20)
+    age(scheduler, "b", 200)
+    scheduler.check_idle()
+
+    with scheduler.activity("a"):
+        assert client.status["a"] == "running"
+    with scheduler.activity("b"):
+        assert client.status["b"] == "running"
+    assert ("unpause", "a") in client.calls and ("start", "b") in client.calls
+    assert scheduler.stats()["resumes"] == 2
+
+
+def test_busy_container_is_not_paused():
+    scheduler, client = make_scheduler(["a"])
+    with scheduler.activity("a"):
+        age(scheduler, "a", 20)
+        scheduler.check_idle()
+        assert client.status["a"] == "running"
+
+
+def test_cap_pauses_least_recently_used_idle_container():
+    scheduler, client = make_scheduler(["a", "b"], max_active=2)
+    age(scheduler, "a", 5)
+    age(scheduler, "b", 3)
+    with scheduler.activity("b"):
+        client.status["c"] = "running"
+        scheduler.register("c")
+    assert client.status == {"a": "paused", "b": "running", "c": "running"}
+
+    # Using "a" again pauses whichever of the others was used longest ago
+    age(scheduler, "b", 3)
+    age(scheduler, "c", 1)
+    with scheduler.activity("a"):
+        assert client.status == {"a": "running", "b": "paused", "c": "running"}
+
+
+def test_cap_runs_over_when_every_container_is_busy():
+    scheduler, client = make_scheduler(["a"], max_active=1)
+    with scheduler.activity("a"):
+        client.status["b"] = "running"
+        scheduler.register("b")
+    assert client.status == {"a": "running", "b": "running"}
+
+
+def test_unregister_resumes_container():
+    scheduler, client = make_scheduler(["a"])
+    age(scheduler, "a", 20)
+    scheduler.check_idle()
+    scheduler.unregister("a")
+    assert client.status["a"] == "running"
+    assert scheduler.stats()["paused"] == 0
+
+
+def test_unregistered_containers_are_not_tracked():
+    assert container_scheduler._scheduler is None
+    with container_scheduler.container_activity("anything"):
+        pass
+    scheduler, client = make_scheduler([])
+    with scheduler.activity("unknown"):
+        pass
+    assert client.calls == []
+
+
+def test_failed_resume_raises_and_keeps_state():
+    scheduler, client = make_scheduler(["a"])
+    age(scheduler, "a", 20)
+    scheduler.check_idle()
+    client.failing.add("a")
+    with pytest.raises(RuntimeError, match="Failed to resume"):
+        with scheduler.activity("a"):
+            pass
+    assert scheduler.stats()["paused"] == 1
+    assert not scheduler.in_use("a")
+
+    client.failing.clear()
+    with scheduler.activity("a"):
+        assert client.status["a"] == "running"
+
+
+def test_slow_docker_call_only_blocks_its_container():
+    scheduler, client = make_scheduler(["a", "b"])
+    age(scheduler, "a", 200)
+    scheduler.check_idle()
+    age(scheduler, "b", 20)
+    client.blocked["b"] = threading.Event()
+    sweep = threading.Thread(target=scheduler.check_idle)
+    sweep.start()
+
+    # "a" resumes while the pause of "b" is stuck in Docker
+    start = time.monotonic()
+    with scheduler.activity("a"):
+        assert client.status["a"] == "running"
+    assert time.monotonic() - start < 1
+    client.blocked["b"].set()
+    sweep.join()
+    assert client.status["b"] == "paused"
+
+
+def test_pause_called_off_when_container_is_used():
+    scheduler, client = make_scheduler(["a"])
+    age(scheduler, "a", 20)
+    client.blocked["a"] = threading.Event()
+    sweep = threading.Thread(target=scheduler.check_idle)
+    sweep.start()
+    while scheduler._containers["a"].pending is None:
+        time.sleep(0.01)
+
+    # The call waits for the pause in progress, then resumes the container
+    def release():
+        time.sleep(0.1)
+        client.blocked.pop("a").set()
+    threading.Thread(target=release).start()
+    with scheduler.activity("a"):
+        assert client.status["a"] == "running"
+    sweep.join()
+    assert scheduler._containers["a"].pending is None
@@ -0,0 +1,74 @@
+import time
+
+import docker
+import pytest
+
+from docker_utils.docker_client import ContainerCache
+
+
+class FakeContainer:
+    def __init__(self, name, status="running"):
+        self.name = name
+        self.id = f"id-{name}"
+        self.status = status
+
+
+class FakeContainers:
+    def __init__(self):
+        self.statuses = {"c1": "running"}
+        self.calls = 0
+
+    def get(self, name):
+        self.calls += 1
+        if name not in self.statuses:
+            raise docker.errors.NotFound(name)
+        return FakeContainer(name, self.statuses[name])
+
+
+class FakeClient:
+    def __init__(self):
+        self.containers = FakeContainers()
+
+
+def test_cached_until_event():
+    client = FakeClient()
+    cache = ContainerCache(client, ttl=0)
+    cache.watching = True
+
+    assert cache.get("c1").status == "running"
+    for _ in range(10):
+        cache.get("c1")
+    assert client.containers.calls == 1
+
+    # Exec events leave the entry alone
+    cache.handle_event({"Type": "container", "Action": "exec_start: /bin/sh -c ls", "Actor": {"ID": "id-c1", "Attributes": {"name": "c1"}}})
+    cache.get("c1")
+    assert client.containers.calls == 1
+
+    client.containers.statuses["c1"] = "exited"
+    cache.handle_event({"Type": "container", "Action": "die", "Actor": {"ID": "id-c1", "Attributes": {"name": "c1"}}})
+    assert cache.get("c1").status == "exited"
+    assert client.containers.calls == 2
+    assert cache.stats()["hits"] == 11
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_ttl_without_events():
+    client = FakeClient()
+    cache = ContainerCache(client, ttl=0.05)
+
+    cache.get("c1")
+    cache.get("c1")
+    assert client.containers.calls == 1
+    time.sleep(0.06)
+    cache.get("c1")
+    assert client.containers.calls == 2
+
+
+def test_missing_container_not_cached():
+    client = FakeClient()
+    cache = ContainerCache(client)
+    with pytest.raises(docker.errors.NotFound):
+        cache.get("nope")
+    client.containers.statuses["nope"] = "running"
+    assert cache.get("nope").status == "running"
@@ -0,0 +1,258 @@
+import os
+import time
+import threading
+import uuid
+
+from docker_utils.docker_executor import ExecStream
+
+
+class FakeExecApi:
+    def __init__(self, exit_code):
+        self.exit_code = exit_code
+        self.inspected = 0
+
+    def exec_inspect(self, exec_id):
+        self.inspected += 1
+        return {"ExitCode": self.exit_code}
+
+
+def test_exec_stream_decodes_split_utf8():
+    data = "héllo ✓".encode("utf-8")
+    chunks = [(data[:2], None), (data[2:9], b"err"), (data[9:], None)]
+    api = FakeExecApi(3)
+    stream = ExecStream(api, "exec-id", iter(chunks))
+
+    output = list(stream)
+    assert "".join(text for name, text in output if name == "stdout") == "héllo ✓"
+    assert [text for name, text in output if name == "stderr"] == ["err"]
+    assert stream.exit_code == 3
+    assert stream.exit_code == 3
+    assert api.inspected == 1
+
+
+def test_execute_command_streaming():
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    executor = DockerCommandExecutor()
+    chunks = []
+    exit_code, stdout, stderr = executor.execute_command(
+        container_name=os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container"),
+        command="echo one; sleep 1; echo two; echo oops >&2; exit 2",
+        on_output=lambda name, text: chunks.append((name, text))
+    )
+    assert exit_code == 2
+    assert stdout == "one\ntwo\n"
+    assert stderr == "oops\n"
+    assert len(chunks) >= 2
+
+
+def test_output_capture_keeps_head_and_tail():
+    from docker_utils.docker_executor import OutputCapture
+
+    capture = OutputCapture(limit=10)
+    for i in range(100):
+        capture.feed(f"line {i:03d}\n")
+    assert capture.truncated
+    assert capture.total_bytes == 900
+    assert capture.total_lines == 100
+
+    capture.spill_path = "/tmp/agent-output/x.stdout"
+    rendered = capture.render()
+    assert rendered.startswith("line 000\nl")
+    assert rendered.endswith("\nline 099\n")
+    assert "880 bytes omitted" in rendered
+    assert "/tmp/agent-output/x.stdout" in rendered
+    assert capture.spill().read().decode("utf-8").count("\n") == 100
+    capture.close()
+
+
+def test_output_capture_under_limit():
+    from docker_utils.docker_executor import OutputCapture
+
+    capture = OutputCapture(limit=10)
+    capture.feed("short ✓")
+    assert not capture.truncated
+    assert capture.render() == "short ✓"
+    capture.close()
+
+
+def test_execute_command_output_limit_spills():
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    executor = DockerCommandExecutor()
+    container_name = os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container")
+    exit_code, stdout, stderr = executor.execute_command(
+        container_name=container_name,
+        command="seq 1 10000",
+        output_limit=100
+    )
+    assert exit_code == 0
+    assert stdout.startswith("1\n2\n")
+    assert stdout.endswith("9999\n10000\n")
+    spill_path = stdout.split("full output saved to ")[1].split("]")[0]
+
+    exit_code, stdout, stderr = executor.execute_command(container_name=container_name, command=f"wc -l < {spill_path}")
+    assert stdout.strip() == "10000"
+
+
+def test_execute_command_timeout_kills_process_group():
+    import pytest
+    from docker_utils.docker_executor import DockerCommandExecutor, CommandTimeoutError
+
+    executor = DockerCommandExecutor()
+    container_name = os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container")
+    start = time.monotonic()
+    with pytest.raises(CommandTimeoutError) as exc_info:
+        executor.execute_command(
+            container_name=container_name,
+            command="echo started; sleep 300 & sleep 300",
+            timeout=1
+        )
+    assert time.monotonic() - start < 10
+    assert exc_info.value.stdout == "started\n"
+
+    exit_code, stdout, stderr = executor.execute_command(container_name=container_name, command="pgrep -c -x sleep || true")
+    assert stdout.strip() == "0"
+
+
+def test_execute_command_cancel_event():
+    import pytest
+    from docker_utils.docker_executor import DockerCommandExecutor, CommandCancelledError
+
+    executor = DockerCommandExecutor()
+    cancel_event = threading.Event()
+    threading.Timer(1, cancel_event.set).start()
+    with pytest.raises(CommandCancelledError):
+        executor.execute_command(
+            container_name=os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container"),
+            command="sleep 300",
+            cancel_event=cancel_event
+        )
+
+
+class FakeArchiveContainer:
+    def __init__(self):
+        self.name = "c1"
+        self.id = "id-c1"
+        self.status = "running"
+        self.uploads = []
+
+    def put_archive(self, path, data):
+        import tarfile
+        with tarfile.open(fileobj=data) as tar:
+            self.uploads.append((path, {m.name: tar.extractfile(m).read() for m in tar.getmembers()}))
+        return True
+
+
+def test_write_files_sends_one_archive():
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    container = FakeArchiveContainer()
+    client = type("FakeClient", (), {})()
+    client.containers = type("FakeContainers", (), {"get": staticmethod(lambda name: container)})()
+    executor = DockerCommandExecutor(client)
+
+    exit_code, stdout, stderr = executor.write_files("c1", "/workspace", {
+        "a.txt": "héllo",
+        "pkg/b.py": "print(1)\n",
+        "/etc/abs.conf": b"\x00\x01",
+    })
+    assert exit_code == 0
+    assert container.uploads == [("/", {
+        "workspace/a.txt": "héllo".encode("utf-8"),
+        "workspace/pkg/b.py": b"print(1)\n",
+        "etc/abs.conf": b"\x00\x01",
+    })]
+
+
+def test_write_to_file_round_trip():
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    executor = DockerCommandExecutor()
+    container_name = os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container")
+    working_dir = f"/tmp/write-test-{uuid.uuid4().hex[:8]}"
+    executor.write_files(container_name, working_dir, {"a.txt": "one\n", "nested/dir/b.txt": "two ✓\n"})
+
+    exit_code, stdout, stderr = executor.execute_command(container_name=container_name, working_dir=working_dir, command="cat a.txt nested/dir/b.txt")
+    assert stdout == "one\ntwo ✓\n"
+
+
+def test_read_files_fetches_staged_files_in_one_archive():
+    import io
+    import tarfile
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    staged = {"0": "héllo\n".encode("utf-8"), "1": b"\x7fELF\x00\x00"}
+
+    class Container(FakeArchiveContainer):
+        def __init__(self):
+            super().__init__()
+            self.archives = []
+            self.commands = []
+
+        def get_archive(self, path):
+            self.archives.append(path)
+            data = io.BytesIO()
+            with tarfile.open(fileobj=data, mode="w") as tar:
+                for name, content in staged.items():
+                    info = tarfile.TarInfo(f"{os.path.basename(path)}/{name}")
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+            return iter([data.getvalue()]), {}
+
+        def exec_run(self, cmd):
+            self.commands.append(cmd)
+
+    container = Container()
+    client = type("FakeClient", (), {})()
+    client.containers = type("FakeContainers", (), {"get": staticmethod(lambda name: container)})()
+    executor = DockerCommandExecutor(client)
+    listing = "ok\t7\t0\ta.txt\nok\t6\t1\tbin/tool\ntoo large\t999999\t-\tbig.log\nnot found\t0\t-\tmissing*\n"
+    executor.execute_command = lambda **kwargs: (0, listing, "")
+
+    results = executor.read_files("c1", "/workspace", ["a.txt", "bin/tool", "big.log", "missing*"])
+    assert results == {
+        "a.txt": {"size": 7, "content": "héllo\n"},
+        "bin/tool": {"size": 6, "skipped": "binary"},
+        "big.log": {"size": 999999, "skipped": "too large"},
+        "missing*": {"size": 0, "skipped": "not found"},
+    }
+    assert len(container.archives) == 1
+    assert container.commands == [["rm", "-rf", container.archives[0]]]
+
+
+def test_read_files_globs():
+    from docker_utils.docker_executor import DockerCommandExecutor
+
+    executor = DockerCommandExecutor()
+    container_name = os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container")
+    working_dir = f"/tmp/read-test-{uuid.uuid4().hex[:8]}"
+    executor.write_files(container_name, working_dir, {"pkg/a.py": "a\n", "pkg/b py.py": "b\n", "notes.txt": "n\n"})
+
+    results = executor.read_files(container_name, working_dir, ["pkg/*.py", "notes.txt", "nope.txt"])
+    assert results == {
+        "pkg/a.py": {"size": 2, "content": "a\n"},
+        "pkg/b py.py": {"size": 2, "content": "b\n"},
+        "notes.txt": {"size": 2, "content": "n\n"},
+        "nope.txt": {"size": 0, "skipped": "not found"},
+    }
+
+
+def test_run_in_shell_keeps_state_until_timeout():
+    import pytest
+    from docker_utils.docker_executor import DockerCommandExecutor, CommandTimeoutError
+
+    executor = DockerCommandExecutor()
+    container_name = os.getenv("EXECUTION_CONTAINER_NAME", "agent-execution-container")
+    try:
+        executor.run_in_shell("s1", container_name, "cd /tmp && export X=1", working_dir="/")
+        assert executor.run_in_shell("s1", container_name, "pwd; echo $X", working_dir="/") == (0, "/tmp\n1\n", "")
+        # Other sessions get their own shell
+        assert executor.run_in_shell("s2", container_name, "echo ${X:-unset}") == (0, "unset\n", "")
+
+        with pytest.raises(CommandTimeoutError):
+            executor.run_in_shell("s1", container_name, "sleep 300", timeout=1)
+        # The killed shell is replaced by a fresh one
+        assert executor.run_in_shell("s1", container_name, "echo ${X:-unset}") == (0, "unset\n", "")
+    finally:
+        executor.close()
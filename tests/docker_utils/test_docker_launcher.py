@@ -0,0 +1,220 @@
+import os
+import queue
+import time
+
+import docker
+import pytest
+
+from docker_utils import docker_launcher
+from docker_utils.docker_client import set_docker_client
+from docker_utils.docker_launcher import DockerEnvironmentManager, build_context_digest, IMAGE_DIGEST_LABEL
+
+
+def make_context(tmp_path):
+    (tmp_path / "Dockerfile").write_text("FROM python:3.11-slim\nCOPY requirements.txt /tmp/\n")
+    (tmp_path / "requirements.txt").write_text("boto3\n")
+    (tmp_path / "launcher.py").write_text("print('hello')\n")
+    return str(tmp_path)
+
+
+def test_digest_tracks_content_not_timestamps(tmp_path):
+    context = make_context(tmp_path)
+    digest = build_context_digest(context)
+
+    os.utime(tmp_path / "requirements.txt", (0, 0))
+    assert build_context_digest(context) == digest
+
+    (tmp_path / "requirements.txt").write_text("boto3\nrequests\n")
+    assert build_context_digest(context) != digest
+
+
+def test_digest_includes_build_args(tmp_path):
+    context = make_context(tmp_path)
+    assert build_context_digest(context, build_args={"A": "1"}) != build_context_digest(context, build_args={"A": "2"})
+
+
+def test_digest_ignores_dockerignored_files(tmp_path):
+    context = make_context(tmp_path)
+    (tmp_path / ".dockerignore").write_text("# sources\n*.py\n")
+    digest = build_context_digest(context)
+
+    (tmp_path / "launcher.py").write_text("print('changed')\n")
+    assert build_context_digest(context) == digest
+
+    (tmp_path / "Dockerfile").write_text("FROM python:3.12-slim\n")
+    assert build_context_digest(context) != digest
+
+
+class FakeImage:
+    def __init__(self, labels):
+        self.labels = labels
+
+
+class FakeEvents:
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        self.queue.put(None)
+
+
+class FakeContainer:
+    def __init__(self, client, name, healthcheck=False):
+        self.client = client
+        self.id = self.name = name
+        self.attrs = {"Config": {"Healthcheck": {"Test": ["CMD", "true"]}} if healthcheck else {}}
+        self.probes = 0
+
+    def start(self):
+        for event in self.client.on_start:
+            self.client.stream.queue.put(event)
+
+    def exec_run(self, cmd):
+        self.probes += 1
+        if self.probes < self.client.probe_passes_after:
+            return 1, b"aws: not found"
+        return 0, b"ok"
+
+    def logs(self):
+        return b"boom"
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, name):
+        raise docker.errors.NotFound(name)
+
+    def create(self, image, name=None, **kwargs):
+        self.client.container = FakeContainer(self.client, name, self.client.healthcheck)
+        return self.client.container
+
+
+class FakeClient:
+    def __init__(self):
+        self.image_labels = None
+        self.builds = []
+        self.images = self
+        self.api = self
+        self.containers = FakeContainers(self)
+        self.healthcheck = False
+        self.on_start = [{"Action": "start"}]
+        self.probe_passes_after = 1
+        self.stream = None
+
+    def events(self, decode=False, filters=None):
+        assert filters["container"] == self.container.id
+        self.stream = FakeEvents()
+        return self.stream
+
+    def get(self, tag):
+        if self.image_labels is None:
+            raise docker.errors.NotFound(tag)
+        return FakeImage(self.image_labels)
+
+    def build(self, **kwargs):
+        self.builds.append(kwargs)
+        yield {"stream": "Step 1/2 : FROM python:3.11-slim\n"}
+        yield {"aux": {"ID": "sha256:abc"}}
+        self.image_labels = kwargs["labels"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(docker_launcher, "DOCKER_BUILDKIT", False)
+    client = FakeClient()
+    set_docker_client(client)
+    yield client
+    set_docker_client(None)
+
+
+def test_build_skipped_when_image_matches(tmp_path, client):
+    dockerfile = os.path.join(make_context(tmp_path), "Dockerfile")
+    manager = DockerEnvironmentManager()
+
+    assert manager.build_image(dockerfile, cache_from=["registry/devops-container"]) is True
+    assert client.builds[0]["cache_from"] == ["registry/devops-container"]
+    assert client.image_labels == {IMAGE_DIGEST_LABEL: build_context_digest(str(tmp_path))}
+
+    assert manager.build_image(dockerfile) is False
+    assert manager.build_image(dockerfile, force=True) is True
+
+    (tmp_path / "requirements.txt").write_text("boto3\nrequests\n")
+    assert manager.build_image(dockerfile) is True
+    assert len(client.builds) == 3
+
+
+def test_build_error_exits(tmp_path, client):
+    def build(**kwargs):
+        yield {"error": "pip install failed"}
+
+    client.build = build
+    with pytest.raises(SystemExit) as exc:
+        DockerEnvironmentManager().build_image(os.path.join(make_context(tmp_path), "Dockerfile"))
+    assert exc.value.code == 3
+
+
+def test_buildkit_build_through_cli(tmp_path, client, monkeypatch):
+    commands = []
+
+    class FakeProcess:
+        def __init__(self, cmd, env=None, **kwargs):
+            commands.append((cmd, env))
+            self.stdout = iter(["#1 [internal] load build definition\n"])
+            self.returncode = 0
+
+        def wait(self):
+            return self.returncode
+
+    monkeypatch.setattr(docker_launcher, "DOCKER_BUILDKIT", True)
+    monkeypatch.setattr(docker_launcher.subprocess, "Popen", FakeProcess)
+    dockerfile = os.path.join(make_context(tmp_path), "Dockerfile")
+    assert DockerEnvironmentManager().build_image(dockerfile, cache_from=["registry/devops-container"]) is True
+
+    cmd, env = commands[0]
+    assert cmd[:2] == ["docker", "build"] and cmd[-1] == str(tmp_path)
+    assert env["DOCKER_BUILDKIT"] == "1"
+    assert f"{IMAGE_DIGEST_LABEL}={build_context_digest(str(tmp_path))}" in cmd
+    assert cmd[cmd.index("--cache-from") + 1] == "registry/devops-container"
+    assert client.builds == []
+
+
+def test_container_ready_after_start_event_and_probe(client):
+    client.probe_passes_after = 3
+    container = DockerEnvironmentManager().run_container("c1", ready_timeout=5, ready_probe="aws --version")
+    assert container.probes == 3
+
+
+def test_container_waits_for_healthcheck(client):
+    client.healthcheck = True
+    client.on_start = [{"Action": "start"}, {"Action": "health_status: healthy"}]
+    DockerEnvironmentManager().run_container("c1", ready_timeout=5, ready_probe=None)
+    assert client.container.probes == 0
+
+
+def test_container_exit_raises(client):
+    client.on_start = [{"Action": "die", "Actor": {"Attributes": {"exitCode": "2"}}}]
+    with pytest.raises(docker.errors.ContainerError) as exc:
+        DockerEnvironmentManager().run_container("c1", ready_timeout=5)
+    assert exc.value.exit_status == 2
+
+
+def test_container_ready_timeout(client):
+    client.on_start = []
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        DockerEnvironmentManager().run_container("c1", ready_timeout=0.3)
+    assert time.monotonic() - start < 2
+
+    client.on_start = [{"Action": "start"}]
+    client.probe_passes_after = 1000
+    with pytest.raises(TimeoutError, match="readiness probe"):
+        DockerEnvironmentManager().run_container("c1", ready_timeout=0.5)
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from docker_utils.exec_scheduler import ExecScheduler
+
+
+class Tracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.started = []
+
+    def job(self, key, name, duration=0.05):
+        with self.lock:
+            self.started.append(name)
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+        time.sleep(duration)
+        with self.lock:
+            self.running[key] -= 1
+        return name
+
+
+@pytest.mark.asyncio
+async def test_per_session_cap():
+    scheduler = ExecScheduler(max_workers=8, max_per_container=8, max_per_session=2)
+    tracker = Tracker()
+    results = await asyncio.gather(*[
+        scheduler.run("heavy", "c1", tracker.job, "heavy", i) for i in range(6)
+    ])
+    assert results == list(range(6))
+    assert tracker.peak["heavy"] == 2
+    assert scheduler.stats()["completed"] == 6
+    assert scheduler.stats()["peak_queue_depth"] == 4
+
+
+@pytest.mark.asyncio
+async def test_per_container_cap():
+    scheduler = ExecScheduler(max_workers=8, max_per_container=3, max_per_session=8)
+    tracker = Tracker()
+    await asyncio.gather(*[
+        scheduler.run(f"session-{i}", "c1", tracker.job, "c1", i) for i in range(6)
+    ])
+    assert tracker.peak["c1"] == 3
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_scheduled_fairly():
+    scheduler = ExecScheduler(max_workers=1, max_per_container=1, max_per_session=1)
+    tracker = Tracker()
+    heavy = [scheduler.run("heavy", "c1", tracker.job, "all", f"heavy-{i}", 0.02) for i in range(5)]
+    light = [scheduler.run("light", "c1", tracker.job, "all", f"light-{i}", 0.02) for i in range(2)]
+    await asyncio.gather(*heavy, *light)
+    # The light session is interleaved instead of waiting for the heavy backlog
+    assert tracker.started[:5] == ["heavy-0", "heavy-1", "light-0", "heavy-2", "light-1"]
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_and_cancel_dequeues():
+    scheduler = ExecScheduler(max_workers=1, max_per_container=1, max_per_session=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await scheduler.run("s", "c1", fail)
+
+    tracker = Tracker()
+    running = asyncio.ensure_future(scheduler.run("s", "c1", tracker.job, "s", "first", 0.1))
+    queued = asyncio.ensure_future(scheduler.run("s", "c1", tracker.job, "s", "second"))
+    await asyncio.sleep(0.01)
+    assert scheduler.queue_depth("s") == 1
+    queued.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == 0
+    assert await running == "first"
+    assert tracker.started == ["first"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_job_calls_on_cancel():
+    scheduler = ExecScheduler(max_workers=1, max_per_container=1, max_per_session=1)
+    stop = threading.Event()
+
+    def job():
+        return stop.wait(5)
+
+    task = asyncio.ensure_future(scheduler.run("s1", "c1", job, on_cancel=stop.set))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert stop.is_set()
+    # The worker sees the event and returns promptly, freeing its slot
+    assert await asyncio.wait_for(scheduler.run("s1", "c1", lambda: "next"), timeout=1) == "next"
+
+
+@pytest.mark.asyncio
+async def test_finished_sessions_and_containers_are_forgotten():
+    scheduler = ExecScheduler(max_workers=4)
+    tracker = Tracker()
+    await asyncio.gather(*[
+        scheduler.run(f"session-{i}", f"c{i % 3}", tracker.job, i, i, 0.01) for i in range(10)
+    ])
+    assert scheduler._running_by_session == {}
+    assert scheduler._running_by_container == {}
+    assert scheduler.stats()["running_by_container"] == {}
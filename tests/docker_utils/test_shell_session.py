@@ -0,0 +1,130 @@
+import socket
+import struct
+import subprocess
+import threading
+
+import pytest
+
+from docker_utils.shell_session import ShellSession, SHELL_COMMAND
+
+
+class LocalShellApi:
+    """Stands in for the Docker API: runs the shell locally and multiplexes its output like an exec socket."""
+
+    def __init__(self):
+        self.exit_code = None
+
+    def exec_create(self, container_id, cmd, stdin, environment):
+        self.cmd = cmd
+        return {"Id": "exec-1"}
+
+    def exec_start(self, exec_id, socket=False):
+        ours, theirs = globals()["socket"].socketpair()
+        process = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        lock = threading.Lock()
+
+        def pump_in():
+            while data := theirs.recv(4096):
+                process.stdin.write(data)
+                process.stdin.flush()
+            process.stdin.close()
+
+        def pump_out(pipe, stream):
+            while data := pipe.read1(4096):
+                with lock:
+                    theirs.sendall(struct.pack(">BxxxL", stream, len(data)) + data)
+
+        readers = [threading.Thread(target=pump_out, args=(process.stdout, 1)), threading.Thread(target=pump_out, args=(process.stderr, 2))]
+        threading.Thread(target=pump_in, daemon=True).start()
+        for reader in readers:
+            reader.start()
+
+        def finish():
+            for reader in readers:
+                reader.join()
+            self.exit_code = process.wait()
+            theirs.shutdown(2)
+
+        threading.Thread(target=finish, daemon=True).start()
+        return ours
+
+    def exec_inspect(self, exec_id):
+        return {"ExitCode": self.exit_code}
+
+
+def run(shell, command, working_dir=None):
+    chunks = {"stdout": "", "stderr": ""}
+    def on_output(name, text):
+        chunks[name] += text
+    exit_code = shell.run(command, working_dir, on_output)
+    return exit_code, chunks["stdout"], chunks["stderr"]
+
+
+@pytest.fixture
+def shell(tmp_path):
+    shell = ShellSession(LocalShellApi(), "container", ["/bin/sh", "-c", SHELL_COMMAND])
+    yield shell
+    shell.close()
+
+
+def test_state_persists_between_commands(shell, tmp_path):
+    (tmp_path / "sub").mkdir()
+    assert run(shell, "echo hi", str(tmp_path)) == (0, "hi\n", "")
+    assert run(shell, "cd sub; export GREETING=hello; f() { echo \"f:$1\"; }")[0] == 0
+    assert run(shell, "pwd; echo $GREETING; f x", str(tmp_path)) == (0, f"{tmp_path}/sub\nhello\nf:x\n", "")
+
+
+def test_exit_codes_stderr_and_partial_lines(shell):
+    assert run(shell, "printf 'no newline'; echo oops >&2; false") == (1, "no newline", "oops\n")
+    # A syntax error is reported without ending the shell
+    assert run(shell, "if then")[0] != 0
+    assert run(shell, "echo still here") == (0, "still here\n", "")
+
+
+def test_exit_ends_shell(shell):
+    assert run(shell, "echo bye; exit 3") == (3, "bye\n", "")
+    assert shell.closed
+
+
+def test_failed_cd_skips_command(shell, tmp_path):
+    (tmp_path / "marker").write_text("")
+    assert run(shell, "pwd", str(tmp_path)) == (0, f"{tmp_path}\n", "")
+
+    exit_code, stdout, stderr = run(shell, "touch created; echo ran", str(tmp_path / "missing"))
+    assert (exit_code, stdout) == (1, "")
+    assert "missing" in stderr
+    assert not (tmp_path / "created").exists()
+
+    # The failed directory is retried rather than assumed
+    exit_code, stdout, _ = run(shell, "echo ran", str(tmp_path / "missing"))
+    assert (exit_code, stdout) == (1, "")
+    (tmp_path / "missing").mkdir()
+    assert run(shell, "pwd", str(tmp_path / "missing")) == (0, f"{tmp_path}/missing\n", "")
+
+
+def test_close_when_idle_waits_for_running_command(shell, tmp_path):
+    result = []
+
+    def command():
+        # As the executor runs a command: hold the lock, then release()
+        shell.lock.acquire()
+        try:
+            result.append(run(shell, f"while [ ! -e {tmp_path}/go ]; do sleep 0.05; done; echo done"))
+        finally:
+            shell.release()
+
+    runner = threading.Thread(target=command)
+    runner.start()
+    while not shell.lock.locked():
+        pass
+    shell.close_when_idle()
+    assert not shell.closed
+
+    (tmp_path / "go").write_text("")
+    runner.join(5)
+    assert result == [(0, "done\n", "")]
+    assert shell.closed
+
+    idle = ShellSession(LocalShellApi(), "container", ["/bin/sh", "-c", SHELL_COMMAND])
+    idle.close_when_idle()
+    assert idle.closed